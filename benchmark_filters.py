@@ -0,0 +1,176 @@
+"""Benchmark: per-message filter work with and without the shared feature record, and batch throughput.
+
+Builds pattern lists of realistic sizes and a mix of messages (plain
+senders, listed senders, keyword hits), then times two ways of running
+the filter chain and preparing the summary prompt for each message:
+
+- per filter: each filter class lower-cases the sender or subject + body
+  itself (and is asked twice, once for the verdict and once for the
+  matching rules), then the summarizer slices the body
+- record: one MessageFeatures per message, read by the Classifier's
+  sender index and keyword engine and by the prompt
+
+The last column is the classification throughput of
+Classifier.classify_batch, fed FETCH_BATCH_SIZE messages at a time.
+
+    python benchmark_filters.py [--messages 2000] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from email_handler.fetcher import FETCH_BATCH_SIZE, EmailMessage
+from filters.classifier import Classifier
+from filters.delete_domain_filter import DeleteDomainFilter
+from filters.delete_email_filter import DeleteEmailFilter
+from filters.delete_filter import DeleteFilter
+from filters.domain_filter import DomainFilter
+from filters.features import PROMPT_BODY_CHARS, MessageFeatures
+from filters.keyword_filter import KeywordFilter
+from filters.spam_email_filter import SpamEmailFilter
+
+# Entries per pattern list: a hand-kept list, a grown one, an imported blocklist
+SIZES = [20, 200, 2000]
+
+WORDS = ("invoice meeting shipping order account update report project team weekly schedule review "
+         "offer discount newsletter payment receipt reminder delivery ticket support").split()
+
+
+def write_list(directory: str, name: str, entries) -> str:
+    path = os.path.join(directory, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(entries) + '\n')
+    return path
+
+
+def make_filters(directory: str, size: int, rng: random.Random) -> dict:
+    return {
+        'spam_email': SpamEmailFilter(write_list(
+            directory, 'spam_emails.txt', [f'promo{i}@mailer{i}.example' for i in range(size)])),
+        'spam_domain': DomainFilter(write_list(
+            directory, 'spam_domains.txt', [f'*.spam{i}.example' for i in range(size)])),
+        'spam_keyword': KeywordFilter(write_list(
+            directory, 'spam_keywords.txt', [f'prize code {rng.randrange(10 ** 6)}' for _ in range(size)])),
+        'delete_email': DeleteEmailFilter(write_list(
+            directory, 'delete_emails.txt', [f'noreply{i}@notify{i}.example' for i in range(size)])),
+        'delete_domain': DeleteDomainFilter(write_list(
+            directory, 'delete_domains.txt', [f'old{i}.example' for i in range(size)])),
+        'delete_keyword': DeleteFilter(write_list(
+            directory, 'delete_keywords.txt', [f'unsubscribe ref {rng.randrange(10 ** 6)}' for _ in range(size)])),
+    }
+
+
+def make_messages(count: int, filters: dict, rng: random.Random):
+    spam_keywords = filters['spam_keyword'].spam_keywords
+    messages = []
+    for uid in range(count):
+        kind = uid % 10
+        if kind == 0:
+            sender = rng.choice(filters['spam_email'].spam_emails).upper()
+        elif kind == 1:
+            sender = f"News@Mail.{rng.choice(filters['delete_domain'].delete_domains)}"
+        else:
+            sender = f"{rng.choice(WORDS).title()}.{uid}@Company{uid % 50}.example"
+        body = ' '.join(rng.choice(WORDS) for _ in range(400))
+        if kind == 2:
+            body += ' ' + rng.choice(spam_keywords).upper()
+        subject = ' '.join(rng.choice(WORDS) for _ in range(6)).title()
+        messages.append(EmailMessage(str(uid), subject, sender, text=body))
+    return messages
+
+
+def per_filter(filters: dict, email: EmailMessage) -> str:
+    """The filter chain as each filter class runs it, plus the summarizer's body slice."""
+    sender, subject, body = email.from_, email.subject, email.filter_text
+    if filters['spam_email'].is_spam(sender):
+        return 'spam:' + ','.join(filters['spam_email'].get_matching_emails(sender))
+    if filters['spam_domain'].is_spam(sender):
+        return 'spam:' + ','.join(filters['spam_domain'].get_matching_domains(sender))
+    if filters['spam_keyword'].is_spam(subject, body):
+        return 'spam:' + ','.join(filters['spam_keyword'].get_matching_keywords(subject, body))
+    if filters['delete_email'].should_delete(sender):
+        return 'deleted:' + ','.join(filters['delete_email'].get_matching_emails(sender))
+    if filters['delete_domain'].should_delete(sender):
+        return 'deleted:' + ','.join(filters['delete_domain'].get_matching_domains(sender))
+    if filters['delete_keyword'].should_delete(subject, body):
+        return 'deleted:' + ','.join(filters['delete_keyword'].get_matching_keywords(subject, body))
+    return 'keep:' + str(len(body[:PROMPT_BODY_CHARS]))
+
+
+def compile_classifier(filters: dict) -> Classifier:
+    return Classifier.compile(
+        trusted=[],
+        spam_emails=filters['spam_email'].spam_emails,
+        spam_domains=filters['spam_domain'].spam_domains,
+        spam_keywords=filters['spam_keyword'].spam_keywords,
+        delete_emails=filters['delete_email'].delete_emails,
+        delete_domains=filters['delete_domain'].delete_domains,
+        delete_keywords=filters['delete_keyword'].delete_keywords
+    )
+
+
+def with_record(classifier: Classifier, email: EmailMessage) -> str:
+    """The filter chain and prompt body as MailAgent runs them on one feature record."""
+    features = MessageFeatures(email)
+    verdict = classifier.classify(email, features)
+    if verdict.action == 'keep':
+        return 'keep:' + str(len(features.prompt_text))
+    return verdict.action + ':' + verdict.reason.split(': ', 1)[1].replace(', ', ',')
+
+
+def best_of(repeat: int, func, messages) -> float:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for email in messages:
+            func(email)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def batch_rate(classifier: Classifier, messages, repeat: int) -> float:
+    """Messages per second through classify_batch, FETCH_BATCH_SIZE at a time (as MailAgent feeds it)."""
+    batches = [messages[i:i + FETCH_BATCH_SIZE] for i in range(0, len(messages), FETCH_BATCH_SIZE)]
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for batch in batches:
+            classifier.classify_batch(batch)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return len(messages) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-filter normalization with the shared feature record")
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"Filter benchmark: {args.messages} messages, best of {args.repeat}")
+    print(f"{'entries/list':>12} {'per filter us':>14} {'record us':>10} {'saved':>7} {'batch msg/s':>12}")
+    for size in SIZES:
+        rng = random.Random(size)
+        with tempfile.TemporaryDirectory() as directory:
+            filters = make_filters(directory, size, rng)
+        messages = make_messages(args.messages, filters, rng)
+        classifier = compile_classifier(filters)
+        # All ways must reach the same verdicts
+        batch = classifier.classify_batch(messages)
+        for email, verdict in zip(messages, batch):
+            assert per_filter(filters, email) == with_record(classifier, email), email
+            assert verdict == classifier.classify(email), email
+        before = best_of(args.repeat, lambda email: per_filter(filters, email), messages)
+        after = best_of(args.repeat, lambda email: with_record(classifier, email), messages)
+        per_message = 1e6 / len(messages)
+        print(f"{size:>12} {before * per_message:>14.1f} {after * per_message:>10.1f} "
+              f"{1 - after / before:>6.0%} {batch_rate(classifier, messages, args.repeat):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Benchmark: MIME parsing in the main process vs. a process pool, to find where a pool would pay off.
+
+Builds synthetic messages in the two shapes EmailFetcher decodes, then
+times parsing batches of growing size in place and in a process pool
+(order kept, at most two batches per worker in flight), including
+process start-up:
+
+- whole: full RFC822 messages as imaplib returns them from the
+  uncapped body prefetch (UID FETCH ... BODY.PEEK[]), parsed with
+  _parse_fetch_items and decoded to text
+- parts: the capped text parts iter_plan and the backfill fetch
+  (sync.filter_body_bytes / summary_body_bytes), decoded with _decode_body
+
+The smallest batch where the pool wins is the crossover.
+
+    python benchmark_parse.py [--workers 4] [--repeat 3] [--cap 65536]
+
+Measured on the development machine (1 CPU, Python 3.11, 4 workers),
+best of 3, speed-up of the pool over in-place parsing:
+
+    messages   whole   parts
+          25   0.58x   0.07x
+         100   0.66x   0.20x
+         400   0.81x   0.35x
+        1600   0.77x   0.46x
+
+The pool did not pay off at any size. The capped parts lose the most,
+because shipping them to a worker costs more than decoding them, and
+they are the only shape the agent's scans fetch. So the agent keeps
+parsing in place and has no sync.parse_workers setting. Re-run this
+on a multi-core host before revisiting that.
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from email_handler.fetcher import FETCH_BATCH_SIZE, _chunked, _decode_body, _parse_fetch_items
+from email_handler.imap_parse import BodyPart
+
+SIZES = [25, 50, 100, 200, 400, 800, 1600]
+
+
+def make_raw(uid: int) -> bytes:
+    text = f"Hello {uid},\r\n\r\n" + "Your order has shipped and is on its way. " * 40
+    html = "<html><body>" + f"<p style='color:#333'>Hello {uid}, your order has shipped.</p>" * 40 + "</body></html>"
+    attachment = base64.encodebytes(os.urandom(6000)).decode().replace('\n', '\r\n')
+    return (
+        f"From: =?utf-8?q?Shop_n=C2=B0{uid}?= <orders{uid}@shop.example>\r\n"
+        f"To: me@example.com\r\n"
+        f"Subject: =?utf-8?b?{base64.b64encode(f'Commande n°{uid} expédiée'.encode()).decode()}?=\r\n"
+        f"Date: Mon, 12 Oct 2026 10:{uid % 60:02d}:00 +0200\r\n"
+        f"Message-ID: <{uid}@shop.example>\r\n"
+        "MIME-Version: 1.0\r\n"
+        "Content-Type: multipart/mixed; boundary=\"outer\"\r\n\r\n"
+        "--outer\r\nContent-Type: multipart/alternative; boundary=\"inner\"\r\n\r\n"
+        "--inner\r\nContent-Type: text/plain; charset=utf-8\r\nContent-Transfer-Encoding: quoted-printable\r\n\r\n"
+        f"{text}\r\n"
+        "--inner\r\nContent-Type: text/html; charset=iso-8859-1\r\n\r\n"
+        f"{html}\r\n"
+        "--inner--\r\n"
+        "--outer\r\nContent-Type: application/pdf; name=\"invoice.pdf\"\r\nContent-Transfer-Encoding: base64\r\n\r\n"
+        f"{attachment}\r\n"
+        "--outer--\r\n"
+    ).encode('utf-8')
+
+
+def make_whole_batches(count: int) -> List[list]:
+    """FETCH data split per message, FETCH_BATCH_SIZE messages per batch (like EmailFetcher._fetch_raw)."""
+    items = []
+    for uid in range(1, count + 1):
+        raw = make_raw(uid)
+        prefix = f"{uid} (UID {uid} FLAGS (\\Seen) RFC822.SIZE {len(raw)} BODY[] {{{len(raw)}}}".encode()
+        items.append([(prefix, raw), b')'])
+    return list(_chunked(items, FETCH_BATCH_SIZE))
+
+
+def make_part_batches(count: int, cap: int) -> List[list]:
+    """Capped base64 text parts as _fetch_part_data returns them: (data, BodyPart, truncated)."""
+    text = ("Your order n°{} has shipped and is on its way. " * 200).encode('utf-8')
+    parts = []
+    for uid in range(1, count + 1):
+        data = base64.encodebytes(text.replace(b'{}', str(uid).encode()))[:cap]
+        part = BodyPart(section='1.1', subtype='plain', charset='utf-8', encoding='base64', size=len(data))
+        parts.append((data, part, len(data) >= cap))
+    return list(_chunked(parts, FETCH_BATCH_SIZE))
+
+
+def parse_whole(batch: list) -> List[str]:
+    # Bodies stay raw until read: reading text is the decoding work a filter or summary triggers
+    return [message.text for message in _parse_fetch_items(batch).values()]
+
+
+def parse_parts(batch: list) -> List[str]:
+    return [_decode_body(raw)[0] for raw in batch]
+
+
+def run_inline(func: Callable, batches: List[list]) -> int:
+    return sum(len(result) for result in map(func, batches))
+
+
+def pooled_map(executor: ProcessPoolExecutor, func: Callable, batches: List[list], window: int) -> Iterator:
+    """executor.map in order, with at most window batches submitted and not yet collected."""
+    pending = []
+    for batch in batches:
+        pending.append(executor.submit(func, batch))
+        if len(pending) >= window:
+            yield pending.pop(0).result()
+    for future in pending:
+        yield future.result()
+
+
+def run_pool(func: Callable, batches: List[list], workers: int) -> int:
+    # A fresh pool each time, so worker start-up is part of the cost (as on a first fetch)
+    with ProcessPoolExecutor(workers) as executor:
+        return sum(len(result) for result in pooled_map(executor, func, batches, 2 * workers))
+
+
+def best_of(repeat: int, func, *args) -> float:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare in-process and process pool MIME parsing")
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--cap', type=int, default=65536, help="body cap of the parts shape, in bytes")
+    args = parser.parse_args()
+
+    print(f"Parse benchmark: {args.workers} worker(s), {os.cpu_count()} CPU(s), best of {args.repeat}")
+    for shape, make, func in (('whole', make_whole_batches, parse_whole),
+                              ('parts', lambda size: make_part_batches(size, args.cap), parse_parts)):
+        print(f"\n{shape}")
+        print(f"{'messages':>9} {'inline ms':>10} {'pool ms':>9} {'speed-up':>9}")
+        crossover = None
+        for size in SIZES:
+            batches = make(size)
+            inline = best_of(args.repeat, run_inline, func, batches)
+            pooled = best_of(args.repeat, run_pool, func, batches, args.workers)
+            print(f"{size:>9} {inline * 1000:>10.1f} {pooled * 1000:>9.1f} {inline / pooled:>8.2f}x")
+            if crossover is None and pooled < inline:
+                crossover = size
+        if crossover:
+            print(f"The pool pays off from about {crossover} messages per fetch")
+        else:
+            print("The pool did not pay off at any size on this machine")
+
+
+if __name__ == "__main__":
+    main()
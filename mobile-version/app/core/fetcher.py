@@ -1,6 +1,6 @@
 """Email fetching module using imap-tools."""
 from imap_tools import MailBox, AND, MailMessageFlags
-from typing import List, Optional, Callable
+from typing import Iterator, List, Optional, Callable
 from dataclasses import dataclass
 import socket
 from datetime import datetime
@@ -49,21 +49,23 @@ class EmailFetcher:
 
     def fetch_unread(self, folder: str = "INBOX", limit: int = 200) -> List[EmailMessage]:
         """Fetch unread emails only."""
+        print(f"Fetching unread emails from {folder} (limit={limit})...")
+        emails = list(self.iter_unread(folder, limit))
+        print(f"  Found {len(emails)} unread emails.")
+        return emails
+
+    def iter_unread(self, folder: str = "INBOX", limit: int = 200) -> Iterator[EmailMessage]:
+        """Yield unread emails, newest first, one at a time as they are downloaded."""
         if not self.mailbox:
             self.connect()
 
-        emails = []
         self.mailbox.folder.set(folder)
 
-        print(f"Fetching unread emails from {folder} (limit={limit})...")
         for msg in self.mailbox.fetch(AND(seen=False), limit=limit, reverse=True):
             email_msg = self._parse_message(msg)
             # Explicitly force seen=False because we asked for unread
             email_msg.seen = False 
-            emails.append(email_msg)
-
-        print(f"  Found {len(emails)} unread emails.")
-        return emails
+            yield email_msg
 
     def fetch_all(self, folder: str = "INBOX", limit: int = 200, progress_callback: Optional[Callable[[int], None]] = None) -> List[EmailMessage]:
         """Fetch ALL emails (read and unread) with configurable limit and progress tracking."""
@@ -89,6 +91,16 @@ class EmailFetcher:
         print(f"Completed fetching {len(emails)} emails")
         return emails
 
+    def iter_all(self, folder: str = "INBOX", limit: int = 200) -> Iterator[EmailMessage]:
+        """Yield ALL emails (read and unread), newest first, one at a time as they are downloaded."""
+        if not self.mailbox:
+            self.connect()
+
+        self.mailbox.folder.set(folder)
+
+        for msg in self.mailbox.fetch(limit=limit, reverse=True, mark_seen=False):
+            yield self._parse_message(msg)
+
     def _parse_message(self, msg) -> EmailMessage:
         """Parse IMAP message to EmailMessage dataclass."""
         # Use clean email address from from_values if available
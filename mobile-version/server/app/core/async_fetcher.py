@@ -0,0 +1,482 @@
+"""asyncio IMAP backend: pipelined commands and per-connection deadlines, many accounts on one event loop."""
+import asyncio
+import re
+import ssl
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from imap_tools import MailMessage
+from imap_tools.imap_utf7 import utf7_decode
+from imap_tools.utils import encode_folder
+
+from .fetcher import EmailMessage, _email_message
+
+# UIDs per STORE/MOVE command, and messages per FETCH command
+UID_CHUNK_SIZE = 500
+FETCH_BATCH_SIZE = 50
+
+# RFC 6154 SPECIAL-USE attributes, with the folder names the blocking fetcher tries as a fallback
+SPECIAL_USE_FLAGS = {'junk': '\\Junk', 'trash': '\\Trash'}
+SPECIAL_USE_NAMES = {
+    'junk': ["[Gmail]/Spam", "Spam", "Junk", "Junk E-mail"],
+    'trash': ["[Gmail]/Trash", "Trash", "Deleted Items", "Deleted"],
+}
+
+_LITERAL_END = re.compile(rb'\{(\d+)\+?\}\r\n$')
+_LIST_LINE = re.compile(rb'\((?P<flags>[^)]*)\) (?P<delim>"[^"]*"|NIL) (?P<name>.+)$', re.DOTALL)
+_FETCH_LINE = re.compile(rb'\d+ FETCH ')
+_BODY_LITERAL = re.compile(rb'BODY\[\] \{(\d+)\}\r\n')
+
+
+class IMAPCommandError(Exception):
+    """A command completed with NO or BAD."""
+
+
+@dataclass
+class IMAPResponse:
+    status: str
+    text: str
+    # Untagged responses (without the leading '* '), literals inlined
+    lines: List[bytes] = field(default_factory=list)
+
+
+def _astring(value: str) -> Union[str, bytes]:
+    """A LOGIN argument: a quoted string if it is printable ASCII, else the UTF-8 bytes to send as a literal."""
+    if all(' ' <= c <= '~' for c in value):
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return value.encode('utf-8')
+
+
+def _folder(name: str) -> str:
+    """A folder name as a command argument: modified UTF-7 (RFC 3501 5.1.3), quoted."""
+    return encode_folder(name).decode('ascii')
+
+
+def _list_name(raw: bytes) -> str:
+    """Decode the mailbox name of a LIST response: quoted string, literal or atom, in modified UTF-7."""
+    raw = raw.strip()
+    m = re.match(rb'\{\d+\}\r\n', raw)
+    if m:
+        raw = raw[m.end():]
+    elif raw.startswith(b'"') and raw.endswith(b'"'):
+        raw = re.sub(rb'\\(.)', rb'\1', raw[1:-1])
+    return utf7_decode(raw)
+
+
+class AsyncIMAPConnection:
+    """One IMAP connection driven by asyncio.
+
+    send() writes a command right away and returns a future, so several
+    commands can be in flight at once (pipelining); a single reader task
+    matches tagged completions to their commands. Untagged responses are
+    attributed to the oldest command still waiting, which is correct for
+    servers that answer pipelined commands in order (all common ones do).
+
+    Every command must complete within timeout seconds and, if deadline is
+    set (event loop time), before the connection's deadline. A command
+    that misses either closes the connection: responses can no longer be
+    matched reliably. Nothing here touches socket.setdefaulttimeout.
+    """
+
+    def __init__(self, host: str, port: int, timeout: float = 60, deadline: Optional[float] = None,
+                 ssl_context: Optional[ssl.SSLContext] = None, use_ssl: bool = True):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.deadline = deadline
+        self.ssl_context = ssl_context or (ssl.create_default_context() if use_ssl else None)
+        self.capabilities: Tuple[str, ...] = ()
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: "OrderedDict[str, Tuple[asyncio.Future, List[bytes]]]" = OrderedDict()
+        # Set while a command waits for the server's '+' before sending a literal
+        self._continuation: Optional[asyncio.Future] = None
+        self._tag = 0
+        self.unsolicited: List[bytes] = []
+
+    async def open(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            # Large limit: one SEARCH result line can list every UID of a big folder
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl_context,
+                                    server_hostname=self.host if self.ssl_context else None, limit=2 ** 24),
+            self._time_left()
+        )
+        greeting = await asyncio.wait_for(self._read_response(), self._time_left())
+        if not greeting.startswith(b'* OK') and not greeting.startswith(b'* PREAUTH'):
+            raise IMAPCommandError(f"Unexpected greeting: {greeting[:80]!r}")
+        self._reader_task = asyncio.ensure_future(self._read_loop())
+
+    def _time_left(self) -> float:
+        if self.deadline is None:
+            return self.timeout
+        remaining = self.deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            raise asyncio.TimeoutError(f"Deadline for {self.host} passed")
+        return min(self.timeout, remaining)
+
+    def _new_command(self) -> Tuple[str, "asyncio.Future[IMAPResponse]"]:
+        if not self._writer or self._writer.is_closing():
+            raise ConnectionError(f"Connection to {self.host} is closed")
+        self._tag += 1
+        tag = f"A{self._tag:04d}"
+        future = asyncio.get_running_loop().create_future()
+        self._pending[tag] = (future, [])
+        return tag, future
+
+    def send(self, command: str) -> "asyncio.Future[IMAPResponse]":
+        """Write a command without waiting for earlier ones to complete."""
+        tag, future = self._new_command()
+        self._writer.write(f"{tag} {command}\r\n".encode())
+        return future
+
+    async def wait(self, future: "asyncio.Future[IMAPResponse]", check: bool = True) -> IMAPResponse:
+        """Wait for a sent command; with check=True a NO/BAD raises IMAPCommandError."""
+        try:
+            await self._writer.drain()
+            response = await asyncio.wait_for(asyncio.shield(future), self._time_left())
+        except asyncio.TimeoutError:
+            self.abort(asyncio.TimeoutError(f"IMAP command to {self.host} timed out"))
+            raise
+        if check and response.status != 'OK':
+            raise IMAPCommandError(f"{response.status} {response.text}")
+        return response
+
+    async def command(self, command: str, check: bool = True) -> IMAPResponse:
+        return await self.wait(self.send(command), check)
+
+    async def command_with_literals(self, parts: List[Union[str, bytes]], check: bool = True) -> IMAPResponse:
+        """Send a command whose bytes parts go as synchronizing literals (RFC 3501 4.3).
+
+        Each literal is announced as {size}, and its data is only written
+        after the server's '+' continuation. Not pipelined: later commands
+        must not be sent while this one waits.
+        """
+        tag, future = self._new_command()
+        line = f"{tag} "
+        for part in parts:
+            if isinstance(part, str):
+                line += part
+                continue
+            self._continuation = asyncio.get_running_loop().create_future()
+            self._writer.write(f"{line}{{{len(part)}}}\r\n".encode())
+            try:
+                await self._writer.drain()
+                # A tagged NO/BAD instead of '+' ends the command early
+                done, _ = await asyncio.wait({self._continuation, future}, timeout=self._time_left(),
+                                             return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                self._continuation = None
+            if future in done:
+                return await self.wait(future, check)
+            if not done:
+                self.abort(asyncio.TimeoutError(f"IMAP command to {self.host} timed out"))
+                raise asyncio.TimeoutError(f"IMAP command to {self.host} timed out")
+            self._writer.write(part)
+            line = ""
+        self._writer.write(f"{line}\r\n".encode())
+        return await self.wait(future, check)
+
+    async def pipeline(self, commands: Iterable[str], check: bool = True) -> List[IMAPResponse]:
+        """Send all commands back to back, then collect their responses in order."""
+        futures = [self.send(command) for command in commands]
+        return [await self.wait(future, check) for future in futures]
+
+    async def close(self):
+        if self._pending:
+            self.abort(ConnectionError("Connection closed"))
+        if self._reader_task:
+            self._reader_task.cancel()
+        if self._writer:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+
+    def abort(self, error: BaseException):
+        """Fail every command in flight and drop the connection."""
+        for future, _ in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+        if self._writer:
+            self._writer.close()
+
+    async def _read_response(self) -> bytes:
+        """Read one response line, with any literals it announces inlined."""
+        data = await self._reader.readuntil(b'\r\n')
+        while True:
+            m = _LITERAL_END.search(data)
+            if not m:
+                return data[:-2]
+            data += await self._reader.readexactly(int(m.group(1)))
+            data += await self._reader.readuntil(b'\r\n')
+
+    async def _read_loop(self):
+        try:
+            while True:
+                line = await self._read_response()
+                if line.startswith(b'* '):
+                    if self._pending:
+                        next(iter(self._pending.values()))[1].append(line[2:])
+                    else:
+                        self.unsolicited.append(line[2:])
+                    continue
+                if line.startswith(b'+'):
+                    if self._continuation and not self._continuation.done():
+                        self._continuation.set_result(line)
+                    continue
+                tag, _, rest = line.partition(b' ')
+                entry = self._pending.pop(tag.decode(errors='replace'), None)
+                if entry is None:
+                    continue
+                status, _, text = rest.partition(b' ')
+                future, lines = entry
+                if not future.done():
+                    future.set_result(IMAPResponse(status.decode().upper(), text.decode(errors='replace'), lines))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.abort(ConnectionError(f"Connection to {self.host} lost: {e}"))
+
+
+class AsyncEmailFetcher:
+    """asyncio counterpart of EmailFetcher for checking many mailboxes at once.
+
+    Produces the same EmailMessage objects. Commands are pipelined: all
+    FETCH batches of a read go out back to back, and so do the STORE and
+    MOVE chunks of an action. Timeouts are per connection (timeout per
+    command, optional overall deadline) instead of the process-wide
+    socket.setdefaulttimeout. Messages are read with BODY.PEEK[], so
+    fetching does not mark them as seen.
+    """
+
+    def __init__(self, email: str, password: str, imap_host: str, imap_port: int, timeout: float = 60,
+                 deadline: Optional[float] = None, ssl_context: Optional[ssl.SSLContext] = None,
+                 use_ssl: bool = True):
+        self.email = email
+        self.password = password
+        self.imap_host = imap_host
+        self.imap_port = imap_port
+        self.conn = AsyncIMAPConnection(imap_host, imap_port, timeout=timeout, deadline=deadline,
+                                        ssl_context=ssl_context, use_ssl=use_ssl)
+        self._selected: Optional[str] = None
+        self._special_folders: Dict[str, str] = {}
+
+    async def connect(self):
+        await self.conn.open()
+        # Quoted strings, or literals for credentials that are not printable ASCII
+        await self.conn.command_with_literals(["LOGIN ", _astring(self.email), " ", _astring(self.password)])
+        response = await self.conn.command("CAPABILITY")
+        for line in response.lines:
+            if line.upper().startswith(b'CAPABILITY '):
+                self.conn.capabilities = tuple(line[11:].decode().upper().split())
+        print(f"Connected to {self.email} (async)")
+
+    async def disconnect(self):
+        try:
+            await self.conn.command("LOGOUT", check=False)
+        except (ConnectionError, OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            await self.conn.close()
+
+    async def _select(self, folder: str):
+        if self._selected != folder:
+            await self.conn.command(f"SELECT {_folder(folder)}")
+            self._selected = folder
+
+    async def probe_status(self, folder: str = "INBOX") -> Dict[str, int]:
+        """A folder's counters from one STATUS command, as EmailFetcher.probe_status returns them.
+
+        STATUS is not meant for the selected folder: that one is left with
+        UNSELECT first or, on servers without it, selected again and read
+        from the SELECT response plus UID SEARCH UNSEEN.
+        """
+        if self._selected == folder:
+            if 'UNSELECT' not in self.conn.capabilities:
+                return await self._selected_status(folder)
+            await self.conn.command("UNSELECT")
+            self._selected = None
+        items = ['UIDVALIDITY', 'UIDNEXT', 'MESSAGES', 'UNSEEN']
+        if 'CONDSTORE' in self.conn.capabilities:
+            items.append('HIGHESTMODSEQ')
+        response = await self.conn.command(f"STATUS {_folder(folder)} ({' '.join(items)})")
+        data = b' '.join(line for line in response.lines if line.upper().startswith(b'STATUS '))
+        return {k.decode().upper(): int(v) for k, v in re.findall(rb'([A-Za-z]+) (\d+)', data[data.rfind(b'('):])}
+
+    async def _selected_status(self, folder: str) -> Dict[str, int]:
+        response = await self.conn.command(f"SELECT {_folder(folder)}")
+        self._selected = folder
+        names = ['UIDVALIDITY', 'UIDNEXT']
+        if 'CONDSTORE' in self.conn.capabilities:
+            names.append('HIGHESTMODSEQ')
+        status = {}
+        for line in response.lines:
+            m = re.match(rb'(\d+) EXISTS', line)
+            if m:
+                status['MESSAGES'] = int(m.group(1))
+            m = re.match(rb'OK \[([A-Z]+) (\d+)\]', line.upper())
+            if m and m.group(1).decode() in names:
+                status[m.group(1).decode()] = int(m.group(2))
+        status['UNSEEN'] = len(await self.search("UNSEEN", folder))
+        return status
+
+    async def search(self, criteria: str, folder: str = "INBOX") -> List[str]:
+        """UIDs matching criteria, newest first."""
+        await self._select(folder)
+        response = await self.conn.command(f"UID SEARCH {criteria}")
+        uids = []
+        for line in response.lines:
+            if line.upper().startswith(b'SEARCH'):
+                uids.extend(line.split()[1:])
+        return sorted((u.decode() for u in uids), key=int, reverse=True)
+
+    async def fetch_unread(self, folder: str = "INBOX", limit: int = 200) -> List[EmailMessage]:
+        """Unread emails, newest first, without marking them as seen."""
+        uids = (await self.search("UNSEEN", folder))[:limit]
+        emails = await self.fetch_messages(uids, folder)
+        for email_msg in emails:
+            email_msg.seen = False
+        return emails
+
+    async def fetch_messages(self, uids: List[str], folder: str = "INBOX") -> List[EmailMessage]:
+        """Fetch whole messages by UID, in the given order; the FETCH batches are pipelined."""
+        if not uids:
+            return []
+        await self._select(folder)
+        responses = await self.conn.pipeline(
+            f"UID FETCH {','.join(chunk)} (UID FLAGS BODY.PEEK[])" for chunk in _chunked(uids, FETCH_BATCH_SIZE)
+        )
+        messages = {}
+        for response in responses:
+            for line in response.lines:
+                msg = _fetched_message(line)
+                if msg is not None:
+                    messages[str(msg.uid)] = msg
+        return [_email_message(messages[uid]) for uid in uids if uid in messages]
+
+    async def mark_many_as_read(self, uids: List[str], folder: str = "INBOX") -> Dict[str, str]:
+        return await self._run_chunks(uids, folder, "STORE", "+FLAGS.SILENT (\\Seen)", "marked read")
+
+    async def move_many(self, uids: List[str], target: str, folder: str = "INBOX") -> Dict[str, str]:
+        """Move UIDs with pipelined UID MOVE commands (COPY + STORE \\Deleted + EXPUNGE without MOVE)."""
+        if 'MOVE' in self.conn.capabilities:
+            return await self._run_chunks(uids, folder, "MOVE", _folder(target), f"moved to {target}")
+        results = await self._run_chunks(uids, folder, "COPY", _folder(target), f"moved to {target}")
+        copied = [uid for uid, r in results.items() if not r.startswith('error')]
+        flagged = await self._run_chunks(copied, folder, "STORE", "+FLAGS.SILENT (\\Deleted)", "")
+        await self.conn.command("EXPUNGE", check=False)
+        for uid, r in flagged.items():
+            if r.startswith('error'):
+                results[uid] = f"error: copied but not removed ({r})"
+        return results
+
+    async def move_many_to_spam(self, uids: List[str], folder: str = "INBOX") -> Dict[str, str]:
+        return await self._move_to_role(uids, 'junk', folder)
+
+    async def delete_many(self, uids: List[str], folder: str = "INBOX") -> Dict[str, str]:
+        """Move UIDs to Trash; without a Trash folder they are flagged \\Deleted and expunged."""
+        if 'trash' not in self._special_folders:
+            await self.discover_special_folders()
+        if 'trash' in self._special_folders:
+            return await self.move_many(uids, self._special_folders['trash'], folder)
+        results = await self._run_chunks(uids, folder, "STORE", "+FLAGS.SILENT (\\Deleted)", "deleted")
+        await self.conn.command("EXPUNGE", check=False)
+        return results
+
+    async def _move_to_role(self, uids: List[str], role: str, folder: str) -> Dict[str, str]:
+        if role not in self._special_folders:
+            await self.discover_special_folders()
+        target = self._special_folders.get(role)
+        if not target:
+            return {uid: f"error: no {role} folder" for uid in uids}
+        return await self.move_many(uids, target, folder)
+
+    async def discover_special_folders(self) -> Dict[str, str]:
+        """Find the Junk and Trash folders with one LIST command (SPECIAL-USE, then well-known names)."""
+        response = await self.conn.command('LIST "" "*"')
+        folders = []
+        for line in response.lines:
+            if not line.upper().startswith(b'LIST '):
+                continue
+            m = _LIST_LINE.match(line[5:])
+            if m:
+                folders.append((_list_name(m.group('name')), m.group('flags').decode().lower().split()))
+        for role, flag in SPECIAL_USE_FLAGS.items():
+            match = next((name for name, flags in folders if flag.lower() in flags), None)
+            if not match:
+                names = {name.lower(): name for name, _ in folders}
+                match = next((names[c.lower()] for c in SPECIAL_USE_NAMES[role] if c.lower() in names), None)
+            if match:
+                self._special_folders[role] = match
+        return dict(self._special_folders)
+
+    async def _run_chunks(self, uids: List[str], folder: str, command: str, args: str, ok: str) -> Dict[str, str]:
+        """Send UID <command> <chunk> <args> per UID_CHUNK_SIZE chunk, all pipelined; report per UID."""
+        if not uids:
+            return {}
+        await self._select(folder)
+        chunks = list(_chunked(uids, UID_CHUNK_SIZE))
+        responses = await self.conn.pipeline((f"UID {command} {','.join(chunk)} {args}" for chunk in chunks),
+                                             check=False)
+        results = {}
+        for chunk, response in zip(chunks, responses):
+            outcome = ok if response.status == 'OK' else f"error: {response.status} {response.text}"
+            results.update({uid: outcome for uid in chunk})
+        return results
+
+
+async def run_accounts(fetchers: List[AsyncEmailFetcher],
+                       handler: Callable[[AsyncEmailFetcher], Awaitable[Any]],
+                       max_per_host: int = 4, max_per_account: int = 1,
+                       deadline_seconds: Optional[float] = None) -> List[Any]:
+    """Connect, run handler(fetcher) and disconnect for every account on the current event loop.
+
+    At most max_per_host connections per IMAP host and max_per_account
+    per account are open at a time (the async counterpart of
+    ConnectionGovernor). With deadline_seconds, each connection must be
+    done that long after it starts. Returns each fetcher's handler
+    result, or the exception its account raised, in the order given.
+    """
+    host_limits: Dict[str, asyncio.Semaphore] = {}
+    account_limits: Dict[str, asyncio.Semaphore] = {}
+
+    async def run_one(fetcher: AsyncEmailFetcher):
+        host = host_limits.setdefault(fetcher.imap_host.lower(), asyncio.Semaphore(max(1, max_per_host)))
+        account = account_limits.setdefault(fetcher.email.lower(), asyncio.Semaphore(max(1, max_per_account)))
+        async with account, host:
+            if deadline_seconds:
+                fetcher.conn.deadline = asyncio.get_running_loop().time() + deadline_seconds
+            try:
+                await fetcher.connect()
+                return await handler(fetcher)
+            finally:
+                await fetcher.disconnect()
+
+    return await asyncio.gather(*(run_one(f) for f in fetchers), return_exceptions=True)
+
+
+def _fetched_message(line: bytes) -> Optional[MailMessage]:
+    """MailMessage from one untagged FETCH response holding UID, FLAGS and the whole message as a literal."""
+    if not _FETCH_LINE.match(line):
+        return None
+    m = _BODY_LITERAL.search(line)
+    if not m:
+        return None
+    end = m.end() + int(m.group(1))
+    raw, meta = line[m.end():end], line[:m.start()] + line[end:]
+    uid = re.search(rb'UID (\d+)', meta)
+    flags = re.search(rb'FLAGS \(([^)]*)\)', meta)
+    if not uid:
+        return None
+    prefix = b'UID ' + uid.group(1) + b' FLAGS (' + (flags.group(1) if flags else b'') + b')'
+    return MailMessage([(prefix, raw)])
+
+
+def _chunked(items: List[str], size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
@@ -1,10 +1,15 @@
 """Email fetching module using imap-tools."""
 from imap_tools import MailBox, AND, MailMessageFlags
-from typing import List, Optional, Callable
+from imap_tools.utils import encode_folder
+from typing import Dict, Iterator, List, Optional, Callable
 from dataclasses import dataclass
+import re
 import socket
 from datetime import datetime
 
+from .governor import ConnectionGovernor
+from .session_pool import SessionPool
+
 
 @dataclass
 class EmailMessage:
@@ -20,25 +25,58 @@ class EmailMessage:
 
 
 class EmailFetcher:
-    def __init__(self, email: str, password: str, imap_host: str, imap_port: int, timeout: int = 60):
+    def __init__(self, email: str, password: str, imap_host: str, imap_port: int, timeout: int = 60,
+                 governor: Optional[ConnectionGovernor] = None, pool: Optional[SessionPool] = None):
         self.email = email
         self.password = password
         self.imap_host = imap_host
         self.imap_port = imap_port
         self.timeout = timeout
         self.mailbox: Optional[MailBox] = None
+        # Shared cap on concurrent sessions; the slot is held from connect() to disconnect()
+        self.governor = governor
+        self._has_slot = False
+        # Optional pool that keeps the logged-in session open after disconnect()
+        self.pool = pool
+        # Folder selected on the current session (None: none, or not known to be one)
+        self._selected: Optional[str] = None
 
     def connect(self):
         """Connect to IMAP server with timeout."""
-        # Set socket timeout to prevent hanging
-        socket.setdefaulttimeout(self.timeout)
-        self.mailbox = MailBox(self.imap_host, self.imap_port)
-        self.mailbox.login(self.email, self.password)
+        if self.governor and not self._has_slot:
+            self.governor.acquire(self.imap_host, self.email)
+            self._has_slot = True
+        try:
+            # Set socket timeout to prevent hanging
+            socket.setdefaulttimeout(self.timeout)
+            if self.pool:
+                if self.mailbox:
+                    # Reconnecting after an error: the old session is not reused
+                    self.pool.discard(self.mailbox)
+                    self.mailbox = None
+                self.mailbox = self.pool.acquire(self.imap_host, self.imap_port, self.email, self.password)
+            else:
+                self.mailbox = MailBox(self.imap_host, self.imap_port)
+                self.mailbox.login(self.email, self.password)
+            # A pooled session may still have the folder of its last run selected
+            self._selected = self.mailbox.folder.get() if self.mailbox.client.state == 'SELECTED' else None
+        except Exception:
+            self._release_slot()
+            raise
         print(f"Connected to {self.email}")
 
+    def _release_slot(self):
+        if self._has_slot:
+            self.governor.release(self.imap_host, self.email)
+            self._has_slot = False
+
     def disconnect(self):
-        """Disconnect from IMAP server."""
-        if self.mailbox:
+        """Disconnect from IMAP server (with a pool: hand the session back for reuse)."""
+        self._selected = None
+        if self.mailbox and self.pool:
+            self.pool.release(self.imap_host, self.imap_port, self.email, self.mailbox)
+            self.mailbox = None
+        elif self.mailbox:
             try:
                 self.mailbox.logout()
                 print(f"Disconnected from {self.email}")
@@ -46,24 +84,77 @@ class EmailFetcher:
                 print(f"Disconnected from {self.email} (forced: {e})")
             finally:
                 self.mailbox = None
+        self._release_slot()
+
+    def _select(self, folder: str):
+        """Select a folder (imap_tools' folder.set result) and remember it as the selected one."""
+        # A failed SELECT leaves no folder selected
+        self._selected = None
+        result = self.mailbox.folder.set(folder)
+        self._selected = folder
+        return result
+
+    def probe_status(self, folder: str = "INBOX") -> Dict[str, int]:
+        """Read a folder's counters with a single STATUS command (no SELECT).
+
+        Returns UIDVALIDITY, UIDNEXT, MESSAGES, UNSEEN and, on servers with
+        CONDSTORE, HIGHESTMODSEQ.
+        STATUS should not be used on the selected folder (RFC 3501 6.3.10),
+        so a session that has it selected leaves it with UNSELECT first; a
+        server without UNSELECT gets a new SELECT, whose response (plus a
+        UID SEARCH UNSEEN) gives the counters.
+        """
+        if not self.mailbox:
+            self.connect()
+        client = self.mailbox.client
+        if client.state == 'SELECTED' and self._selected == folder:
+            if 'UNSELECT' not in client.capabilities:
+                return self._selected_status(folder)
+            client.unselect()
+            self._selected = None
+        items = ['UIDVALIDITY', 'UIDNEXT', 'MESSAGES', 'UNSEEN']
+        if 'CONDSTORE' in self.mailbox.client.capabilities:
+            items.append('HIGHESTMODSEQ')
+        result = self.mailbox.client.status(encode_folder(folder), f"({' '.join(items)})")
+        if result[0] != 'OK' or not result[1] or not result[1][0]:
+            raise RuntimeError(f"STATUS {folder} failed: {result}")
+        data = b' '.join(part if isinstance(part, bytes) else b' '.join(part) for part in result[1] if part)
+        return {k.decode().upper(): int(v) for k, v in re.findall(rb'([A-Za-z]+) (\d+)', data[data.rfind(b'('):])}
+
+    def _selected_status(self, folder: str) -> Dict[str, int]:
+        """probe_status() values from a new SELECT response and UID SEARCH UNSEEN."""
+        result = self._select(folder)
+        responses = self.mailbox.client.untagged_responses
+        status = {'MESSAGES': int(result[1][0]) if result[1] and result[1][0] else 0}
+        names = ['UIDVALIDITY', 'UIDNEXT']
+        if 'CONDSTORE' in self.mailbox.client.capabilities:
+            names.append('HIGHESTMODSEQ')
+        for name in names:
+            values = responses.get(name)
+            if values and values[-1]:
+                status[name] = int(values[-1])
+        status['UNSEEN'] = len(self.mailbox.uids('UNSEEN'))
+        return status
 
     def fetch_unread(self, folder: str = "INBOX", limit: int = 200) -> List[EmailMessage]:
         """Fetch unread emails only."""
+        print(f"Fetching unread emails from {folder} (limit={limit})...")
+        emails = list(self.iter_unread(folder, limit))
+        print(f"  Found {len(emails)} unread emails.")
+        return emails
+
+    def iter_unread(self, folder: str = "INBOX", limit: int = 200) -> Iterator[EmailMessage]:
+        """Yield unread emails, newest first, one at a time as they are downloaded."""
         if not self.mailbox:
             self.connect()
 
-        emails = []
-        self.mailbox.folder.set(folder)
+        self._select(folder)
 
-        print(f"Fetching unread emails from {folder} (limit={limit})...")
         for msg in self.mailbox.fetch(AND(seen=False), limit=limit, reverse=True):
             email_msg = self._parse_message(msg)
             # Explicitly force seen=False because we asked for unread
             email_msg.seen = False 
-            emails.append(email_msg)
-
-        print(f"  Found {len(emails)} unread emails.")
-        return emails
+            yield email_msg
 
     def fetch_all(self, folder: str = "INBOX", limit: int = 200, progress_callback: Optional[Callable[[int], None]] = None) -> List[EmailMessage]:
         """Fetch ALL emails (read and unread) with configurable limit and progress tracking."""
@@ -71,7 +162,7 @@ class EmailFetcher:
             self.connect()
 
         emails = []
-        self.mailbox.folder.set(folder)
+        self._select(folder)
 
         # Fetch emails with configurable limit
         print(f"Fetching up to {limit} emails from {folder} (Newest First)...")
@@ -91,26 +182,7 @@ class EmailFetcher:
 
     def _parse_message(self, msg) -> EmailMessage:
         """Parse IMAP message to EmailMessage dataclass."""
-        # Use clean email address from from_values if available
-        sender_email = msg.from_values.email if msg.from_values else msg.from_
-        
-        # Check if email is already read (seen)
-        is_seen = MailMessageFlags.SEEN in msg.flags
-        
-        # Get Gmail labels if available
-        labels = getattr(msg, 'gmail_labels', [])
-        
-        return EmailMessage(
-            uid=str(msg.uid),
-            subject=msg.subject or "",
-            from_=sender_email or "",
-            text=msg.text or "",
-            html=msg.html or "",
-            date=str(msg.date) if msg.date else "",
-            seen=is_seen,
-            labels=labels,
-            date_obj=msg.date
-        )
+        return _email_message(msg)
 
     def move_to_spam(self, uid: str, folder: str = "INBOX"):
         """Move email to Spam folder."""
@@ -118,13 +190,13 @@ class EmailFetcher:
             self.connect()
 
         try:
-            self.mailbox.folder.set(folder)
+            self._select(folder)
             self._move_to_spam_internal(uid)
         except Exception as e:
             print(f"  [WARN] Connection lost during move to spam ({e}). Reconnecting...")
             try:
                 self.connect()
-                self.mailbox.folder.set(folder)
+                self._select(folder)
                 self._move_to_spam_internal(uid)
             except Exception as e2:
                 print(f"  [ERROR] Failed to move email {uid} to Spam: {e2}")
@@ -152,7 +224,7 @@ class EmailFetcher:
             self.connect()
 
         try:
-            self.mailbox.folder.set(folder)
+            self._select(folder)
             res = self.mailbox.flag(uid, [MailMessageFlags.SEEN], True)
             # res is list of results like [('OK', [b'\\Seen'])]
             if res and ('OK' in str(res) or 'Success' in str(res)):
@@ -163,7 +235,7 @@ class EmailFetcher:
             print(f"  [WARN] Connection lost while marking read ({e}). Reconnecting...")
             try:
                 self.connect()
-                self.mailbox.folder.set(folder)
+                self._select(folder)
                 self.mailbox.flag(uid, [MailMessageFlags.SEEN], True)
                 print(f"  [SUCCESS] Reconnected and marked {uid} as read.")
             except Exception as e2:
@@ -175,13 +247,13 @@ class EmailFetcher:
             self.connect()
 
         try:
-            self.mailbox.folder.set(folder)
+            self._select(folder)
             self._delete_email_internal(uid)
         except Exception as e:
             print(f"  [WARN] Connection lost during delete ({e}). Reconnecting...")
             try:
                 self.connect()
-                self.mailbox.folder.set(folder)
+                self._select(folder)
                 self._delete_email_internal(uid)
             except Exception as e2:
                 print(f"  [ERROR] Failed to delete email {uid}: {e2}")
@@ -204,3 +276,27 @@ class EmailFetcher:
             # Fallback: mark as deleted if move fails
             self.mailbox.delete(uid)
             print(f"  [SUCCESS] Marked email {uid} as deleted (fallback)")
+
+
+def _email_message(msg) -> EmailMessage:
+    """Convert an imap_tools MailMessage to an EmailMessage (shared with the asyncio backend)."""
+    # Use clean email address from from_values if available
+    sender_email = msg.from_values.email if msg.from_values else msg.from_
+
+    # Check if email is already read (seen)
+    is_seen = MailMessageFlags.SEEN in msg.flags
+
+    # Get Gmail labels if available
+    labels = getattr(msg, 'gmail_labels', [])
+
+    return EmailMessage(
+        uid=str(msg.uid),
+        subject=msg.subject or "",
+        from_=sender_email or "",
+        text=msg.text or "",
+        html=msg.html or "",
+        date=str(msg.date) if msg.date else "",
+        seen=is_seen,
+        labels=labels,
+        date_obj=msg.date
+    )
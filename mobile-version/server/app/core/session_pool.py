@@ -0,0 +1,260 @@
+"""Pool of authenticated IMAP sessions that are kept alive between runs."""
+import imaplib
+import random
+import ssl
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from imap_tools import MailBox
+from imap_tools.errors import MailboxLoginError
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of connecting while a host's circuit breaker is open."""
+
+
+class _ResumableIMAP4SSL(imaplib.IMAP4_SSL):
+    """IMAP4_SSL that offers a saved TLS session, so a reconnect can skip the full handshake."""
+
+    def __init__(self, host: str, port: int, ssl_context: ssl.SSLContext,
+                 tls_session: Optional[ssl.SSLSession] = None):
+        self._tls_session = tls_session
+        super().__init__(host, port, ssl_context=ssl_context)
+
+    def _create_socket(self, timeout):
+        sock = imaplib.IMAP4._create_socket(self, timeout)
+        return self.ssl_context.wrap_socket(sock, server_hostname=self.host, session=self._tls_session)
+
+
+class _ResumableMailBox(MailBox):
+    def __init__(self, host: str, port: int, ssl_context: ssl.SSLContext,
+                 tls_session: Optional[ssl.SSLSession] = None):
+        self._tls_session = tls_session
+        super().__init__(host, port, ssl_context=ssl_context)
+
+    def _get_mailbox_client(self) -> imaplib.IMAP4:
+        return _ResumableIMAP4SSL(self._host, self._port, self._ssl_context, self._tls_session)
+
+
+@dataclass
+class _IdleSession:
+    mailbox: MailBox
+    # monotonic times: when it was returned to the pool / last NOOPed
+    idle_since: float
+    last_noop: float
+
+
+class SessionPool:
+    """Keeps one authenticated session per account open between runs.
+
+    acquire() hands out the idle session for an account after checking it
+    with NOOP, or opens a new one. New connections offer the last TLS
+    session for the host (session resumption), retry with exponential
+    backoff, and count toward a per-host circuit breaker: after
+    failure_threshold consecutive failures the host is not contacted for
+    breaker_cooldown seconds. Bad credentials are never retried.
+    A background thread NOOPs idle sessions every keepalive_interval
+    seconds and closes those idle for longer than max_idle.
+
+    Idle sessions are still open connections, but the ConnectionGovernor
+    only counts sessions in use. So the pool keeps at most max_per_host
+    sessions per host open, in use or idle: before it opens another one,
+    it logs out of the least recently used idle sessions of that host.
+    """
+
+    def __init__(self, keepalive_interval: int = 240, max_idle: int = 7200, retries: int = 3,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0,
+                 failure_threshold: int = 5, breaker_cooldown: int = 300, max_per_host: int = 4):
+        self.keepalive_interval = keepalive_interval
+        self.max_idle = max_idle
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.max_per_host = max(1, max_per_host)
+
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple[str, int, str], _IdleSession] = {}
+        # Sessions the pool opened and has not closed yet (in use or idle), and how many per host
+        self._hosts: Dict[MailBox, str] = {}
+        self._open_count: Dict[str, int] = {}
+        self._ssl_context = ssl.create_default_context()
+        self._tls_sessions: Dict[Tuple[str, int], ssl.SSLSession] = {}
+        self._failures: Dict[str, int] = {}
+        self._open_until: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._keepalive_thread: Optional[threading.Thread] = None
+        self.stats = {'reused': 0, 'opened': 0, 'tls_resumed': 0, 'failed': 0, 'evicted': 0}
+
+    def acquire(self, host: str, port: int, email: str, password: str) -> MailBox:
+        """Return a logged-in MailBox for the account, reusing an idle session if it still answers."""
+        key = (host.lower(), port, email)
+        with self._lock:
+            idle = self._idle.pop(key, None)
+        if idle:
+            if self._noop(idle.mailbox):
+                self.stats['reused'] += 1
+                return idle.mailbox
+            self.discard(idle.mailbox)
+        return self._open(key, password)
+
+    def release(self, host: str, port: int, email: str, mailbox: MailBox):
+        """Return a session to the pool for the next run."""
+        key = (host.lower(), port, email)
+        session = getattr(mailbox.client.sock, 'session', None)
+        now = time.monotonic()
+        with self._lock:
+            if session is not None:
+                self._tls_sessions[(key[0], port)] = session
+            previous = self._idle.get(key)
+            self._idle[key] = _IdleSession(mailbox, idle_since=now, last_noop=now)
+        if previous and previous.mailbox is not mailbox:
+            self.discard(previous.mailbox)
+        self._start_keepalive()
+
+    def discard(self, mailbox: MailBox):
+        """Close a session that should not be reused (e.g. after a connection error)."""
+        with self._lock:
+            host = self._hosts.pop(mailbox, None)
+            if host is not None:
+                self._open_count[host] -= 1
+        try:
+            mailbox.logout()
+        except Exception:
+            try:
+                mailbox.client.shutdown()
+            except Exception:
+                pass
+
+    def close(self):
+        """Stop the keepalive thread and log out of all idle sessions."""
+        self._stop.set()
+        with self._lock:
+            idle = list(self._idle.values())
+            self._idle.clear()
+        for session in idle:
+            self.discard(session.mailbox)
+
+    def _open(self, key: Tuple[str, int, str], password: str) -> MailBox:
+        host = key[0]
+        self._make_room(host)
+        try:
+            mailbox = self._connect(key, password)
+        except BaseException:
+            with self._lock:
+                self._open_count[host] -= 1
+            raise
+        with self._lock:
+            self._hosts[mailbox] = host
+        return mailbox
+
+    def _make_room(self, host: str):
+        """Count a new session for host, first closing its least recently used idle ones above max_per_host."""
+        with self._lock:
+            evicted = []
+            while self._open_count.get(host, 0) + 1 > self.max_per_host:
+                idle = [(session.idle_since, key) for key, session in self._idle.items() if key[0] == host]
+                if not idle:
+                    # All of them in use: the governor holds back sessions beyond its cap
+                    break
+                session = self._idle.pop(min(idle)[1])
+                self._hosts.pop(session.mailbox, None)
+                self._open_count[host] -= 1
+                evicted.append(session.mailbox)
+            self._open_count[host] = self._open_count.get(host, 0) + 1
+        for mailbox in evicted:
+            self.stats['evicted'] += 1
+            self.discard(mailbox)
+
+    def _connect(self, key: Tuple[str, int, str], password: str) -> MailBox:
+        host, port, email = key
+        for attempt in range(self.retries + 1):
+            self._check_breaker(host)
+            mailbox = None
+            try:
+                mailbox = _ResumableMailBox(host, port, self._ssl_context, self._tls_sessions.get((host, port)))
+                # Left unselected, so the caller can still ENABLE extensions
+                mailbox.login(email, password, initial_folder=None)
+            except MailboxLoginError:
+                # Bad credentials: retrying (or blaming the host) will not help
+                if mailbox:
+                    self.discard(mailbox)
+                raise
+            except (OSError, imaplib.IMAP4.error) as e:
+                self.stats['failed'] += 1
+                self._record_failure(host)
+                if attempt == self.retries or self._is_open(host):
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+                print(f"  [WARN] IMAP connection to {host} failed ({e}). Retrying in {delay:.1f}s...")
+                time.sleep(delay)
+                continue
+
+            self._record_success(host)
+            self.stats['opened'] += 1
+            if getattr(mailbox.client.sock, 'session_reused', False):
+                self.stats['tls_resumed'] += 1
+            return mailbox
+
+    def _is_open(self, host: str) -> bool:
+        with self._lock:
+            return self._open_until.get(host, 0) > time.monotonic()
+
+    def _check_breaker(self, host: str):
+        with self._lock:
+            remaining = self._open_until.get(host, 0) - time.monotonic()
+        if remaining > 0:
+            raise CircuitOpenError(f"IMAP host {host} keeps failing; not retrying for another {remaining:.0f}s")
+
+    def _record_failure(self, host: str):
+        with self._lock:
+            # Not reset when the breaker opens: after the cooldown one more failure re-opens it
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            if failures >= self.failure_threshold:
+                self._open_until[host] = time.monotonic() + self.breaker_cooldown
+                print(f"  [WARN] {failures} consecutive connection failures to {host}, "
+                      f"pausing it for {self.breaker_cooldown}s")
+
+    def _record_success(self, host: str):
+        with self._lock:
+            self._failures.pop(host, None)
+            self._open_until.pop(host, None)
+
+    def _noop(self, mailbox: MailBox) -> bool:
+        try:
+            return mailbox.client.noop()[0] == 'OK'
+        except Exception:
+            return False
+
+    def _start_keepalive(self):
+        with self._lock:
+            if self._keepalive_thread and self._keepalive_thread.is_alive():
+                return
+            self._stop.clear()
+            self._keepalive_thread = threading.Thread(target=self._keepalive_loop, daemon=True)
+            self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        while not self._stop.wait(self.keepalive_interval):
+            now = time.monotonic()
+            with self._lock:
+                due = [(key, s) for key, s in self._idle.items()
+                       if now - s.last_noop >= self.keepalive_interval or now - s.idle_since >= self.max_idle]
+                # Take them out while NOOPing so acquire() never gets a session mid-command
+                for key, _ in due:
+                    del self._idle[key]
+
+            for key, session in due:
+                if now - session.idle_since >= self.max_idle or not self._noop(session.mailbox):
+                    self.discard(session.mailbox)
+                    continue
+                session.last_noop = time.monotonic()
+                with self._lock:
+                    if key not in self._idle:
+                        self._idle[key] = session
+                        continue
+                self.discard(session.mailbox)
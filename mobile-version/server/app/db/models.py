@@ -35,3 +35,17 @@ class UserConfig(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = Column(Boolean, default=True)
+
+
+class MailboxStatus(Base):
+    """INBOX STATUS recorded after the last complete check of an account"""
+    __tablename__ = 'mailbox_status'
+
+    id = Column(Integer, primary_key=True)
+    account = Column(String, unique=True, nullable=False, index=True)
+    uidvalidity = Column(Integer)
+    uidnext = Column(Integer)
+    messages = Column(Integer)
+    unseen = Column(Integer)
+    highestmodseq = Column(Integer, nullable=True)  # Only on servers with CONDSTORE
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
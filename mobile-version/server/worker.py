@@ -4,6 +4,7 @@ Mail Agent Server Worker
 Processes emails for all users based on their synced configs.
 """
 
+import asyncio
 import os
 import sys
 import time
@@ -16,8 +17,11 @@ from typing import Dict, List
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
 
 from db.database import SessionLocal, init_db
-from db.models import Summary, UserConfig
+from db.models import MailboxStatus, Summary, UserConfig
+from core.async_fetcher import AsyncEmailFetcher, run_accounts
 from core.fetcher import EmailFetcher
+from core.governor import ConnectionGovernor
+from core.session_pool import SessionPool
 from core.gemini_summarizer import GeminiSummarizer
 from core.huggingface_summarizer import HuggingFaceSummarizer
 from core.nvidia_summarizer import NvidiaSummarizer
@@ -34,6 +38,19 @@ def load_server_config():
 
 SERVER_CONFIG = load_server_config()
 
+# Shared by all users: many accounts live on the same provider (imap.gmail.com)
+IMAP_GOVERNOR = ConnectionGovernor(
+    max_per_host=SERVER_CONFIG['worker'].get('max_connections_per_host', 4),
+    max_per_account=SERVER_CONFIG['worker'].get('max_connections_per_account', 1)
+)
+
+# Optional: logged-in sessions survive the sleep between checks (NOOP keepalive), so users are
+# not re-authenticated every interval. Off by default: with many users on one provider, only
+# max_connections_per_host of them can stay logged in anyway
+IMAP_POOL = None
+if SERVER_CONFIG['worker'].get('keep_sessions', False):
+    IMAP_POOL = SessionPool(max_per_host=SERVER_CONFIG['worker'].get('max_connections_per_host', 4))
+
 # AI Provider setup based on server config
 def get_summarizer():
     """Get AI summarizer based on server config"""
@@ -96,6 +113,85 @@ def cleanup_old_summaries(db, retention_days: int = 30):
     if deleted > 0:
         print(f"🗑️  Cleaned up {deleted} old summaries (older than {retention_days} days)")
 
+STATUS_FIELDS = ('uidvalidity', 'uidnext', 'messages', 'unseen', 'highestmodseq')
+
+def mailbox_unchanged(db, account: str, status: Dict[str, int]) -> bool:
+    """True if the INBOX STATUS equals the one saved after the last complete check"""
+    saved = db.query(MailboxStatus).filter(MailboxStatus.account == account).first()
+    if not saved:
+        return False
+    return all(getattr(saved, f) == status.get(f.upper()) for f in STATUS_FIELDS)
+
+def save_mailbox_status(db, account: str, status: Dict[str, int]):
+    """Remember the INBOX STATUS after a complete check"""
+    saved = db.query(MailboxStatus).filter(MailboxStatus.account == account).first()
+    if not saved:
+        saved = MailboxStatus(account=account)
+        db.add(saved)
+    for f in STATUS_FIELDS:
+        setattr(saved, f, status.get(f.upper()))
+    db.commit()
+
+def email_action(email, trusted_senders, spam_keywords, delete_keywords) -> str:
+    """What to do with an unread email: 'trusted', 'spam', 'delete' or 'summarize'"""
+    sender_lower = email.from_.lower()
+    subject_lower = email.subject.lower()
+    body_lower = (email.text or '').lower()
+
+    if any(t.lower() in sender_lower for t in trusted_senders):
+        return 'trusted'
+    if any(kw.lower() in subject_lower or kw.lower() in body_lower for kw in spam_keywords):
+        return 'spam'
+    if any(kw.lower() in subject_lower or kw.lower() in body_lower for kw in delete_keywords):
+        return 'delete'
+    return 'summarize'
+
+def summarize_email(user_id, email, summarizer, telegram_sender, telegram_chat_id, db):
+    """Summarize an email, save the summary and send it to Telegram"""
+    print(f"    📝 Summarizing: {email.subject[:40]}")
+
+    email_data = {
+        'from': email.from_,
+        'subject': email.subject,
+        'body': email.text or email.html
+    }
+
+    summary_text = summarizer.summarize(email_data)
+
+    # Save to database
+    new_summary = Summary(
+        user_id=user_id,
+        sender=email.from_,
+        subject=email.subject,
+        summary_text=summary_text,
+        received_at=email.date_obj or datetime.utcnow(),
+        synced=False
+    )
+    db.add(new_summary)
+    db.commit()
+
+    # Send to Telegram
+    if telegram_chat_id:
+        telegram_sender.chat_id = int(telegram_chat_id)
+        telegram_sender.send_summary({
+            'summarized': [{
+                'subject': email.subject,
+                'summary': summary_text,
+                'from': email.from_
+            }],
+            'summarized_count': 1
+        })
+
+def user_patterns(config: Dict):
+    """Trusted senders, spam keywords and delete keywords of a user config, as sets"""
+    patterns = config.get('patterns', {})
+    return (set(patterns.get('trusted_senders', [])),
+            set(patterns.get('spam_keywords', [])),
+            set(patterns.get('delete_keywords', [])))
+
+# Unread emails handled per account and check
+UNREAD_LIMIT = 20
+
 def process_user_emails(user_data: Dict, summarizer, telegram_sender, db):
     """Process emails for a single user"""
     user_id = user_data['user_id']
@@ -103,12 +199,7 @@ def process_user_emails(user_data: Dict, summarizer, telegram_sender, db):
     
     telegram_chat_id = config.get('telegram_chat_id')
     emails = config.get('emails', [])
-    patterns = config.get('patterns', {})
-    
-    # Convert pattern lists to sets for fast lookup
-    trusted_senders = set(patterns.get('trusted_senders', []))
-    spam_keywords = set(patterns.get('spam_keywords', []))
-    delete_keywords = set(patterns.get('delete_keywords', []))
+    trusted_senders, spam_keywords, delete_keywords = user_patterns(config)
     
     summaries_created = 0
     
@@ -127,85 +218,169 @@ def process_user_emails(user_data: Dict, summarizer, telegram_sender, db):
             email=email_addr,
             password=password,
             imap_host=imap_host,
-            imap_port=imap_port
+            imap_port=imap_port,
+            governor=IMAP_GOVERNOR,
+            pool=IMAP_POOL
         )
         
         try:
-            unread = fetcher.fetch_unread(limit=20)
+            # Fast path: one STATUS command; an account without changes is not scanned
+            status = fetcher.probe_status()
+            if mailbox_unchanged(db, email_addr, status):
+                print("    No changes since the last check")
+                continue
+
+            # Streamed: filtering/summarizing starts on the first message
+            limit = UNREAD_LIMIT
+            unread = fetcher.iter_unread(limit=limit)
+            handled = 0
             
             for email in unread:
-                # Apply filters
-                sender_lower = email.from_.lower()
-                subject_lower = email.subject.lower()
-                body_lower = (email.text or '').lower()
-                
-                # Check trusted
-                if any(t.lower() in sender_lower for t in trusted_senders):
+                handled += 1
+                action = email_action(email, trusted_senders, spam_keywords, delete_keywords)
+
+                if action == 'trusted':
                     print(f"    ✓ [TRUSTED] {email.subject[:40]}")
                     fetcher.mark_as_read(email.uid)
                     continue
-                
-                # Check spam
-                if any(kw.lower() in subject_lower or kw.lower() in body_lower for kw in spam_keywords):
+                if action == 'spam':
                     print(f"    🚫 [SPAM] {email.subject[:40]}")
                     fetcher.move_to_spam(email.uid)
                     continue
-                
-                # Check delete
-                if any(kw.lower() in subject_lower or kw.lower() in body_lower for kw in delete_keywords):
+                if action == 'delete':
                     print(f"    🗑️ [DELETE] {email.subject[:40]}")
                     fetcher.delete_email(email.uid)
                     continue
                 
-                # Summarize
-                print(f"    📝 Summarizing: {email.subject[:40]}")
-                
-                email_data = {
-                    'from': email.from_,
-                    'subject': email.subject,
-                    'body': email.text or email.html
-                }
-                
-                summary_text = summarizer.summarize(email_data)
-                
-                # Save to database
-                new_summary = Summary(
-                    user_id=user_id,
-                    sender=email.from_,
-                    subject=email.subject,
-                    summary_text=summary_text,
-                    received_at=email.date_obj or datetime.utcnow(),
-                    synced=False
-                )
-                db.add(new_summary)
-                db.commit()
+                summarize_email(user_id, email, summarizer, telegram_sender, telegram_chat_id, db)
                 summaries_created += 1
                 
-                # Send to Telegram
-                if telegram_chat_id:
-                    telegram_sender.chat_id = int(telegram_chat_id)
-                    telegram_sender.send_summary({
-                        'summarized': [{
-                            'subject': email.subject,
-                            'summary': summary_text,
-                            'from': email.from_
-                        }],
-                        'summarized_count': 1
-                    })
-                
                 # Mark as read
                 fetcher.mark_as_read(email.uid)
                 
                 # Small delay
                 time.sleep(1)
-            
-            fetcher.disconnect()
+
+            # Only a check that handled every unread email may be skipped next time.
+            # UIDNEXT is the one from before the check, so mail that arrived meanwhile counts as a change.
+            if handled < limit:
+                after = fetcher.probe_status()
+                after['UIDNEXT'] = status.get('UIDNEXT')
+                save_mailbox_status(db, email_addr, after)
             
         except Exception as e:
             print(f"    ❌ Error with {email_addr}: {str(e)[:50]}")
+        finally:
+            # Also frees the account's connection slot in the governor
+            fetcher.disconnect()
     
     return summaries_created
 
+def process_all_users_async(user_configs: List[Dict], summarizer, telegram_sender, db) -> int:
+    """Process every user's accounts with the asyncio IMAP backend (worker.imap_backend: async)
+
+    One event loop reads all accounts at once (STATUS, then the unread
+    emails with pipelined FETCHes), within the same per-host and
+    per-account caps as the blocking path. Filtering and summarizing then
+    run as before, one email at a time, and a second pass applies each
+    account's moves and mark-reads as pipelined batches.
+    """
+    worker_config = SERVER_CONFIG['worker']
+    caps = dict(
+        max_per_host=worker_config.get('max_connections_per_host', 4),
+        max_per_account=worker_config.get('max_connections_per_account', 1),
+        deadline_seconds=worker_config.get('account_deadline_seconds', 300)
+    )
+    accounts = [(user_data, email_config)
+                for user_data in user_configs
+                for email_config in user_data['config'].get('emails', [])
+                if email_config.get('enabled', True)]
+
+    def new_fetcher(email_config):
+        return AsyncEmailFetcher(
+            email=email_config['email'],
+            password=email_config['password'],
+            imap_host=email_config.get('imap_host', 'imap.gmail.com'),
+            imap_port=email_config.get('imap_port', 993)
+        )
+
+    async def read(fetcher):
+        # Fast path: one STATUS command; an account without changes is not scanned
+        status = await fetcher.probe_status()
+        if mailbox_unchanged(db, fetcher.email, status):
+            return status, None
+        return status, await fetcher.fetch_unread(limit=UNREAD_LIMIT)
+
+    reads = asyncio.run(run_accounts([new_fetcher(c) for _, c in accounts], read, **caps))
+
+    summaries_created = 0
+    # Per account to act on: (email_config, status before, uids per action, whether all unread were handled)
+    pending = []
+    for (user_data, email_config), result in zip(accounts, reads):
+        email_addr = email_config['email']
+        print(f"\n👤 {user_data['user_id']} 📧 {email_addr}")
+        if isinstance(result, BaseException):
+            print(f"    ❌ Error with {email_addr}: {str(result)[:50]}")
+            continue
+        status, unread = result
+        if unread is None:
+            print("    No changes since the last check")
+            continue
+
+        config = user_data['config']
+        trusted_senders, spam_keywords, delete_keywords = user_patterns(config)
+        uids = {'read': [], 'spam': [], 'delete': []}
+        complete = len(unread) < UNREAD_LIMIT
+        for email in unread:
+            action = email_action(email, trusted_senders, spam_keywords, delete_keywords)
+            if action == 'trusted':
+                print(f"    ✓ [TRUSTED] {email.subject[:40]}")
+                uids['read'].append(email.uid)
+            elif action == 'spam':
+                print(f"    🚫 [SPAM] {email.subject[:40]}")
+                uids['spam'].append(email.uid)
+            elif action == 'delete':
+                print(f"    🗑️ [DELETE] {email.subject[:40]}")
+                uids['delete'].append(email.uid)
+            else:
+                try:
+                    summarize_email(user_data['user_id'], email, summarizer, telegram_sender,
+                                    config.get('telegram_chat_id'), db)
+                except Exception as e:
+                    # Left unread: summarized on the next check
+                    print(f"    ❌ Could not summarize {email.subject[:40]}: {str(e)[:50]}")
+                    complete = False
+                    continue
+                summaries_created += 1
+                uids['read'].append(email.uid)
+        pending.append((email_config, status, uids, complete))
+
+    async def act(fetcher, uids, complete):
+        results = {}
+        results.update(await fetcher.move_many_to_spam(uids['spam']))
+        results.update(await fetcher.delete_many(uids['delete']))
+        results.update(await fetcher.mark_many_as_read(uids['read']))
+        return results, (await fetcher.probe_status() if complete else None)
+
+    plans = {new_fetcher(email_config): (uids, complete) for email_config, _, uids, complete in pending}
+    outcomes = asyncio.run(run_accounts(list(plans), lambda f: act(f, *plans[f]), **caps))
+
+    for (email_config, status, _, _), outcome in zip(pending, outcomes):
+        email_addr = email_config['email']
+        if isinstance(outcome, BaseException):
+            print(f"    ❌ Error with {email_addr}: {str(outcome)[:50]}")
+            continue
+        results, after = outcome
+        failed = {uid: r for uid, r in results.items() if r.startswith('error')}
+        for uid, r in failed.items():
+            print(f"    ❌ {email_addr} email {uid}: {r[:60]}")
+        # As in the blocking path: only a complete check may be skipped next time
+        if after is not None and not failed:
+            after['UIDNEXT'] = status.get('UIDNEXT')
+            save_mailbox_status(db, email_addr, after)
+
+    return summaries_created
+
 def run_worker():
     """Main worker loop"""
     print("="*50)
@@ -240,16 +415,24 @@ def run_worker():
             else:
                 total_summaries = 0
                 
-                for user_data in user_configs:
-                    user_id = user_data['user_id']
-                    print(f"\n👤 Processing user: {user_id}")
-                    
-                    summaries = process_user_emails(
-                        user_data, summarizer, telegram_sender, db
-                    )
-                    total_summaries += summaries
+                if SERVER_CONFIG['worker'].get('imap_backend', 'blocking') == 'async':
+                    total_summaries = process_all_users_async(user_configs, summarizer, telegram_sender, db)
+                else:
+                    for user_data in user_configs:
+                        user_id = user_data['user_id']
+                        print(f"\n👤 Processing user: {user_id}")
+                        
+                        summaries = process_user_emails(
+                            user_data, summarizer, telegram_sender, db
+                        )
+                        total_summaries += summaries
                 
                 print(f"\n✅ Done! Created {total_summaries} summaries")
+
+                for host, stats in IMAP_GOVERNOR.stats().items():
+                    if stats['waited']:
+                        print(f"⏳ IMAP {host}: {stats['waited']}/{stats['acquired']} session(s) queued "
+                              f"(avg {stats['avg_wait']}s, max {stats['max_wait']}s)")
             
             # Cleanup old summaries
             if SERVER_CONFIG['retention']['auto_cleanup']:
@@ -267,4 +450,9 @@ def run_worker():
             time.sleep(60)  # Wait 1 minute before retry
 
 if __name__ == "__main__":
-    run_worker()
+    try:
+        run_worker()
+    finally:
+        # Log out of the sessions kept open between checks (worker.keep_sessions)
+        if IMAP_POOL:
+            IMAP_POOL.close()
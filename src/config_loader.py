@@ -2,7 +2,7 @@
 import os
 import sys
 import yaml
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Optional
 
 
@@ -13,6 +13,7 @@ class EmailConfig:
     imap_port: int
     password: str
     enabled: bool
+    compress: bool = False  # RFC 4978 COMPRESS=DEFLATE when the server offers it
 
 
 @dataclass
@@ -67,6 +68,8 @@ class LocalAIConfig:
 class ScheduleConfig:
     enabled: bool
     interval_hours: int
+    # Also process new mail as soon as IMAP IDLE reports it
+    idle_push: bool = False
 
 
 @dataclass
@@ -83,6 +86,41 @@ class ReportConfig:
     max_emails_per_report: int
 
 
+@dataclass
+class SyncConfig:
+    # Only fetch messages above the stored UID watermark (full scan on UIDVALIDITY change)
+    incremental: bool = True
+    state_db: str = "data/mail_state.db"
+    # Bytes of the main text part downloaded per purpose (0 = whole message)
+    filter_body_bytes: int = 65536
+    summary_body_bytes: int = 16384
+    # Accounts processed concurrently by run_once (1 = one after another)
+    account_workers: int = 1
+    # Simultaneous IMAP sessions allowed per server host / per account
+    max_connections_per_host: int = 4
+    max_connections_per_account: int = 1
+    # Keep IMAP sessions logged in between runs instead of reconnecting every time
+    keep_sessions: bool = True
+    # Also match sender/subject rules against the whole INBOX with IMAP SEARCH (newest N matches per run)
+    server_search: bool = False
+    server_search_limit: int = 1000
+    # Seconds between checks of config/patterns for edited files (0 = no polling; tray saves still apply)
+    pattern_reload_seconds: float = 2.0
+
+
+@dataclass
+class BackfillConfig:
+    # Run the sweep in the background next to the scheduler (otherwise: python src/main.py --backfill)
+    background: bool = False
+    folder: str = "INBOX"
+    # UIDs per chunk; moves are flushed and progress is checkpointed after each chunk
+    chunk_size: int = 500
+    # Throughput target: chunks are paced to average about this many messages per minute (0 = no pacing)
+    messages_per_minute: int = 2000
+    # Minimum pause between chunks, leaving the account's IMAP session to the regular runs
+    pause_seconds: float = 2.0
+
+
 @dataclass
 class AppConfig:
     schedule: ScheduleConfig
@@ -97,6 +135,8 @@ class AppConfig:
     nvidia: NvidiaConfig
     groq: GroqConfig
     localai: LocalAIConfig
+    sync: SyncConfig = field(default_factory=SyncConfig)
+    backfill: BackfillConfig = field(default_factory=BackfillConfig)
 
 
 def load_pattern_file(filepath: str) -> List[str]:
@@ -128,7 +168,8 @@ def load_config(config_dir: str = "config") -> AppConfig:
 
     schedule = ScheduleConfig(
         enabled=settings['schedule']['enabled'],
-        interval_hours=settings['schedule']['interval_hours']
+        interval_hours=settings['schedule']['interval_hours'],
+        idle_push=settings['schedule'].get('idle_push', False)
     )
 
     ai = AIConfig(
@@ -149,7 +190,8 @@ def load_config(config_dir: str = "config") -> AppConfig:
             imap_host=e['imap_host'],
             imap_port=e['imap_port'],
             password=e['password'],
-            enabled=e['enabled']
+            enabled=e['enabled'],
+            compress=e.get('compress', False)
         )
         for e in credentials['emails']
     ]
@@ -193,6 +235,28 @@ def load_config(config_dir: str = "config") -> AppConfig:
         secondary_model=settings.get('localai', {}).get('secondary_model')
     )
 
+    sync = SyncConfig(
+        incremental=settings.get('sync', {}).get('incremental', True),
+        state_db=settings.get('sync', {}).get('state_db', 'data/mail_state.db'),
+        filter_body_bytes=settings.get('sync', {}).get('filter_body_bytes', 65536),
+        summary_body_bytes=settings.get('sync', {}).get('summary_body_bytes', 16384),
+        account_workers=settings.get('sync', {}).get('account_workers', 1),
+        max_connections_per_host=settings.get('sync', {}).get('max_connections_per_host', 4),
+        max_connections_per_account=settings.get('sync', {}).get('max_connections_per_account', 1),
+        keep_sessions=settings.get('sync', {}).get('keep_sessions', True),
+        server_search=settings.get('sync', {}).get('server_search', False),
+        server_search_limit=settings.get('sync', {}).get('server_search_limit', 1000),
+        pattern_reload_seconds=settings.get('sync', {}).get('pattern_reload_seconds', 2.0)
+    )
+
+    backfill = BackfillConfig(
+        background=settings.get('backfill', {}).get('background', False),
+        folder=settings.get('backfill', {}).get('folder', 'INBOX'),
+        chunk_size=settings.get('backfill', {}).get('chunk_size', 500),
+        messages_per_minute=settings.get('backfill', {}).get('messages_per_minute', 2000),
+        pause_seconds=settings.get('backfill', {}).get('pause_seconds', 2.0)
+    )
+
     return AppConfig(
         schedule=schedule,
         ai=ai,
@@ -205,5 +269,7 @@ def load_config(config_dir: str = "config") -> AppConfig:
         huggingface=huggingface,
         nvidia=nvidia,
         groq=groq,
-        localai=localai
+        localai=localai,
+        sync=sync,
+        backfill=backfill
     )
@@ -0,0 +1,64 @@
+"""Buffered IMAP actions, flushed per folder as UID-set commands."""
+from typing import Dict, List, Tuple
+
+from .fetcher import EmailFetcher
+
+SPAM = 'spam'
+TRASH = 'trash'
+READ = 'read'
+
+
+class ActionBuffer:
+    """Collects move/delete/mark-read decisions and applies them in batches.
+
+    Has the same move_to_spam / delete_email / mark_as_read methods as
+    EmailFetcher, so it can be passed wherever a fetcher is used to act on
+    messages. Nothing is sent to the server until flush() is called.
+    """
+
+    def __init__(self, fetcher: EmailFetcher):
+        self.fetcher = fetcher
+        # (action, folder) -> UIDs in the order they were queued
+        self._pending: Dict[Tuple[str, str], List[str]] = {}
+        self._queued = set()
+
+    def move_to_spam(self, uid: str, folder: str = "INBOX"):
+        self._queue(SPAM, uid, folder)
+
+    def delete_email(self, uid: str, folder: str = "INBOX"):
+        self._queue(TRASH, uid, folder)
+
+    def mark_as_read(self, uid: str, folder: str = "INBOX"):
+        self._queue(READ, uid, folder)
+
+    def _queue(self, action: str, uid: str, folder: str):
+        # First decision wins: a message is never both moved to Spam and to Trash
+        key = (READ if action == READ else 'move', folder, uid)
+        if key in self._queued:
+            return
+        self._queued.add(key)
+        self._pending.setdefault((action, folder), []).append(uid)
+
+    def __len__(self) -> int:
+        return sum(len(uids) for uids in self._pending.values())
+
+    def flush(self) -> Dict[str, str]:
+        """Send all queued actions, one UID-set command per action and folder.
+
+        Returns a per-UID result report (see EmailFetcher.move_many_to_spam).
+        Mark-read runs before moves so flags are set while the messages are
+        still in the source folder.
+        """
+        results = {}
+        order = {READ: 0, SPAM: 1, TRASH: 2}
+        for action, folder in sorted(self._pending, key=lambda k: (k[1], order[k[0]])):
+            # Taken out before sending: a flush repeated after an error does not send it again
+            uids = self._pending.pop((action, folder))
+            self._queued.difference_update((READ if action == READ else 'move', folder, uid) for uid in uids)
+            if action == READ:
+                results.update(self.fetcher.mark_many_as_read(uids, folder))
+            elif action == SPAM:
+                results.update(self.fetcher.move_many_to_spam(uids, folder))
+            else:
+                results.update(self.fetcher.delete_many(uids, folder))
+        return results
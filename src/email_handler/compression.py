@@ -0,0 +1,103 @@
+"""RFC 4978 COMPRESS=DEFLATE for imaplib sessions."""
+import imaplib
+import zlib
+from typing import Dict
+
+# imaplib refuses commands it does not know; COMPRESS is valid once authenticated
+imaplib.Commands.setdefault('COMPRESS', ('AUTH', 'SELECTED'))
+
+RECV_SIZE = 64 * 1024
+
+
+class CompressionError(imaplib.IMAP4.abort):
+    """The compressed stream is corrupt; the session cannot be used any more."""
+
+
+class DeflateStream:
+    """Raw DEFLATE on both directions of an imaplib connection.
+
+    Stands in for the client's buffered socket file (read/readline) and
+    send(), so every imaplib and imap_tools command keeps working
+    unchanged. Counts bytes on the wire and bytes after inflating, for
+    the run stats.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self._inflate = zlib.decompressobj(-zlib.MAX_WBITS)
+        self._deflate = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._buffer = bytearray()
+        # Set once the inflater hits bad data; the account then falls back to plain IMAP
+        self.failed = False
+        self.wire_in = self.data_in = self.wire_out = self.data_out = 0
+
+    def _fill(self):
+        chunk = self.sock.recv(RECV_SIZE)
+        if not chunk:
+            raise imaplib.IMAP4.abort('socket error: EOF')
+        self.wire_in += len(chunk)
+        try:
+            data = self._inflate.decompress(chunk)
+        except zlib.error as e:
+            self.failed = True
+            raise CompressionError(f'COMPRESS stream error: {e}')
+        self.data_in += len(data)
+        self._buffer += data
+
+    def read(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            self._fill()
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readline(self, limit: int = -1) -> bytes:
+        while True:
+            end = self._buffer.find(b'\n')
+            if end >= 0:
+                size = end + 1
+                break
+            if 0 <= limit <= len(self._buffer):
+                size = limit
+                break
+            self._fill()
+        if 0 <= limit < size:
+            size = limit
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def send(self, data: bytes):
+        wire = self._deflate.compress(data) + self._deflate.flush(zlib.Z_SYNC_FLUSH)
+        self.data_out += len(data)
+        self.wire_out += len(wire)
+        self.sock.sendall(wire)
+
+    def close(self):
+        # imaplib closes the socket itself on shutdown
+        pass
+
+    def counters(self) -> Dict[str, int]:
+        return {'wire': self.wire_in + self.wire_out, 'data': self.data_in + self.data_out}
+
+
+def enable_compression(client: imaplib.IMAP4) -> bool:
+    """Send COMPRESS DEFLATE and switch the client's I/O over to a DeflateStream.
+
+    Returns True if the session is compressed (also when it already
+    was), False if the server does not offer it or refused it. Errors
+    while sending the command propagate (the session is then unusable).
+    """
+    if getattr(client, 'deflate', None):
+        return True
+    if 'COMPRESS=DEFLATE' not in client.capabilities:
+        return False
+    typ, _ = client._simple_command('COMPRESS', 'DEFLATE')
+    if typ != 'OK':
+        return False
+    # The server compresses everything after its tagged OK, which imaplib has consumed
+    stream = DeflateStream(client.sock)
+    client.file = stream
+    client.send = stream.send
+    client.deflate = stream
+    return True
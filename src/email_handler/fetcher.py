@@ -1,44 +1,314 @@
 """Email fetching module using imap-tools."""
-from imap_tools import MailBox, AND, MailMessageFlags
-from typing import List, Optional, Callable
+from imap_tools import MailBox, MailMessage, MailMessageFlags
+from imap_tools.errors import (MailboxCopyError, MailboxFetchError, MailboxFolderStatusError, MailboxMoveError,
+                               MailboxUidsError)
+from imap_tools.utils import encode_folder
+from typing import Dict, Iterable, Iterator, List, Optional, Callable, Tuple
 from dataclasses import dataclass
+import re
 import socket
+import time
 from datetime import datetime
 
+from .compression import enable_compression
+from .governor import ConnectionGovernor
+from .html_text import normalize_body, visible_text
+from .imap_parse import BodyPart, choose_text_part, decode_part, parse_fetch_response, section_value
+from .search_rules import ServerSearchRules
+from .session_pool import SessionPool
+from .state_store import FolderStatus, SyncStateStore
+
+# Maximum number of UIDs sent in a single MOVE/STORE command
+UID_CHUNK_SIZE = 500
+
+# Messages per FETCH command when fetching headers + BODYSTRUCTURE
+FETCH_BATCH_SIZE = 50
+
+# Minimum seconds between two checks for flag changes made by other clients
+FLAG_SYNC_INTERVAL = 15
+
+# RFC 6154 SPECIAL-USE attributes, with well-known folder names as a fallback
+SPECIAL_USE_FLAGS = {'junk': '\\Junk', 'trash': '\\Trash'}
+SPECIAL_USE_NAMES = {
+    'junk': ["[Gmail]/Spam", "Spam", "Junk", "Junk E-mail"],
+    'trash': ["[Gmail]/Trash", "Trash", "Deleted Items", "Deleted"],
+}
+
 
-@dataclass
 class EmailMessage:
-    uid: str
-    subject: str
-    from_: str
-    text: str
-    html: str
-    date: str
-    seen: bool
-    labels: List[str]
-    date_obj: Optional[datetime] = None
+    """A fetched message, kept small so large scans and backfills fit in little memory.
+
+    The header fields are plain slots. The body stays in its raw form
+    (the whole RFC822 message, or one fetched part as (data, BodyPart,
+    truncated)) until text or html is first read; the decoded text then
+    replaces the raw bytes. html is only kept when the message has no
+    text/plain content. filter_text, the whole visible body the keyword
+    filters scan, and clean_text, the message's own text for the summary
+    prompt, are computed once per message.
+    """
+    __slots__ = ('uid', 'subject', 'from_', 'seen', 'date_obj', '_date', '_labels', '_text', '_html', '_raw',
+                 '_clean', '_visible')
+
+    def __init__(self, uid: str, subject: str, from_: str, text: Optional[str] = None, html: Optional[str] = None,
+                 date: Optional[str] = None, seen: bool = False, labels: Optional[List[str]] = None,
+                 date_obj: Optional[datetime] = None, raw=None):
+        self.uid = uid
+        self.subject = subject
+        self.from_ = from_
+        self.seen = seen
+        self.date_obj = date_obj
+        # None: derived from date_obj when read
+        self._date = date
+        self._labels = labels or None
+        self._raw = raw
+        self._text = text
+        self._html = html if not text else ""
+        self._clean = None
+        self._visible = None
+
+    @property
+    def date(self) -> str:
+        if self._date is not None:
+            return self._date
+        return str(self.date_obj) if self.date_obj else ""
+
+    @property
+    def labels(self) -> List[str]:
+        return self._labels or []
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._load_body()
+        return self._text
+
+    @text.setter
+    def text(self, value: Optional[str]):
+        self._raw = None
+        self._clean = self._visible = None
+        self._text = value
+        if value:
+            self._html = ""
+
+    @property
+    def html(self) -> str:
+        if self._html is None:
+            self._load_body()
+        return self._html
+
+    @html.setter
+    def html(self, value: Optional[str]):
+        self._raw = None
+        self._clean = self._visible = None
+        self._html = value if not self._text else ""
+
+    @property
+    def clean_text(self) -> str:
+        """Readable body: text/plain, else the HTML's visible text, without quoted replies or signature."""
+        if self._clean is None:
+            self._clean = normalize_body(self.text, self.html)
+        return self._clean
+
+    @property
+    def filter_text(self) -> str:
+        """Whole visible body: text/plain, else the HTML's visible text, quoted replies and signature included."""
+        if self._visible is None:
+            self._visible = visible_text(self.text, self.html)
+        return self._visible
+
+    @property
+    def body_loaded(self) -> bool:
+        return self._text is not None
+
+    def _load_body(self):
+        text, html = _decode_body(self._raw)
+        self._raw = None
+        self._text = text
+        self._html = "" if text else html
+
+    def __repr__(self):
+        # Never decodes or downloads the body
+        return (f"{type(self).__name__}(uid={self.uid!r}, subject={self.subject!r}, from_={self.from_!r}, "
+                f"body_loaded={self.body_loaded})")
+
+
+class LazyEmailMessage(EmailMessage):
+    """EmailMessage built from headers only; the body is downloaded on first access to text/html.
+
+    body_source is (fetcher, folder, part) when the message came from an
+    EmailFetcher, so prefetch_bodies() can download the bodies of many
+    such messages together instead of one FETCH each.
+    """
+    __slots__ = ('_body_loader', 'body_source')
+
+    def __init__(self, *args, body_loader: Callable[[str], Tuple[str, str]],
+                 body_source: Optional[tuple] = None, **kwargs):
+        self._body_loader = body_loader
+        self.body_source = body_source
+        super().__init__(*args, **kwargs)
+
+    def set_body(self, text: str, html: str):
+        """Store a body downloaded elsewhere (see prefetch_bodies); text/html no longer need the loader."""
+        self._clean = self._visible = None
+        self._text = text
+        self._html = "" if text else html
+
+    def _load_body(self):
+        """Download the body once; later accesses reuse the cached text/html."""
+        try:
+            text, html = self._body_loader(self.uid)
+        except Exception as e:
+            print(f"  [WARN] Could not download body of email {self.uid}: {e}")
+            text, html = "", ""
+        self._text = text
+        self._html = "" if text else html
+
+
+@dataclass
+class PlannedMessage:
+    """A message from EmailFetcher.iter_plan and the scans it belongs to."""
+    email: EmailMessage
+    recent: bool  # among the newest messages (maintenance scan)
+    unread: bool  # unread, candidate for summarization
 
 
 class EmailFetcher:
-    def __init__(self, email: str, password: str, imap_host: str, imap_port: int, timeout: int = 60):
+    # (host, email) of accounts whose COMPRESS stream failed; they stay on plain IMAP until restart
+    _compress_broken = set()
+
+    def __init__(self, email: str, password: str, imap_host: str, imap_port: int, timeout: int = 60,
+                 state_store: Optional[SyncStateStore] = None, body_cap: Optional[int] = None,
+                 governor: Optional[ConnectionGovernor] = None, pool: Optional[SessionPool] = None,
+                 compress: bool = False):
         self.email = email
         self.password = password
         self.imap_host = imap_host
         self.imap_port = imap_port
         self.timeout = timeout
         self.mailbox: Optional[MailBox] = None
+        # Byte cap for lazily loaded bodies (what the filters need); None = full message
+        self.body_cap = body_cap
+        # Incremental sync: UIDVALIDITY seen at SELECT and highest UID fetched, per folder
+        self.state_store = state_store
+        self._uidvalidity = {}
+        self._max_uid = {}
+        self._exists = {}
+        # STATUS probed before the run, per folder (see mailbox_unchanged)
+        self._probed: Dict[str, FolderStatus] = {}
+        # CONDSTORE: MODSEQ up to which other clients' changes are known, the UIDs they
+        # read/deleted and the UID ranges they expunged (VANISHED), per folder
+        self._modseq: Dict[str, int] = {}
+        self._flag_sync_at: Dict[str, float] = {}
+        self._handled: Dict[str, set] = {}
+        self._vanished: Dict[str, List[Tuple[int, int]]] = {}
+        # Spam/Trash folder names by role, discovered once via LIST
+        self._special_folders: Dict[str, str] = {}
+        # Folder selected on the current session (None: none, or not known to be one)
+        self._selected: Optional[str] = None
+        # Shared cap on concurrent sessions; the slot is held from connect() to disconnect()
+        self.governor = governor
+        self._has_slot = False
+        # Optional pool that keeps the logged-in session open after disconnect()
+        self.pool = pool
+        # RFC 4978 COMPRESS=DEFLATE (opt-in per account): bytes on the wire vs inflated,
+        # counted from the stream's totals when the session was taken
+        self.compress = compress
+        self.transfer = {'wire': 0, 'data': 0}
+        self._transfer_base = None
 
     def connect(self):
         """Connect to IMAP server with timeout."""
-        # Set socket timeout to prevent hanging
-        socket.setdefaulttimeout(self.timeout)
-        self.mailbox = MailBox(self.imap_host, self.imap_port)
-        self.mailbox.login(self.email, self.password)
+        if self.governor and not self._has_slot:
+            self.governor.acquire(self.imap_host, self.email)
+            self._has_slot = True
+        try:
+            # Set socket timeout to prevent hanging
+            socket.setdefaulttimeout(self.timeout)
+            if self.pool:
+                if self.mailbox:
+                    # Reconnecting after an error: the old session is not reused
+                    self._collect_transfer()
+                    self.pool.discard(self.mailbox)
+                    self.mailbox = None
+                self.mailbox = self.pool.acquire(self.imap_host, self.imap_port, self.email, self.password)
+            else:
+                if self.mailbox:
+                    self._collect_transfer()
+                self.mailbox = MailBox(self.imap_host, self.imap_port)
+                # No initial SELECT: every command path selects its folder, and ENABLE must come first
+                self.mailbox.login(self.email, self.password, initial_folder=None)
+            # A pooled session may still have the folder of its last run selected
+            self._selected = self.mailbox.folder.get() if self.mailbox.client.state == 'SELECTED' else None
+            self._enable_qresync()
+            self._enable_compression()
+        except Exception:
+            self._release_slot()
+            raise
         print(f"Connected to {self.email}")
 
+    def _enable_qresync(self):
+        """ENABLE QRESYNC on a new session, so flag syncs also report expunged UIDs.
+
+        Only allowed before the first SELECT; a pooled session keeps what
+        was enabled when it was opened.
+        """
+        client = self.mailbox.client
+        if 'QRESYNC' not in client.capabilities or client.state != 'AUTH':
+            return
+        try:
+            if client.enable('QRESYNC')[0] == 'OK':
+                self.mailbox.qresync_enabled = True
+        except client.error as e:
+            print(f"  [WARN] ENABLE QRESYNC failed ({e}), using CONDSTORE only")
+
+    def _enable_compression(self):
+        """Negotiate COMPRESS=DEFLATE if the account opted in and the server offers it.
+
+        A refusal leaves the session uncompressed. A stream that failed
+        earlier in this process disables compression for the account.
+        """
+        self._transfer_base = None
+        if not self.compress or (self.imap_host, self.email) in self._compress_broken:
+            return
+        client = self.mailbox.client
+        try:
+            enabled = enable_compression(client)
+        except client.abort:
+            self._compress_broken.add((self.imap_host, self.email))
+            raise
+        except client.error as e:
+            print(f"  [WARN] COMPRESS DEFLATE failed ({e}), continuing uncompressed")
+            self._compress_broken.add((self.imap_host, self.email))
+            return
+        if enabled:
+            self._transfer_base = client.deflate.counters()
+
+    def _collect_transfer(self):
+        """Add the current session's compressed traffic to self.transfer."""
+        stream = getattr(self.mailbox.client, 'deflate', None) if self.mailbox else None
+        if not stream or self._transfer_base is None:
+            return
+        counters = stream.counters()
+        for key in self.transfer:
+            self.transfer[key] += counters[key] - self._transfer_base[key]
+        self._transfer_base = None
+        if stream.failed and (self.imap_host, self.email) not in self._compress_broken:
+            print(f"  [WARN] COMPRESS stream for {self.email} failed, falling back to uncompressed IMAP")
+            self._compress_broken.add((self.imap_host, self.email))
+
+    def _release_slot(self):
+        if self._has_slot:
+            self.governor.release(self.imap_host, self.email)
+            self._has_slot = False
+
     def disconnect(self):
-        """Disconnect from IMAP server."""
-        if self.mailbox:
+        """Disconnect from IMAP server (with a pool: hand the session back for reuse)."""
+        self._collect_transfer()
+        self._selected = None
+        if self.mailbox and self.pool:
+            self.pool.release(self.imap_host, self.imap_port, self.email, self.mailbox)
+            self.mailbox = None
+        elif self.mailbox:
             try:
                 self.mailbox.logout()
                 print(f"Disconnected from {self.email}")
@@ -46,161 +316,780 @@ class EmailFetcher:
                 print(f"Disconnected from {self.email} (forced: {e})")
             finally:
                 self.mailbox = None
+        self._release_slot()
+
+    def _select(self, folder: str):
+        """Select a folder and remember its UIDVALIDITY, message count and HIGHESTMODSEQ."""
+        # A failed SELECT leaves no folder selected
+        self._selected = None
+        result = self.mailbox.folder.set(folder)
+        self._selected = folder
+        self._exists[folder] = int(result[1][0]) if result[1] and result[1][0] else 0
+        uidvalidity = self.mailbox.client.untagged_responses.get('UIDVALIDITY')
+        if uidvalidity:
+            self._uidvalidity[folder] = int(uidvalidity[-1])
+        # Absent without CONDSTORE (or with NOMODSEQ): flag syncs are then off for the folder
+        modseq = self.mailbox.client.untagged_responses.get('HIGHESTMODSEQ')
+        if modseq and folder not in self._modseq:
+            self._modseq[folder] = int(modseq[-1])
+            self._flag_sync_at[folder] = time.monotonic()
 
-    def fetch_unread(self, folder: str = "INBOX", limit: int = 200) -> List[EmailMessage]:
-        """Fetch unread emails only."""
+    def handled_elsewhere(self, uid: str, folder: str = "INBOX") -> bool:
+        """True if another client read, deleted or expunged the message since the folder was selected.
+
+        Lets a caller drop queued work (e.g. a pending summary) for mail the
+        user already dealt with on another device. Checks for changes at most
+        every FLAG_SYNC_INTERVAL seconds with one UID FETCH ... (CHANGEDSINCE)
+        that returns only the changed messages (plus VANISHED UIDs with
+        QRESYNC). Always False when the server has no CONDSTORE.
+        """
+        if folder not in self._modseq or not self.mailbox:
+            return False
+        if time.monotonic() - self._flag_sync_at.get(folder, 0) >= FLAG_SYNC_INTERVAL:
+            try:
+                self._sync_flag_changes(folder)
+            except (MailboxFetchError, OSError, self.mailbox.client.error) as e:
+                print(f"  [WARN] Flag sync for {folder} failed: {e}")
+            self._flag_sync_at[folder] = time.monotonic()
+        number = int(uid)
+        return (uid in self._handled.get(folder, ()) or
+                any(lo <= number <= hi for lo, hi in self._vanished.get(folder, ())))
+
+    def _sync_flag_changes(self, folder: str):
+        """Fetch flag changes (and expunges, with QRESYNC) since the last known MODSEQ."""
+        if self._selected != folder:
+            self._select(folder)
+        client = self.mailbox.client
+        qresync = getattr(self.mailbox, 'qresync_enabled', False)
+        modifier = f"(CHANGEDSINCE {self._modseq[folder]}{' VANISHED' if qresync else ''})"
+        client.untagged_responses.pop('VANISHED', None)
+        result = client.uid('fetch', '1:*', f"(UID FLAGS) {modifier}")
+        if result[0] != 'OK':
+            raise MailboxFetchError(result, 'OK')
+
+        handled = self._handled.setdefault(folder, set())
+        modseq = self._modseq[folder]
+        for item in parse_fetch_response(result[1]):
+            flags = {str(f).upper() for f in item.get('FLAGS') or []}
+            if '\\SEEN' in flags or '\\DELETED' in flags:
+                handled.add(str(item.get('UID')))
+            if item.get('MODSEQ'):
+                modseq = max(modseq, int(item['MODSEQ'][0]))
+        for line in client.untagged_responses.pop('VANISHED', []):
+            # e.g. b'(EARLIER) 41,43:116'; without EARLIER: expunged during this session
+            uid_set = line.decode().split(')')[-1].strip()
+            self._vanished.setdefault(folder, []).extend(_uid_ranges(uid_set))
+        self._modseq[folder] = modseq
+
+    def _new_uid_start(self, folder: str) -> Optional[int]:
+        """First UID not yet processed, or None if a full scan is needed.
+
+        A full scan is needed when there is no stored state for the folder or
+        the server's UIDVALIDITY no longer matches the stored one.
+        """
+        if not self.state_store or folder not in self._uidvalidity:
+            return None
+        state = self.state_store.get_folder_state(self.email, folder)
+        if not state:
+            return None
+        if state.uidvalidity != self._uidvalidity[folder]:
+            print(f"  UIDVALIDITY changed for {folder}, falling back to a full scan")
+            return None
+        return state.last_uid + 1
+
+    def _track_uid(self, folder: str, uid: str):
+        self._max_uid[folder] = max(self._max_uid.get(folder, 0), int(uid))
+
+    def commit_sync_state(self, folder: str = "INBOX"):
+        """Persist the highest UID fetched from a folder as the new watermark.
+
+        Call only after every fetched message was processed, so an
+        interrupted (or capped) run re-fetches them next time. If the folder was probed with
+        mailbox_unchanged(), its current STATUS is stored as well.
+        """
+        if not self.state_store or folder not in self._uidvalidity:
+            return
+        state = self.state_store.get_folder_state(self.email, folder)
+        last_uid = self._max_uid.get(folder, 0)
+        if state and state.uidvalidity == self._uidvalidity[folder]:
+            last_uid = max(last_uid, state.last_uid)
+        self.state_store.set_folder_state(self.email, folder, self._uidvalidity[folder], last_uid)
+
+        probed = self._probed.get(folder)
+        if probed:
+            # Counts after our own moves/flag changes, but UIDNEXT from before the
+            # search: mail that arrived during the run still shows up as a change
+            status = self.probe_status(folder)
+            status.uidnext = probed.uidnext
+            self.state_store.set_folder_status(self.email, folder, status)
+
+    def discard_folder_status(self, folder: str = "INBOX"):
+        """Forget the STATUS stored for a folder, so the next mailbox_unchanged() is False.
+
+        For a run that left work behind (e.g. unread mail beyond its cap):
+        the folder may look unchanged next time, but must be scanned again.
+        """
+        if self.state_store:
+            self.state_store.clear_folder_status(self.email, folder)
+
+    def probe_status(self, folder: str = "INBOX") -> FolderStatus:
+        """Read a folder's counters with a single STATUS command (no SELECT).
+
+        STATUS should not be used on the selected folder (RFC 3501 6.3.10;
+        some servers report stale counts for it). When the session has the
+        folder selected (a pooled session, or right after a run), it leaves
+        it with UNSELECT first; a server without UNSELECT gets a new SELECT
+        instead, and the counters are read from its response.
+        """
         if not self.mailbox:
             self.connect()
+        client = self.mailbox.client
+        if client.state == 'SELECTED' and self._selected == folder:
+            if 'UNSELECT' not in client.capabilities:
+                return self._selected_status(folder)
+            client.unselect()
+            # Every command path selects its folder again when this does not match
+            self._selected = None
+        items = ['UIDVALIDITY', 'UIDNEXT', 'MESSAGES', 'UNSEEN']
+        if 'CONDSTORE' in self.mailbox.client.capabilities:
+            items.append('HIGHESTMODSEQ')
+        result = self.mailbox.client.status(encode_folder(folder), f"({' '.join(items)})")
+        if result[0] != 'OK' or not result[1] or not result[1][0]:
+            raise MailboxFolderStatusError(result, 'OK')
+        # A folder name sent as a literal splits the response into several items
+        data = b' '.join(part if isinstance(part, bytes) else b' '.join(part) for part in result[1] if part)
+        values = {k.decode().upper(): int(v)
+                  for k, v in re.findall(rb'([A-Za-z]+) (\d+)', data[data.rfind(b'('):])}
+        return FolderStatus(
+            uidvalidity=values.get('UIDVALIDITY', 0),
+            uidnext=values.get('UIDNEXT', 0),
+            messages=values.get('MESSAGES', 0),
+            unseen=values.get('UNSEEN', 0),
+            highestmodseq=values.get('HIGHESTMODSEQ')
+        )
+
+    def _selected_status(self, folder: str) -> FolderStatus:
+        """A folder's STATUS values from a new SELECT response, plus UID SEARCH UNSEEN for the unseen count."""
+        self._select(folder)
+        responses = self.mailbox.client.untagged_responses
+
+        def code(name: str) -> Optional[int]:
+            values = responses.get(name)
+            return int(values[-1]) if values and values[-1] else None
+
+        modseq = code('HIGHESTMODSEQ') if 'CONDSTORE' in self.mailbox.client.capabilities else None
+        return FolderStatus(
+            uidvalidity=code('UIDVALIDITY') or 0,
+            uidnext=code('UIDNEXT') or 0,
+            messages=self._exists.get(folder, 0),
+            unseen=len(self.mailbox.uids('UNSEEN')),
+            highestmodseq=modseq
+        )
 
-        emails = []
-        self.mailbox.folder.set(folder)
+    def mailbox_unchanged(self, folder: str = "INBOX") -> bool:
+        """True if the folder's STATUS equals the one stored after the last completed run.
 
-        print(f"Fetching unread emails from {folder} (limit={limit})...")
-        for msg in self.mailbox.fetch(AND(seen=False), limit=limit, reverse=True):
-            email_msg = self._parse_message(msg)
-            # Explicitly force seen=False because we asked for unread
-            email_msg.seen = False 
-            emails.append(email_msg)
+        Costs one STATUS command; a False result (or no stored state) means
+        the folder must be scanned. Needs a state store.
+        """
+        if not self.state_store:
+            return False
+        status = self.probe_status(folder)
+        self._probed[folder] = status
+        return self.state_store.get_folder_status(self.email, folder) == status
 
-        print(f"  Found {len(emails)} unread emails.")
-        return emails
+    def iter_plan(self, folder: str = "INBOX", recent_limit: int = 50, unread_limit: int = 200,
+                  new_only: bool = False, unread_body_cap: Optional[int] = None) -> Iterator[PlannedMessage]:
+        """Yield the messages of the maintenance and the unread scan once each, newest first.
 
-    def fetch_all(self, folder: str = "INBOX", limit: int = 200, progress_callback: Optional[Callable[[int], None]] = None) -> List[EmailMessage]:
-        """Fetch ALL emails (read and unread) with configurable limit and progress tracking."""
+        The maintenance scan covers the newest recent_limit messages, the
+        unread scan the newest unread ones. A single UID SEARCH UNSEEN plus a
+        UID lookup of the last recent_limit sequence numbers give the union,
+        and each message in it is downloaded once (headers + BODYSTRUCTURE).
+        Unread messages get their text part right away, capped at
+        unread_body_cap; the others load their body lazily when a filter
+        needs it.
+
+        Enough unread messages are included for a caller that skips the
+        recent ones it moves away (up to unread_limit more); stop iterating
+        once done.
+        """
         if not self.mailbox:
             self.connect()
 
-        emails = []
-        self.mailbox.folder.set(folder)
-
-        # Fetch emails with configurable limit
-        print(f"Fetching up to {limit} emails from {folder} (Newest First)...")
-        
-        for i, msg in enumerate(self.mailbox.fetch(limit=limit, reverse=True, mark_seen=False, bulk=True), 1):
-            email_msg = self._parse_message(msg)
-            emails.append(email_msg)
-            
-            # Report progress every 50 emails (adjusted for larger limit)
-            if progress_callback and i % 50 == 0:
-                progress_callback(i)
-            elif i % 50 == 0:
-                print(f"  Fetched {i} emails...")
-
-        print(f"Completed fetching {len(emails)} emails")
-        return emails
-
-    def _parse_message(self, msg) -> EmailMessage:
-        """Parse IMAP message to EmailMessage dataclass."""
-        # Use clean email address from from_values if available
+        self._select(folder)
+        start_uid = self._new_uid_start(folder) if new_only else None
+
+        criteria = f"UID {start_uid}:* UNSEEN" if start_uid is not None else "UNSEEN"
+        unread = [u for u in self.mailbox.uids(criteria) if start_uid is None or int(u) >= start_uid]
+        unread.sort(key=int, reverse=True)
+        recent = [u for u in self._newest_uids(folder, recent_limit) if start_uid is None or int(u) >= start_uid]
+
+        recent_set = set(recent)
+        unread_set = set(unread[:unread_limit + len(recent_set.intersection(unread))])
+        uids = sorted(recent_set | unread_set, key=int, reverse=True)
+
+        scope = f" (UID >= {start_uid})" if start_uid is not None else ""
+        print(f"Planned {len(uids)} emails from {folder}{scope}: newest {len(recent)} + "
+              f"{len(unread_set - recent_set)} more unread")
+
+        for email_msg in self._fetch_envelopes(uids, folder, unread_body_cap, eager_uids=unread_set):
+            self._track_uid(folder, email_msg.uid)
+            yield PlannedMessage(email_msg, recent=email_msg.uid in recent_set, unread=email_msg.uid in unread_set)
+
+    def _newest_uids(self, folder: str, limit: int) -> List[str]:
+        """UIDs of the last limit messages by sequence number (the newest ones)."""
+        exists = self._exists.get(folder, 0)
+        if not exists or limit <= 0:
+            return []
+        result = self.mailbox.client.fetch(f"{max(1, exists - limit + 1)}:*", '(UID)')
+        if result[0] != 'OK':
+            raise MailboxFetchError(result, 'OK')
+        return [str(item['UID']) for item in parse_fetch_response(result[1]) if 'UID' in item]
+
+    @property
+    def is_gmail(self) -> bool:
+        """True if the server offers Gmail's IMAP extensions (X-GM-RAW search, labels)."""
+        if not self.mailbox:
+            self.connect()
+        return 'X-GM-EXT-1' in self.mailbox.client.capabilities
+
+    def iter_search_matches(self, rules: ServerSearchRules, folder: str = "INBOX",
+                            limit: int = 1000, patterns: Optional[str] = None) -> Iterator[EmailMessage]:
+        """Yield the messages the server finds for rules, newest first, with headers only.
+
+        The whole folder is searched, not just the new UIDs, and no message
+        content is transferred for the search itself. Gmail gets X-GM-RAW
+        queries. A query the server rejects is skipped with a warning.
+        The messages are LazyEmailMessage objects (body on demand, or
+        prefetched per batch) and do not move the UID watermark. With
+        patterns (a fingerprint of the pattern lists) and a state store,
+        candidates recorded by remember_search_kept under the same patterns
+        are left out.
+        """
+        if not self.mailbox:
+            self.connect()
+
+        self._select(folder)
+        queries = rules.queries(gmail=self.is_gmail)
+        found = set()
+        for query in queries:
+            try:
+                found.update(self.mailbox.uids(query))
+            except MailboxUidsError as e:
+                print(f"  [WARN] Server search rejected ({e}), skipping {query[:60]}...")
+        kept = set()
+        if patterns and self.state_store and folder in self._uidvalidity:
+            kept = self.state_store.get_search_kept(self.email, folder, self._uidvalidity[folder], patterns)
+        unchecked = [uid for uid in found if int(uid) not in kept]
+        uids = sorted(unchecked, key=int, reverse=True)[:limit]
+        print(f"Server search in {folder}: {len(found)} candidate(s) from {len(queries)} quer{'y' if len(queries) == 1 else 'ies'}"
+              + (f", {len(found) - len(unchecked)} kept before" if len(unchecked) < len(found) else "")
+              + (f", checking the newest {limit}" if len(unchecked) > limit else ""))
+
+        yield from self._fetch_envelopes(uids, folder)
+
+    def remember_search_kept(self, uids: List[str], patterns: str, folder: str = "INBOX"):
+        """Record a finished server search and the candidates it kept, so iter_search_matches skips them.
+
+        The record is tied to folder's UIDVALIDITY and to patterns: when
+        either changes, every candidate is checked again. patterns also
+        becomes the one search_patterns_changed compares with.
+        """
+        if not self.state_store:
+            return
+        self.state_store.set_search_patterns(self.email, folder, patterns)
+        if uids and folder in self._uidvalidity:
+            self.state_store.add_search_kept(self.email, folder, self._uidvalidity[folder], patterns, uids)
+
+    def search_patterns_changed(self, patterns: str, folder: str = "INBOX") -> bool:
+        """True if folder's last server search (remember_search_kept) ran with other patterns, or none ran.
+
+        A pattern edit does not change the folder's STATUS, so the caller
+        checks this before skipping an unchanged folder. Needs a state store.
+        """
+        if not self.state_store:
+            return False
+        return self.state_store.get_search_patterns(self.email, folder) != patterns
+
+    def folder_uidvalidity(self, folder: str = "INBOX") -> Optional[int]:
+        """Select a folder and return its UIDVALIDITY."""
+        if not self.mailbox:
+            self.connect()
+        self._select(folder)
+        return self._uidvalidity.get(folder)
+
+    def folder_uids(self, folder: str = "INBOX", below_uid: Optional[int] = None) -> List[str]:
+        """All UIDs of a folder (below below_uid if given), newest first. Transfers no message data."""
+        if not self.mailbox:
+            self.connect()
+        self._select(folder)
+        if below_uid is not None:
+            if below_uid <= 1:
+                return []
+            uids = [u for u in self.mailbox.uids(f"UID 1:{below_uid - 1}") if int(u) < below_uid]
+        else:
+            uids = self.mailbox.uids("ALL")
+        uids.sort(key=int, reverse=True)
+        return uids
+
+    def iter_headers(self, uids: List[str], folder: str = "INBOX") -> Iterator[EmailMessage]:
+        """Yield header-only messages for known UIDs, in the given order; bodies load on demand.
+
+        UIDs that no longer exist are skipped. The UID watermark is not moved.
+        """
+        if not self.mailbox:
+            self.connect()
+        if self._selected != folder:
+            self._select(folder)
+        yield from self._fetch_envelopes(uids, folder)
+
+    def _fetch_raw(self, uids: List[str], message_parts: str) -> Iterator[List[list]]:
+        """Raw FETCH data for UIDs, one list of per-message items per FETCH_BATCH_SIZE chunk."""
+        for chunk in _chunked(uids, FETCH_BATCH_SIZE):
+            result = self.mailbox.client.uid('fetch', ','.join(chunk), message_parts)
+            if result[0] != 'OK':
+                raise MailboxFetchError(result, 'OK')
+            yield list(_split_fetch_items(result[1]))
+
+    def _fetch_envelopes(self, uids: List[str], folder: str, body_cap: Optional[int] = None,
+                         eager_uids: Optional[set] = None) -> Iterator[EmailMessage]:
+        """Fetch headers + BODYSTRUCTURE for UIDs, in the given order.
+
+        Without body_cap the messages are LazyEmailMessage objects that know
+        which part to download later. With body_cap the main text part
+        (text/plain, else text/html) is fetched right away as
+        BODY.PEEK[part]<0.body_cap>, grouped by part so a batch needs one
+        command per distinct part number. eager_uids limits the up-front
+        download to those messages; the rest stay lazy.
+        """
+        for chunk in _chunked(uids, FETCH_BATCH_SIZE):
+            result = self.mailbox.client.uid('fetch', ','.join(chunk), '(UID FLAGS BODYSTRUCTURE BODY.PEEK[HEADER])')
+            if result[0] != 'OK':
+                raise MailboxFetchError(result, 'OK')
+            items = {str(item.get('UID')): item for item in parse_fetch_response(result[1])}
+            parts = {uid: choose_text_part(item.get('BODYSTRUCTURE') or []) for uid, item in items.items()}
+            eager = set(items) if eager_uids is None else set(items) & eager_uids
+            bodies = self._fetch_part_data({uid: parts[uid] for uid in eager}, body_cap) if body_cap else {}
+
+            for uid in chunk:
+                if uid not in items:
+                    continue
+                msg = _header_message(items[uid])
+                if body_cap and uid in eager:
+                    # Decoded when a filter or the summary first reads the text
+                    yield _email_message(msg, raw=bodies.get(uid))
+                else:
+                    yield self._parse_headers(msg, folder, parts[uid])
+
+    def _fetch_parts(self, parts: Dict[str, Optional[BodyPart]], body_cap: int) -> Dict[str, Tuple[str, str]]:
+        """Fetch and decode the first body_cap bytes of each message's chosen part. Returns uid -> (text, html)."""
+        return {uid: _decode_body(raw) for uid, raw in self._fetch_part_data(parts, body_cap).items()}
+
+    def _fetch_part_data(self, parts: Dict[str, Optional[BodyPart]], body_cap: int) -> Dict[str, tuple]:
+        """Fetch the first body_cap bytes of each message's chosen part. Returns uid -> (data, part, truncated)."""
+        by_section: Dict[str, List[str]] = {}
+        for uid, part in parts.items():
+            if part:
+                by_section.setdefault(part.section, []).append(uid)
+
+        bodies = {}
+        for section, uids in by_section.items():
+            result = self.mailbox.client.uid('fetch', ','.join(uids), f'(UID BODY.PEEK[{section}]<0.{body_cap}>)')
+            if result[0] != 'OK':
+                raise MailboxFetchError(result, 'OK')
+            for item in parse_fetch_response(result[1]):
+                uid = str(item.get('UID'))
+                part = parts.get(uid)
+                if not part:
+                    continue
+                data = section_value(item, section) or b''
+                bodies[uid] = (data, part, len(data) >= body_cap)
+        return bodies
+
+    def _parse_headers(self, msg, folder: str, part: Optional[BodyPart] = None) -> LazyEmailMessage:
+        """Parse a header-only IMAP message into a LazyEmailMessage."""
         sender_email = msg.from_values.email if msg.from_values else msg.from_
-        
-        # Check if email is already read (seen)
-        is_seen = MailMessageFlags.SEEN in msg.flags
-        
-        # Get Gmail labels if available
-        labels = getattr(msg, 'gmail_labels', [])
-        
-        return EmailMessage(
+
+        return LazyEmailMessage(
             uid=str(msg.uid),
             subject=msg.subject or "",
             from_=sender_email or "",
-            text=msg.text or "",
-            html=msg.html or "",
-            date=str(msg.date) if msg.date else "",
-            seen=is_seen,
-            labels=labels,
-            date_obj=msg.date
+            seen=MailMessageFlags.SEEN in msg.flags,
+            labels=getattr(msg, 'gmail_labels', []),
+            date_obj=msg.date,
+            body_loader=lambda uid: self.fetch_body(uid, folder, part, self.body_cap),
+            body_source=(self, folder, part)
         )
 
-    def move_to_spam(self, uid: str, folder: str = "INBOX"):
-        """Move email to Spam folder."""
+    def prefetch_bodies(self, emails: List[LazyEmailMessage], folder: str = "INBOX"):
+        """Download the bodies of header-only messages of folder in batches, as fetch_body() would one by one.
+
+        With a body_cap, messages with a known text part get its first
+        body_cap bytes, one FETCH per FETCH_BATCH_SIZE chunk and part
+        number. The others (no cap, or no text part) are downloaded whole,
+        one BODY.PEEK[] FETCH per chunk. A chunk that fails is left to load
+        on first access, as before.
+        """
+        pending = [email for email in emails if not email.body_loaded]
+        if not pending:
+            return
         if not self.mailbox:
             self.connect()
+        if self._selected != folder:
+            self._select(folder)
 
-        try:
-            self.mailbox.folder.set(folder)
-            self._move_to_spam_internal(uid)
-        except Exception as e:
-            print(f"  [WARN] Connection lost during move to spam ({e}). Reconnecting...")
+        by_uid = {email.uid: email for email in pending}
+        parts = {email.uid: email.body_source[2] for email in pending
+                 if self.body_cap and email.body_source and email.body_source[2]}
+        whole = [uid for uid in by_uid if uid not in parts]
+        for chunk in _chunked(list(parts), FETCH_BATCH_SIZE):
             try:
-                self.connect()
-                self.mailbox.folder.set(folder)
-                self._move_to_spam_internal(uid)
-            except Exception as e2:
-                print(f"  [ERROR] Failed to move email {uid} to Spam: {e2}")
-
-    def _move_to_spam_internal(self, uid: str):
-        # Try common spam folder names
-        spam_folders = ["[Gmail]/Spam", "Spam", "Junk", "Junk E-mail"]
-        success = False
-        
-        for spam_folder in spam_folders:
+                bodies = self._fetch_part_data({uid: parts[uid] for uid in chunk}, self.body_cap)
+            except Exception as e:
+                print(f"  [WARN] Could not download {len(chunk)} email bodies at once: {e}")
+                continue
+            for uid in chunk:
+                # A message expunged meanwhile has no body, as with fetch_body()
+                by_uid[uid].set_body(*_decode_body(bodies.get(uid)))
+        for chunk in _chunked(whole, FETCH_BATCH_SIZE):
             try:
-                self.mailbox.move(uid, spam_folder)
-                print(f"  [SUCCESS] Moved email {uid} to {spam_folder}")
-                success = True
-                break
-            except Exception:
+                items = next(self._fetch_raw(chunk, '(UID BODY.PEEK[])'))
+            except Exception as e:
+                print(f"  [WARN] Could not download {len(chunk)} email bodies at once: {e}")
                 continue
-        
-        if not success:
-            print(f"  [ERROR] Could not find a valid Spam folder for email {uid}")
+            messages = _parse_fetch_items(items)
+            for uid in chunk:
+                message = messages.get(uid)
+                by_uid[uid].set_body(message.text if message else "", message.html if message else "")
 
-    def mark_as_read(self, uid: str, folder: str = "INBOX"):
-        """Mark email as read."""
+    def fetch_body(self, uid: str, folder: str = "INBOX", part: Optional[BodyPart] = None,
+                   body_cap: Optional[int] = None) -> Tuple[str, str]:
+        """Download the body of a single email. Returns (text, html).
+
+        With a known part and body_cap only that part's first body_cap bytes
+        are fetched; otherwise the full message is downloaded and parsed.
+        """
         if not self.mailbox:
             self.connect()
 
-        try:
-            self.mailbox.folder.set(folder)
-            res = self.mailbox.flag(uid, [MailMessageFlags.SEEN], True)
-            # res is list of results like [('OK', [b'\\Seen'])]
-            if res and ('OK' in str(res) or 'Success' in str(res)):
-                print(f"  [SUCCESS] Marked email {uid} as read")
-            else:
-                print(f"  [WARN] Server did not confirm mark-read for {uid}. Result: {res}")
-        except Exception as e:
-            print(f"  [WARN] Connection lost while marking read ({e}). Reconnecting...")
-            try:
-                self.connect()
-                self.mailbox.folder.set(folder)
-                self.mailbox.flag(uid, [MailMessageFlags.SEEN], True)
-                print(f"  [SUCCESS] Reconnected and marked {uid} as read.")
-            except Exception as e2:
-                print(f"  [ERROR] Failed to mark email {uid} as read: {e2}")
+        if self._selected != folder:
+            self._select(folder)
+
+        if part and body_cap:
+            return self._fetch_parts({uid: part}, body_cap).get(uid, ("", ""))
+
+        fetch_result = self.mailbox.client.uid('fetch', uid, '(BODY.PEEK[] UID FLAGS RFC822.SIZE)')
+        if fetch_result[0] != 'OK' or not fetch_result[1] or fetch_result[1][0] is None:
+            return "", ""
+        msg = MailMessage(fetch_result[1])
+        return msg.text or "", msg.html or ""
+
+    def move_to_spam(self, uid: str, folder: str = "INBOX"):
+        """Move email to Spam folder."""
+        self.move_many_to_spam([uid], folder)
+
+    def mark_as_read(self, uid: str, folder: str = "INBOX"):
+        """Mark email as read."""
+        self.mark_many_as_read([uid], folder)
 
     def delete_email(self, uid: str, folder: str = "INBOX"):
         """Move email to Trash folder."""
+        self.delete_many([uid], folder)
+
+    def move_many_to_spam(self, uids: List[str], folder: str = "INBOX") -> Dict[str, str]:
+        """Move emails to the Spam folder using UID-set MOVE commands.
+
+        Returns a per-UID result: 'moved:<folder>', 'not found' or 'error: ...'.
+        """
+        return self._run_batch(uids, folder, self._move_to_spam_internal, "move to Spam")
+
+    def mark_many_as_read(self, uids: List[str], folder: str = "INBOX") -> Dict[str, str]:
+        """Mark emails as read with UID-set STORE commands.
+
+        Returns a per-UID result: 'read', 'not found' or 'error: ...'.
+        """
+        return self._run_batch(uids, folder, self._mark_as_read_internal, "mark as read")
+
+    def delete_many(self, uids: List[str], folder: str = "INBOX") -> Dict[str, str]:
+        """Move emails to the Trash folder using UID-set MOVE commands.
+
+        Returns a per-UID result: 'moved:<folder>', 'deleted', 'not found' or 'error: ...'.
+        """
+        return self._run_batch(uids, folder, self._delete_email_internal, "delete")
+
+    def _run_batch(self, uids: List[str], folder: str, action: Callable[[List[str]], Dict[str, str]],
+                   label: str) -> Dict[str, str]:
+        """Select the folder once and apply an action to a UID set, reconnecting once on failure."""
+        if not uids:
+            return {}
         if not self.mailbox:
             self.connect()
 
         try:
-            self.mailbox.folder.set(folder)
-            self._delete_email_internal(uid)
+            if self._selected != folder:
+                self._select(folder)
+            return action(uids)
         except Exception as e:
-            print(f"  [WARN] Connection lost during delete ({e}). Reconnecting...")
+            print(f"  [WARN] Connection lost during {label} ({e}). Reconnecting...")
             try:
                 self.connect()
-                self.mailbox.folder.set(folder)
-                self._delete_email_internal(uid)
+                self._select(folder)
+                return action(uids)
             except Exception as e2:
-                print(f"  [ERROR] Failed to delete email {uid}: {e2}")
-
-    def _delete_email_internal(self, uid: str):
-        # Try common trash folder names
-        trash_folders = ["[Gmail]/Trash", "Trash", "Deleted Items", "Deleted"]
-        success = False
-        
-        for trash_folder in trash_folders:
+                print(f"  [ERROR] Failed to {label} {len(uids)} email(s): {e2}")
+                return {uid: f"error: {e2}" for uid in uids}
+
+    def _move_uids(self, uids: List[str], target: str) -> Optional[Dict[str, str]]:
+        """MOVE a UID set to target. Returns None if the server rejected the target folder."""
+        results = {}
+        for chunk in _chunked(uids, UID_CHUNK_SIZE):
+            self.mailbox.client.untagged_responses.pop('COPYUID', None)
             try:
-                self.mailbox.move(uid, trash_folder)
-                print(f"  [SUCCESS] Moved email {uid} to {trash_folder}")
-                success = True
-                break
-            except Exception:
+                self.mailbox.move(chunk, target)
+            except (MailboxMoveError, MailboxCopyError):
+                if not results:
+                    return None
+                results.update({uid: f"error: move to {target} rejected" for uid in chunk})
+                continue
+            moved = _copyuid_sources(self.mailbox.client.untagged_responses.pop('COPYUID', None))
+            for uid in chunk:
+                results[uid] = f"moved:{target}" if moved is None or uid in moved else "not found"
+        return results
+
+    def discover_special_folders(self) -> Dict[str, str]:
+        """Find the Junk and Trash folders with one LIST command.
+
+        Uses the RFC 6154 \\Junk / \\Trash attributes and falls back to
+        well-known folder names. Results are cached in the state store.
+        """
+        folders = self.mailbox.folder.list()
+        found = {}
+        for role, flag in SPECIAL_USE_FLAGS.items():
+            for info in folders:
+                if flag.lower() in (f.lower() for f in info.flags):
+                    found[role] = info.name
+                    break
+            else:
+                names = {info.name.lower(): info.name for info in folders}
+                for candidate in SPECIAL_USE_NAMES[role]:
+                    if candidate.lower() in names:
+                        found[role] = names[candidate.lower()]
+                        break
+
+        for role, folder in found.items():
+            self._special_folders[role] = folder
+            if self.state_store:
+                self.state_store.set_special_folder(self.email, role, folder)
+        print(f"  Discovered special folders: {found or 'none'}")
+        return found
+
+    def _special_folder(self, role: str) -> Optional[str]:
+        """Folder name for a role, from memory, the state store, or discovery."""
+        if role not in self._special_folders and self.state_store:
+            cached = self.state_store.get_special_folder(self.email, role)
+            if cached:
+                self._special_folders[role] = cached
+        if role not in self._special_folders:
+            self.discover_special_folders()
+        return self._special_folders.get(role)
+
+    def _forget_special_folder(self, role: str):
+        """Invalidate a cached folder after a failed move."""
+        self._special_folders.pop(role, None)
+        if self.state_store:
+            self.state_store.clear_special_folder(self.email, role)
+
+    def _move_to_role(self, uids: List[str], role: str) -> Optional[Tuple[str, Dict[str, str]]]:
+        """Move UIDs to the folder for a role, rediscovering once if the cached folder is rejected."""
+        target = self._special_folder(role)
+        if not target:
+            return None
+        results = self._move_uids(uids, target)
+        if results is not None:
+            return target, results
+
+        print(f"  [WARN] Server rejected {target}, rediscovering {role} folder...")
+        self._forget_special_folder(role)
+        retry_target = self._special_folder(role)
+        if retry_target and retry_target != target:
+            results = self._move_uids(uids, retry_target)
+            if results is not None:
+                return retry_target, results
+        self._forget_special_folder(role)
+        return None
+
+    def _move_to_spam_internal(self, uids: List[str]) -> Dict[str, str]:
+        moved = self._move_to_role(uids, 'junk')
+        if moved:
+            print(f"  [SUCCESS] Moved {len(uids)} email(s) to {moved[0]}")
+            return moved[1]
+
+        print(f"  [ERROR] Could not find a valid Spam folder for {len(uids)} email(s)")
+        return {uid: "error: no Spam folder" for uid in uids}
+
+    def _mark_as_read_internal(self, uids: List[str]) -> Dict[str, str]:
+        results = {}
+        for chunk in _chunked(uids, UID_CHUNK_SIZE):
+            # Plain UID STORE: MailBox.flag() would also send an EXPUNGE per call
+            typ, data = self.mailbox.client.uid('STORE', ','.join(chunk), '+FLAGS', r'(\Seen)')
+            if typ != 'OK':
+                print(f"  [WARN] Server did not confirm mark-read for {len(chunk)} email(s). Result: {data}")
+                results.update({uid: f"error: {typ}" for uid in chunk})
                 continue
-        
-        if not success:
-            # Fallback: mark as deleted if move fails
-            self.mailbox.delete(uid)
-            print(f"  [SUCCESS] Marked email {uid} as deleted (fallback)")
+            confirmed = set(re.findall(r'UID (\d+)', b' '.join(d for d in data if isinstance(d, bytes)).decode()))
+            unconfirmed = [uid for uid in chunk if confirmed and uid not in confirmed]
+            if unconfirmed:
+                # Servers may stay silent for messages that were read already: look those up
+                confirmed |= self._uids_flagged(unconfirmed, '\\Seen')
+            for uid in chunk:
+                results[uid] = "read" if not confirmed or uid in confirmed else "not found"
+        print(f"  [SUCCESS] Marked {len(uids)} email(s) as read")
+        return results
+
+    def _uids_flagged(self, uids: List[str], flag: str) -> set:
+        """The UIDs among uids that exist and carry flag (one UID FETCH (FLAGS))."""
+        typ, data = self.mailbox.client.uid('fetch', ','.join(uids), '(UID FLAGS)')
+        if typ != 'OK':
+            return set()
+        return {str(item.get('UID')) for item in parse_fetch_response(data)
+                if flag.upper() in {str(f).upper() for f in item.get('FLAGS') or []}}
+
+    def _delete_email_internal(self, uids: List[str]) -> Dict[str, str]:
+        moved = self._move_to_role(uids, 'trash')
+        if moved:
+            print(f"  [SUCCESS] Moved {len(uids)} email(s) to {moved[0]}")
+            return moved[1]
+
+        # Fallback: mark as deleted if move fails
+        self.mailbox.delete(uids)
+        print(f"  [SUCCESS] Marked {len(uids)} email(s) as deleted (fallback)")
+        return {uid: "deleted" for uid in uids}
+
+
+def prefetch_bodies(emails: Iterable[EmailMessage]):
+    """Download the bodies of all header-only messages among emails, batched per fetcher and folder.
+
+    Messages that are loaded already, or not LazyEmailMessage, are left
+    alone, so this can be called on any batch before filters read bodies.
+    """
+    pending: Dict[tuple, List[LazyEmailMessage]] = {}
+    for email in emails:
+        if isinstance(email, LazyEmailMessage) and email.body_source and not email.body_loaded:
+            fetcher, folder, _ = email.body_source
+            pending.setdefault((fetcher, folder), []).append(email)
+    for (fetcher, folder), batch in pending.items():
+        fetcher.prefetch_bodies(batch, folder)
+
+
+def _email_message(msg: MailMessage, raw=None) -> EmailMessage:
+    """Convert an imap_tools MailMessage (headers are enough) to an EmailMessage.
+
+    raw is the undecoded body (see EmailMessage); it is decoded when the
+    text is first needed.
+    """
+    # Use clean email address from from_values if available
+    sender_email = msg.from_values.email if msg.from_values else msg.from_
+    
+    # Check if email is already read (seen)
+    is_seen = MailMessageFlags.SEEN in msg.flags
+    
+    # Get Gmail labels if available
+    labels = getattr(msg, 'gmail_labels', [])
+    
+    return EmailMessage(
+        uid=str(msg.uid),
+        subject=msg.subject or "",
+        from_=sender_email or "",
+        seen=is_seen,
+        labels=labels,
+        date_obj=msg.date,
+        raw=raw
+    )
+
+
+def _full_message(fetch_item: list) -> EmailMessage:
+    """EmailMessage from the FETCH data of one BODY[] message: headers parsed now, body kept raw."""
+    index = max(i for i, part in enumerate(fetch_item) if isinstance(part, tuple))
+    prefix, raw = fetch_item[index]
+    end = raw.find(b'\r\n\r\n')
+    header = raw[:end + 4] if end >= 0 else raw
+    header_item = fetch_item[:index] + [(prefix, header)] + fetch_item[index + 1:]
+    return _email_message(MailMessage(header_item), raw=raw)
+
+
+def _decode_body(raw) -> Tuple[str, str]:
+    """Decode a raw body: full RFC822 bytes or a (data, BodyPart, truncated) part. Returns (text, html)."""
+    if raw is None:
+        return "", ""
+    if isinstance(raw, bytes):
+        msg = MailMessage.from_bytes(raw)
+        return msg.text or "", msg.html or ""
+    data, part, truncated = raw
+    content = decode_part(data, part.encoding, part.charset, truncated=truncated)
+    return (content, "") if part.subtype == 'plain' else ("", content)
+
+
+def _parse_fetch_items(items: List[list]) -> Dict[str, EmailMessage]:
+    """Parse one FETCH batch into uid -> EmailMessage (bodies stay raw until read)."""
+    messages = {}
+    for fetch_item in items:
+        email_msg = _full_message(fetch_item)
+        messages[email_msg.uid] = email_msg
+    return messages
+
+
+def _header_message(item: dict) -> MailMessage:
+    """Build a MailMessage from a parsed FETCH item holding BODY[HEADER], UID and FLAGS."""
+    flags = ' '.join(str(f) for f in item.get('FLAGS') or [])
+    prefix = f"UID {item.get('UID')} FLAGS ({flags})".encode()
+    return MailMessage([(prefix, section_value(item, 'HEADER') or b'')])
+
+
+def _split_fetch_items(data: list) -> Iterator[list]:
+    """Group imaplib FETCH data per message: each message starts with a (header, literal) tuple."""
+    item = []
+    for part in data:
+        if part is None:
+            continue
+        if isinstance(part, tuple) and item:
+            yield item
+            item = []
+        item.append(part)
+    if item:
+        yield item
+
+
+def _uid_ranges(uid_set: str) -> List[Tuple[int, int]]:
+    """Parse an IMAP UID set such as '41,43:116' into inclusive (low, high) ranges."""
+    ranges = []
+    for part in uid_set.split(','):
+        if not part:
+            continue
+        low, _, high = part.partition(':')
+        low, high = int(low), int(high or low)
+        ranges.append((min(low, high), max(low, high)))
+    return ranges
+
+
+def _chunked(items: List[str], size: int) -> Iterator[List[str]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _copyuid_sources(responses) -> Optional[set]:
+    """Source UIDs reported by a COPYUID response code (RFC 4315), or None if absent."""
+    if not responses:
+        return None
+    uids = set()
+    for response in responses:
+        parts = (response.decode() if isinstance(response, bytes) else str(response)).split()
+        if len(parts) < 3:
+            return None
+        for item in parts[1].split(','):
+            if ':' in item:
+                start, end = sorted(int(x) for x in item.split(':'))
+                uids.update(str(u) for u in range(start, end + 1))
+            else:
+                uids.add(item)
+    return uids
@@ -0,0 +1,113 @@
+"""Limits concurrent IMAP sessions per host and per account."""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict
+
+
+@dataclass
+class HostStats:
+    active: int = 0
+    waiting: int = 0
+    acquired: int = 0
+    # Sessions that had to queue, and how long they waited (seconds)
+    waited: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+
+class ConnectionGovernor:
+    """Caps simultaneous IMAP sessions per host and per account.
+
+    Shared by all EmailFetcher instances (and threads) of a process.
+    Sessions that cannot start right away queue in arrival order; a later
+    request only overtakes an earlier one on the same host when the earlier
+    one is blocked by its own account cap.
+    """
+
+    def __init__(self, max_per_host: int = 4, max_per_account: int = 1):
+        self.max_per_host = max(1, max_per_host)
+        self.max_per_account = max(1, max_per_account)
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._host_active: Dict[str, int] = {}
+        self._account_active: Dict[tuple, int] = {}
+        self._stats: Dict[str, HostStats] = {}
+
+    def _can_start(self, host: str, account: str) -> bool:
+        return (self._host_active.get(host, 0) < self.max_per_host and
+                self._account_active.get((host, account), 0) < self.max_per_account)
+
+    def _is_next(self, ticket) -> bool:
+        """True if no earlier waiter on the same host could start instead."""
+        for queued in self._queue:
+            if queued is ticket:
+                return True
+            if queued[0] == ticket[0] and self._can_start(queued[0], queued[1]):
+                return False
+        return True
+
+    def acquire(self, host: str, account: str):
+        """Block until a session slot for host/account is free."""
+        host = host.lower()
+        # The object() makes each ticket unique, so deque.remove() finds this one
+        ticket = (host, account, object())
+        started = time.monotonic()
+        with self._cond:
+            stats = self._stats.setdefault(host, HostStats())
+            self._queue.append(ticket)
+            stats.waiting += 1
+            try:
+                while not (self._can_start(host, account) and self._is_next(ticket)):
+                    self._cond.wait()
+            finally:
+                self._queue.remove(ticket)
+                stats.waiting -= 1
+                # Removing a waiter can unblock the ones queued behind it
+                self._cond.notify_all()
+
+            self._host_active[host] = self._host_active.get(host, 0) + 1
+            key = (host, account)
+            self._account_active[key] = self._account_active.get(key, 0) + 1
+            waited = time.monotonic() - started
+            stats.active += 1
+            stats.acquired += 1
+            if waited > 0.01:
+                stats.waited += 1
+                stats.total_wait += waited
+                stats.max_wait = max(stats.max_wait, waited)
+
+    def release(self, host: str, account: str):
+        host = host.lower()
+        with self._cond:
+            if self._account_active.get((host, account), 0) <= 0:
+                return
+            self._host_active[host] -= 1
+            self._account_active[(host, account)] -= 1
+            self._stats[host].active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def session(self, host: str, account: str):
+        self.acquire(host, account)
+        try:
+            yield
+        finally:
+            self.release(host, account)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-host counters, including wait-time metrics (seconds)."""
+        with self._cond:
+            return {
+                host: {
+                    'active': s.active,
+                    'waiting': s.waiting,
+                    'acquired': s.acquired,
+                    'waited': s.waited,
+                    'avg_wait': round(s.total_wait / s.waited, 3) if s.waited else 0.0,
+                    'max_wait': round(s.max_wait, 3)
+                }
+                for host, s in self._stats.items()
+            }
@@ -0,0 +1,181 @@
+"""Readable text from message bodies: all of it for the keyword filters, the message's own part for the summary prompt."""
+import re
+from html.parser import HTMLParser
+from typing import Optional
+
+# Characters handed to the HTML parser at a time
+FEED_SIZE = 16 * 1024
+
+# Below this many characters of its own, a message is mostly quoted/forwarded content, which is kept
+MIN_OWN_TEXT = 40
+
+# Elements without visible text
+_HIDDEN_TAGS = {'head', 'style', 'script', 'noscript', 'template', 'title', 'svg', 'object'}
+# Elements that start a new line of text
+_BLOCK_TAGS = {'address', 'article', 'aside', 'blockquote', 'br', 'center', 'dd', 'div', 'dl', 'dt', 'footer',
+               'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'ol', 'p', 'pre', 'section',
+               'table', 'tr', 'ul'}
+_VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+# Quoted replies and signatures as marked up by common mail clients
+_QUOTE_CLASSES = {'gmail_quote', 'gmail_extra', 'yahoo_quoted', 'moz-cite-prefix', 'outlookmessageheader',
+                  'divrplyfwdmsg'}
+_SIGNATURE_CLASSES = {'gmail_signature', 'moz-signature', 'signature'}
+_SIGNATURE_IDS = {'signature', 'appendonsend', 'divrplyfwdmsg'}
+
+_HIDDEN_STYLE = re.compile(r'display\s*:\s*none|visibility\s*:\s*hidden', re.I)
+_SPACES = re.compile(r'[ \t\r\f\v\u00a0\u200b\u200c\u200d\u2060\ufeff\u034f]+')
+_BLANK_LINES = re.compile(r'\n{3,}')
+# First line of the quoted original in a plain text reply (forwarded messages are kept: they are the content)
+_REPLY_HEADER = re.compile(
+    r'^(On .{1,300} wrote:|Le .{1,300} a écrit ?:|Am .{1,300} schrieb .{0,100}:|'
+    r'-{2,} ?Original Message ?-{2,}|_{20,})\s*$',
+    re.I
+)
+_OUTLOOK_HEADER = re.compile(r'^From: .+$')
+_OUTLOOK_SENT = re.compile(r'^(Sent|Date): .+$')
+
+
+class _TextExtractor(HTMLParser):
+    """Collects visible text, skipping hidden elements and (unless kept) quoted replies and signatures."""
+
+    def __init__(self, keep_quotes: bool = False, keep_signature: bool = False):
+        super().__init__(convert_charrefs=True)
+        self.keep_quotes = keep_quotes
+        self.keep_signature = keep_signature
+        self.parts = []
+        # Tag that opened the subtree being skipped, and how deep same-name tags are nested in it
+        self._skip_tag: Optional[str] = None
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        self._open(tag, attrs, closed=tag in _VOID_TAGS)
+
+    def handle_startendtag(self, tag, attrs):
+        self._open(tag, attrs, closed=True)
+
+    def _open(self, tag: str, attrs: list, closed: bool):
+        if self._skip_tag:
+            if tag == self._skip_tag and not closed:
+                self._skip_depth += 1
+            elif tag == 'body' and self._skip_tag == 'head':
+                # <head> left open
+                self._skip_tag = None
+            return
+        attrs = {name: value or '' for name, value in attrs}
+        if self._skipped(tag, attrs):
+            if not closed:
+                self._skip_tag, self._skip_depth = tag, 1
+            return
+        if tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+        elif tag == 'img' and not _is_pixel(attrs):
+            # Image-only mails often carry their message in the alt text
+            alt = attrs.get('alt', '').strip()
+            if alt:
+                self.parts.append(f' {alt} ')
+        elif tag in ('td', 'th'):
+            self.parts.append(' ')
+
+    def handle_endtag(self, tag):
+        if self._skip_tag:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if not self._skip_depth:
+                    self._skip_tag = None
+            return
+        if tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if not self._skip_tag:
+            self.parts.append(data)
+
+    def _skipped(self, tag: str, attrs: dict) -> bool:
+        if tag in _HIDDEN_TAGS:
+            return True
+        classes = set(attrs.get('class', '').lower().split())
+        if not self.keep_quotes and (classes & _QUOTE_CLASSES or
+                                     tag == 'blockquote' and attrs.get('type', '').lower() == 'cite'):
+            return True
+        if not self.keep_signature and (classes & _SIGNATURE_CLASSES or
+                                        attrs.get('id', '').lower() in _SIGNATURE_IDS):
+            return True
+        return bool(_HIDDEN_STYLE.search(attrs.get('style', '')))
+
+
+def _is_pixel(attrs: dict) -> bool:
+    """1x1 (or hidden) images: open-tracking beacons, never content."""
+    for name in ('width', 'height'):
+        value = attrs.get(name, '').strip().lower().rstrip('px')
+        if value in ('0', '1'):
+            return True
+    return bool(_HIDDEN_STYLE.search(attrs.get('style', '')))
+
+
+def html_to_text(html: str, keep_quotes: bool = False, keep_signature: bool = False) -> str:
+    """Visible text of an HTML body, without markup, hidden elements, pixels or signatures.
+
+    Quoted replies are left out unless keep_quotes is set, signatures
+    unless keep_signature is. The document is fed to the parser in
+    FEED_SIZE pieces, so a large body is never copied as a whole.
+    """
+    parser = _TextExtractor(keep_quotes, keep_signature)
+    for start in range(0, len(html), FEED_SIZE):
+        parser.feed(html[start:start + FEED_SIZE])
+    parser.close()
+    return _tidy(''.join(parser.parts))
+
+
+def strip_quotes_and_signature(text: str) -> str:
+    """Drop '>' quoted lines, everything from a reply header on and the '-- ' signature."""
+    lines = text.split('\n')
+    kept = []
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if line.rstrip() == '--' or line == '-- ':
+            break
+        if _REPLY_HEADER.match(stripped):
+            break
+        # Outlook-style header block: "From: ..." followed by "Sent:" / "Date:"
+        if (_OUTLOOK_HEADER.match(stripped) and i + 1 < len(lines)
+                and _OUTLOOK_SENT.match(lines[i + 1].strip())):
+            break
+        if stripped.startswith('>'):
+            continue
+        kept.append(line)
+    return '\n'.join(kept)
+
+
+def visible_text(text: str, html: str) -> str:
+    """The text to filter: text/plain if present, else the HTML's visible text, with nothing cut.
+
+    Quoted replies and signatures stay: a footer below a '--' or '____'
+    line is where the "unsubscribe" and "opt-out" lines the delete
+    keywords look for usually are. Only whitespace is collapsed.
+    """
+    if text and text.strip():
+        return _tidy(text)
+    if html:
+        return html_to_text(html, keep_quotes=True, keep_signature=True)
+    return ""
+
+
+def normalize_body(text: str, html: str) -> str:
+    """The text to summarize: text/plain if present, else the HTML's visible text.
+
+    Quoted replies and signatures are removed and whitespace is collapsed.
+    A message with almost no text of its own (e.g. a forward) keeps the
+    quoted part.
+    """
+    if text and text.strip():
+        own = _tidy(strip_quotes_and_signature(text))
+        return own if len(own) >= MIN_OWN_TEXT else _tidy(text)
+    if html:
+        own = _tidy(strip_quotes_and_signature(html_to_text(html)))
+        return own if len(own) >= MIN_OWN_TEXT else _tidy(html_to_text(html, keep_quotes=True))
+    return ""
+
+
+def _tidy(text: str) -> str:
+    lines = (_SPACES.sub(' ', line).strip() for line in text.split('\n'))
+    return _BLANK_LINES.sub('\n\n', '\n'.join(lines)).strip()
@@ -0,0 +1,116 @@
+"""IMAP IDLE push notifications for new mail."""
+import threading
+import time
+from typing import Callable, List
+
+from imap_tools import MailBox
+
+# RFC 2177: re-issue IDLE well before the server's 30 minute inactivity logout
+IDLE_RENEW_SECONDS = 25 * 60
+
+
+class IdleWatcher:
+    """Holds an IDLE connection on a folder for each account and reports new mail.
+
+    One thread per account waits for EXISTS responses. A single dispatcher
+    thread calls on_new_mail(email) for accounts that got new mail, after a
+    short debounce so a burst of messages is handled in one run. While an
+    account is being processed its IDLE connection keeps listening; new
+    mail arriving meanwhile queues one more run.
+    IDLE connections are separate from the fetchers' sessions and are not
+    counted by the ConnectionGovernor.
+    """
+
+    def __init__(self, accounts: List, on_new_mail: Callable[[str], None], folder: str = "INBOX",
+                 debounce: float = 5.0, poll_seconds: int = 30, timeout: int = 60):
+        self.accounts = accounts
+        self.on_new_mail = on_new_mail
+        self.folder = folder
+        self.debounce = debounce
+        self.poll_seconds = poll_seconds
+        self.timeout = timeout
+
+        self._stop = threading.Event()
+        self._cond = threading.Condition()
+        self._pending = {}  # email -> monotonic time of the first unhandled EXISTS
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        self._stop.clear()
+        for account in self.accounts:
+            thread = threading.Thread(target=self._watch, args=(account,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        dispatcher.start()
+        self._threads.append(dispatcher)
+        print(f"IDLE push enabled for {len(self.accounts)} account(s)")
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def _notify(self, email: str):
+        with self._cond:
+            self._pending.setdefault(email, time.monotonic())
+            self._cond.notify_all()
+
+    def _watch(self, account):
+        backoff = 5
+        while not self._stop.is_set():
+            mailbox = None
+            try:
+                mailbox = MailBox(account.imap_host, account.imap_port, timeout=self.timeout)
+                mailbox.login(account.email, account.password, initial_folder=self.folder)
+                backoff = 5
+                self._idle_loop(account.email, mailbox)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                print(f"  [WARN] IDLE connection for {account.email} lost ({e}). Reconnecting in {backoff}s...")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 600)
+            finally:
+                if mailbox:
+                    try:
+                        mailbox.logout()
+                    except Exception:
+                        pass
+
+    def _idle_loop(self, email: str, mailbox: MailBox):
+        mailbox.idle.start()
+        renew_at = time.monotonic() + IDLE_RENEW_SECONDS
+        try:
+            while not self._stop.is_set():
+                responses = mailbox.idle.poll(timeout=self.poll_seconds)
+                if any(b'EXISTS' in line for line in responses):
+                    self._notify(email)
+                if time.monotonic() >= renew_at:
+                    # Also detects a dead connection: DONE gets no tagged reply
+                    mailbox.idle.stop()
+                    mailbox.idle.start()
+                    renew_at = time.monotonic() + IDLE_RENEW_SECONDS
+        finally:
+            if self._stop.is_set():
+                mailbox.idle.stop()
+
+    def _dispatch(self):
+        while not self._stop.is_set():
+            with self._cond:
+                now = time.monotonic()
+                due = [email for email, since in self._pending.items() if now - since >= self.debounce]
+                if not due:
+                    waits = [self.debounce - (now - since) for since in self._pending.values()]
+                    self._cond.wait(timeout=min(waits) if waits else None)
+                    continue
+                for email in due:
+                    del self._pending[email]
+
+            for email in due:
+                if self._stop.is_set():
+                    break
+                try:
+                    self.on_new_mail(email)
+                except Exception as e:
+                    print(f"  [WARN] Push processing for {email} failed: {e}")
@@ -0,0 +1,216 @@
+"""Parsing helpers for raw IMAP FETCH responses and BODYSTRUCTURE."""
+import base64
+import binascii
+import codecs
+import quopri
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+_LITERAL = re.compile(rb'\{(\d+)\+?\}\r\n')
+
+
+def _tokenize(data: bytes) -> List[Any]:
+    """Split an IMAP response into tokens.
+
+    Returns '(' / ')' markers, atoms as str (NIL as None, digits as int),
+    and quoted strings / literals as bytes. Atoms such as BODY[HEADER.FIELDS (FROM)]<0>
+    are kept whole.
+    """
+    tokens = []
+    i = 0
+    n = len(data)
+    while i < n:
+        c = data[i:i + 1]
+        if c in (b' ', b'\r', b'\n'):
+            i += 1
+        elif c in (b'(', b')'):
+            tokens.append(c.decode())
+            i += 1
+        elif c == b'"':
+            j = i + 1
+            buf = bytearray()
+            while j < n and data[j:j + 1] != b'"':
+                if data[j:j + 1] == b'\\':
+                    j += 1
+                buf += data[j:j + 1]
+                j += 1
+            tokens.append(bytes(buf))
+            i = j + 1
+        elif c == b'{':
+            m = _LITERAL.match(data, i)
+            if not m:
+                raise ValueError(f"Malformed literal at offset {i}")
+            start = m.end()
+            size = int(m.group(1))
+            tokens.append(data[start:start + size])
+            i = start + size
+        else:
+            j = i
+            depth = 0
+            while j < n:
+                ch = data[j:j + 1]
+                if ch == b'[':
+                    depth += 1
+                elif ch == b']':
+                    depth -= 1
+                elif depth == 0 and ch in (b' ', b'(', b')', b'\r', b'\n'):
+                    break
+                j += 1
+            atom = data[i:j].decode('utf-8', 'replace')
+            if atom.upper() == 'NIL':
+                tokens.append(None)
+            elif atom.isdigit():
+                tokens.append(int(atom))
+            else:
+                tokens.append(atom)
+            i = j
+    return tokens
+
+
+def _build(tokens: List[Any], pos: int = 0):
+    """Turn a token list into nested Python lists. Returns (items, next_pos)."""
+    items = []
+    while pos < len(tokens):
+        tok = tokens[pos]
+        if tok == '(':
+            sub, pos = _build(tokens, pos + 1)
+            items.append(sub)
+        elif tok == ')':
+            return items, pos + 1
+        else:
+            items.append(tok)
+            pos += 1
+    return items, pos
+
+
+def parse_fetch_response(data: list) -> List[Dict[str, Any]]:
+    """Parse the data returned by imaplib for a (UID) FETCH command.
+
+    Returns one dict per message, keyed by upper-cased item name
+    (e.g. 'UID', 'FLAGS', 'BODYSTRUCTURE', 'BODY[HEADER]', 'BODY[1]<0>').
+    """
+    raw = bytearray()
+    for item in data or []:
+        if item is None:
+            continue
+        if isinstance(item, tuple):
+            raw += item[0] + b'\r\n' + item[1]
+        else:
+            raw += item
+    items, _ = _build(_tokenize(bytes(raw)))
+
+    messages = []
+    for i, item in enumerate(items):
+        if not isinstance(item, list):
+            continue
+        msg = {}
+        for key, value in zip(item[::2], item[1::2]):
+            msg[str(key).upper()] = value
+        if i > 0 and isinstance(items[i - 1], int):
+            msg.setdefault('SEQ', items[i - 1])
+        messages.append(msg)
+    return messages
+
+
+def section_value(msg: Dict[str, Any], section: str) -> Optional[bytes]:
+    """Return the data of a BODY[section] item, ignoring any <origin> suffix."""
+    prefix = f"BODY[{section.upper()}]"
+    for key, value in msg.items():
+        if key == prefix or key.startswith(prefix + '<'):
+            if isinstance(value, str):
+                return value.encode()
+            return value
+    return None
+
+
+def _text(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return str(value)
+
+
+@dataclass
+class BodyPart:
+    section: str
+    subtype: str
+    charset: str
+    encoding: str
+    size: int
+
+
+def find_text_parts(structure: list, prefix: str = '') -> List[BodyPart]:
+    """List inline text/plain and text/html parts of a BODYSTRUCTURE, in order."""
+    if not structure:
+        return []
+    if isinstance(structure[0], list):
+        parts = []
+        index = 1
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            section = f"{prefix}.{index}" if prefix else str(index)
+            parts.extend(find_text_parts(child, section))
+            index += 1
+        return parts
+
+    main_type = _text(structure[0]).lower()
+    sub_type = _text(structure[1]).lower() if len(structure) > 1 else ''
+    if main_type != 'text' or sub_type not in ('plain', 'html'):
+        return []
+
+    params = structure[2] if len(structure) > 2 and isinstance(structure[2], list) else []
+    param_map = {_text(k).lower(): _text(v) for k, v in zip(params[::2], params[1::2])}
+    # Text parts: [8] md5, [9] disposition
+    disposition = structure[9] if len(structure) > 9 and isinstance(structure[9], list) else []
+    if disposition and _text(disposition[0]).lower() == 'attachment':
+        return []
+
+    return [BodyPart(
+        section=prefix or '1',
+        subtype=sub_type,
+        charset=param_map.get('charset') or 'utf-8',
+        encoding=_text(structure[5]).lower() if len(structure) > 5 else '7bit',
+        size=structure[6] if len(structure) > 6 and isinstance(structure[6], int) else 0
+    )]
+
+
+def choose_text_part(structure: list) -> Optional[BodyPart]:
+    """Pick the part a reader would see: first text/plain, else first text/html."""
+    parts = find_text_parts(structure)
+    for part in parts:
+        if part.subtype == 'plain':
+            return part
+    return parts[0] if parts else None
+
+
+def decode_part(data: bytes, encoding: str, charset: str, truncated: bool = False) -> str:
+    """Decode a (possibly truncated) body part to text."""
+    encoding = (encoding or '').lower()
+    if encoding == 'base64':
+        compact = b''.join(data.split())
+        if truncated:
+            compact = compact[:len(compact) // 4 * 4]
+        try:
+            data = base64.b64decode(compact)
+        except (binascii.Error, ValueError):
+            data = b''
+    elif encoding == 'quoted-printable':
+        if truncated:
+            # Drop an escape sequence cut in half by the byte range
+            cut = data.rfind(b'=', max(0, len(data) - 2))
+            if cut != -1:
+                data = data[:cut]
+        data = quopri.decodestring(data)
+
+    try:
+        codecs.lookup(charset)
+    except LookupError:
+        charset = 'utf-8'
+    text = data.decode(charset, 'replace')
+    if truncated:
+        # A multi-byte character may have been cut at the end
+        text = text.rstrip('\ufffd')
+    return text
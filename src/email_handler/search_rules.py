@@ -0,0 +1,82 @@
+"""Compile sender/domain/keyword pattern lists into IMAP SEARCH queries."""
+from dataclasses import dataclass, field
+from typing import List
+
+# Terms OR-ed together in one SEARCH command (keeps command lines well under server limits)
+SEARCH_GROUP_SIZE = 50
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _or_tree(keys: List[str]) -> str:
+    """Combine search keys with the binary OR operator, as a balanced tree."""
+    if len(keys) == 1:
+        return keys[0]
+    middle = len(keys) // 2
+    left, right = _or_tree(keys[:middle]), _or_tree(keys[middle:])
+    # Parenthesize sub-trees so each OR operand is a single search key
+    if middle > 1:
+        left = f"({left})"
+    if len(keys) - middle > 1:
+        right = f"({right})"
+    return f"OR {left} {right}"
+
+
+def _searchable(terms: List[str]) -> List[str]:
+    """Drop duplicates and terms a plain US-ASCII SEARCH cannot carry."""
+    seen = set()
+    result = []
+    for term in terms:
+        term = term.strip().lower()
+        if term.startswith('*.'):
+            term = term[2:]
+        if not term or term in seen or not term.isascii():
+            continue
+        seen.add(term)
+        result.append(term)
+    return result
+
+
+@dataclass
+class ServerSearchRules:
+    """Sender and subject patterns that can be checked by the IMAP server.
+
+    from_terms are addresses and domains (a '*.' wildcard prefix is
+    dropped), subject_terms are keywords. SEARCH FROM / SUBJECT match
+    substrings, so the UIDs found are candidates: the caller still runs
+    its own filters on their headers. Non-ASCII terms are left out and
+    only caught by the regular scan.
+    """
+    from_terms: List[str] = field(default_factory=list)
+    subject_terms: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.from_terms or self.subject_terms)
+
+    def queries(self, gmail: bool = False, group_size: int = SEARCH_GROUP_SIZE) -> List[str]:
+        """SEARCH criteria whose results, together, cover every term.
+
+        With gmail=True each query is a single X-GM-RAW search
+        (from:{a b} / subject:{c d}), otherwise an OR tree of FROM and
+        SUBJECT keys.
+        """
+        keys = ([('from', t) for t in _searchable(self.from_terms)] +
+                [('subject', t) for t in _searchable(self.subject_terms)])
+        queries = []
+        for start in range(0, len(keys), group_size):
+            group = keys[start:start + group_size]
+            if gmail:
+                queries.append(f"X-GM-RAW {_quote(_gmail_raw(group))}")
+            else:
+                queries.append(_or_tree([f"{name.upper()} {_quote(term)}" for name, term in group]))
+        return queries
+
+
+def _gmail_raw(keys: List[tuple]) -> str:
+    """Gmail search syntax for (field, term) pairs; {a b} means a OR b."""
+    groups = {}
+    for name, term in keys:
+        groups.setdefault(name, []).append(_quote(term) if ' ' in term else term)
+    return ' OR '.join(f"{name}:{{{' '.join(terms)}}}" for name, terms in groups.items())
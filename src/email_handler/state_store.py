@@ -0,0 +1,260 @@
+"""Persistent per-account IMAP sync state (SQLite)."""
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Optional, Set
+
+
+@dataclass
+class FolderState:
+    uidvalidity: int
+    last_uid: int
+
+
+@dataclass
+class FolderStatus:
+    """STATUS values of a folder; highestmodseq is None without CONDSTORE."""
+    uidvalidity: int
+    uidnext: int
+    messages: int
+    unseen: int
+    highestmodseq: Optional[int] = None
+
+
+@dataclass
+class BackfillState:
+    uidvalidity: int
+    # The sweep resumes with the UIDs below next_uid (0 = finished)
+    next_uid: int
+    processed: int = 0
+    moved: int = 0
+
+
+class SyncStateStore:
+    """Stores UIDVALIDITY and the highest processed UID per account/folder,
+    the folder STATUS seen after the last completed run, the discovered
+    Spam/Trash folder names per account, the progress of backfill
+    sweeps, and the server-search candidates that were checked and kept.
+
+    A single store can be shared by several EmailFetcher instances (and threads).
+    """
+
+    def __init__(self, db_path: str):
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS folder_state (
+                    account TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    uidvalidity INTEGER NOT NULL,
+                    last_uid INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT,
+                    PRIMARY KEY (account, folder)
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS special_folders (
+                    account TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    PRIMARY KEY (account, role)
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS folder_status (
+                    account TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    uidvalidity INTEGER NOT NULL,
+                    uidnext INTEGER NOT NULL,
+                    messages INTEGER NOT NULL,
+                    unseen INTEGER NOT NULL,
+                    highestmodseq INTEGER,
+                    PRIMARY KEY (account, folder)
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS backfill_state (
+                    account TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    uidvalidity INTEGER NOT NULL,
+                    next_uid INTEGER NOT NULL,
+                    processed INTEGER NOT NULL DEFAULT 0,
+                    moved INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT,
+                    PRIMARY KEY (account, folder)
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS search_kept (
+                    account TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    uidvalidity INTEGER NOT NULL,
+                    patterns TEXT NOT NULL,
+                    uid INTEGER NOT NULL,
+                    PRIMARY KEY (account, folder, uid)
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS search_state (
+                    account TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    patterns TEXT NOT NULL,
+                    updated_at TEXT,
+                    PRIMARY KEY (account, folder)
+                )"""
+            )
+
+    def get_folder_state(self, account: str, folder: str) -> Optional[FolderState]:
+        """Return the stored state for a folder, or None if it was never synced."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT uidvalidity, last_uid FROM folder_state WHERE account = ? AND folder = ?",
+                (account, folder)
+            ).fetchone()
+        if not row:
+            return None
+        return FolderState(uidvalidity=row[0], last_uid=row[1])
+
+    def set_folder_state(self, account: str, folder: str, uidvalidity: int, last_uid: int):
+        """Persist the UID watermark for a folder."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO folder_state (account, folder, uidvalidity, last_uid, updated_at)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(account, folder) DO UPDATE SET
+                       uidvalidity = excluded.uidvalidity,
+                       last_uid = excluded.last_uid,
+                       updated_at = excluded.updated_at""",
+                (account, folder, uidvalidity, last_uid, datetime.now().isoformat(timespec='seconds'))
+            )
+
+    def get_folder_status(self, account: str, folder: str) -> Optional[FolderStatus]:
+        """Return the STATUS recorded after the last completed run, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT uidvalidity, uidnext, messages, unseen, highestmodseq
+                   FROM folder_status WHERE account = ? AND folder = ?""",
+                (account, folder)
+            ).fetchone()
+        if not row:
+            return None
+        return FolderStatus(*row)
+
+    def set_folder_status(self, account: str, folder: str, status: FolderStatus):
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO folder_status
+                   (account, folder, uidvalidity, uidnext, messages, unseen, highestmodseq)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (account, folder, status.uidvalidity, status.uidnext, status.messages, status.unseen,
+                 status.highestmodseq)
+            )
+
+    def clear_folder_status(self, account: str, folder: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM folder_status WHERE account = ? AND folder = ?",
+                (account, folder)
+            )
+
+    def get_special_folder(self, account: str, role: str) -> Optional[str]:
+        """Return the cached folder name for a role ('junk', 'trash'), if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT folder FROM special_folders WHERE account = ? AND role = ?",
+                (account, role)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_special_folder(self, account: str, role: str, folder: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO special_folders (account, role, folder) VALUES (?, ?, ?)",
+                (account, role, folder)
+            )
+
+    def clear_special_folder(self, account: str, role: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM special_folders WHERE account = ? AND role = ?",
+                (account, role)
+            )
+
+    def get_backfill_state(self, account: str, folder: str) -> Optional[BackfillState]:
+        """Return the checkpoint of a backfill sweep, or None if none was started."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT uidvalidity, next_uid, processed, moved FROM backfill_state WHERE account = ? AND folder = ?",
+                (account, folder)
+            ).fetchone()
+        if not row:
+            return None
+        return BackfillState(uidvalidity=row[0], next_uid=row[1], processed=row[2], moved=row[3])
+
+    def set_backfill_state(self, account: str, folder: str, state: BackfillState):
+        """Checkpoint a backfill sweep."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO backfill_state
+                   (account, folder, uidvalidity, next_uid, processed, moved, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (account, folder, state.uidvalidity, state.next_uid, state.processed, state.moved,
+                 datetime.now().isoformat(timespec='seconds'))
+            )
+
+    def clear_backfill_state(self, account: str, folder: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM backfill_state WHERE account = ? AND folder = ?",
+                (account, folder)
+            )
+
+    def get_search_kept(self, account: str, folder: str, uidvalidity: int, patterns: str) -> Set[int]:
+        """UIDs a server search already checked and kept, under this UIDVALIDITY and these patterns."""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT uid FROM search_kept
+                   WHERE account = ? AND folder = ? AND uidvalidity = ? AND patterns = ?""",
+                (account, folder, uidvalidity, patterns)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def add_search_kept(self, account: str, folder: str, uidvalidity: int, patterns: str, uids: Iterable[int]):
+        """Remember kept search candidates; those recorded under another UIDVALIDITY or patterns are dropped."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                """DELETE FROM search_kept
+                   WHERE account = ? AND folder = ? AND (uidvalidity != ? OR patterns != ?)""",
+                (account, folder, uidvalidity, patterns)
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO search_kept (account, folder, uidvalidity, patterns, uid) VALUES (?, ?, ?, ?, ?)",
+                [(account, folder, uidvalidity, patterns, int(uid)) for uid in uids]
+            )
+
+    def get_search_patterns(self, account: str, folder: str) -> Optional[str]:
+        """Fingerprint of the patterns the last server search of a folder ran with, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT patterns FROM search_state WHERE account = ? AND folder = ?",
+                (account, folder)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_search_patterns(self, account: str, folder: str, patterns: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_state (account, folder, patterns, updated_at) VALUES (?, ?, ?, ?)",
+                (account, folder, patterns, datetime.now().isoformat(timespec='seconds'))
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
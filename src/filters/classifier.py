@@ -0,0 +1,192 @@
+"""Verdicts for fetched messages from the compiled pattern lists, without touching the mailbox."""
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from email_handler.fetcher import LazyEmailMessage, prefetch_bodies
+
+from .features import MessageFeatures
+from .keyword_engine import KeywordEngine
+from .sender_index import SenderIndex, SenderVerdict
+
+# Sender lists in priority order (the spam keywords are checked between spam and delete senders)
+SENDER_TAGS = ['trusted', 'spam_email', 'spam_domain', 'delete_email', 'delete_domain']
+
+# compile() argument -> SenderIndex tag / KeywordEngine tag
+_SENDER_LISTS = {
+    'trusted': 'trusted',
+    'spam_emails': 'spam_email',
+    'spam_domains': 'spam_domain',
+    'delete_emails': 'delete_email',
+    'delete_domains': 'delete_domain',
+}
+_KEYWORD_LISTS = {
+    'spam_keywords': 'spam',
+    'delete_keywords': 'delete',
+}
+
+# Sender list -> (action, reason prefix)
+_SENDER_ACTIONS = {
+    'spam_email': ('spam', 'Spam email'),
+    'spam_domain': ('spam', 'Domain'),
+    'delete_email': ('deleted', 'Delete email'),
+    'delete_domain': ('deleted', 'Delete domain'),
+}
+
+
+@dataclass(frozen=True)
+class Verdict:
+    """What to do with one message.
+
+    action is 'trusted', 'spam', 'deleted' or 'keep'; rule is the check
+    that decided (a sender list, 'spam_keywords' or 'delete_keywords',
+    None for 'keep') and reason the matching patterns, as the report
+    shows them.
+    """
+    action: str
+    rule: Optional[str] = None
+    reason: Optional[str] = None
+
+
+TRUSTED = Verdict('trusted', 'trusted')
+KEEP = Verdict('keep')
+
+
+class Classifier:
+    """The filter rules over compiled sender and keyword engines, as a pure function of the message.
+
+    classify() returns the verdict of the first rule that matches:
+    trusted senders, spam senders, spam keywords, delete senders, delete
+    keywords. Nothing is sent to the server; queueing the move is the
+    caller's job. The only I/O is a header-only message's body, which is
+    downloaded when a keyword rule needs it and its subject alone does
+    not match.
+    """
+
+    def __init__(self, sender_index: SenderIndex, keyword_engine: KeywordEngine):
+        self.sender_index = sender_index
+        self.keyword_engine = keyword_engine
+
+    @classmethod
+    def compile(cls, trusted: List[str], spam_emails: List[str], spam_domains: List[str], spam_keywords: List[str],
+                delete_emails: List[str], delete_domains: List[str], delete_keywords: List[str]) -> 'Classifier':
+        """Build the engines from the pattern lists (as load_patterns returns them)."""
+        sender_index = SenderIndex(SENDER_TAGS)
+        sender_index.add_trusted('trusted', trusted)
+        sender_index.add_addresses('spam_email', spam_emails)
+        sender_index.add_domains('spam_domain', spam_domains)
+        sender_index.add_addresses('delete_email', delete_emails)
+        sender_index.add_domains('delete_domain', delete_domains)
+        keyword_engine = KeywordEngine({'spam': spam_keywords, 'delete': delete_keywords})
+        return cls(sender_index, keyword_engine)
+
+    def replaced(self, **lists: List[str]) -> 'Classifier':
+        """A new Classifier with some lists replaced (named as in compile()); this one is left as it is.
+
+        Changed sender lists are re-indexed incrementally
+        (SenderIndex.replaced). The keyword automaton covers both keyword
+        lists, so it is rebuilt when either changes and shared otherwise.
+        """
+        unknown = set(lists) - set(_SENDER_LISTS) - set(_KEYWORD_LISTS)
+        if unknown:
+            raise ValueError(f"Unknown pattern list(s): {', '.join(sorted(unknown))}")
+        sender_index = self.sender_index
+        for name, tag in _SENDER_LISTS.items():
+            if name in lists:
+                sender_index = sender_index.replaced(tag, lists[name])
+        keyword_engine = self.keyword_engine
+        if any(name in lists for name in _KEYWORD_LISTS):
+            keyword_engine = KeywordEngine({tag: lists.get(name, self.keyword_engine.lists.get(tag, []))
+                                            for name, tag in _KEYWORD_LISTS.items()})
+        return Classifier(sender_index, keyword_engine)
+
+    def classify(self, email, features: Optional[MessageFeatures] = None) -> Verdict:
+        if features is None:
+            features = MessageFeatures(email)
+        return self._classify(email, features, self.sender_index.lookup_features(features))
+
+    def classify_batch(self, messages: Iterable,
+                       features: Optional[Sequence[MessageFeatures]] = None) -> List[Verdict]:
+        """Verdicts for a fetched batch, in order.
+
+        Senders are looked up once per distinct address, so a batch with
+        many messages from the same mailer costs one lookup for them all.
+        The header-only messages whose verdict depends on their body get
+        their bodies in one download (prefetch_bodies) before any keyword
+        is matched, not one FETCH per message.
+        features holds the messages' normalized records, in the same order,
+        when the caller keeps them (as for classify).
+        """
+        messages = list(messages)
+        if features is None:
+            features = [MessageFeatures(email) for email in messages]
+        senders: Dict[str, Optional[SenderVerdict]] = {}
+        batch = []
+        for email, record in zip(messages, features):
+            if record.sender not in senders:
+                senders[record.sender] = self.sender_index.lookup_features(record)
+            batch.append((email, record, senders[record.sender]))
+        prefetch_bodies(email for email, features, sender in batch if self._needs_body(email, features, sender))
+        return [self._classify(email, features, sender) for email, features, sender in batch]
+
+    def _needs_body(self, email, features: MessageFeatures, sender: Optional[SenderVerdict]) -> bool:
+        """True if _classify would download this message's body (see _keyword_matches)."""
+        if not isinstance(email, LazyEmailMessage) or email.body_loaded:
+            return False
+        sender_tag = sender.tag if sender else None
+        if sender_tag in ('trusted', 'spam_email', 'spam_domain'):
+            return False
+        lists = self.keyword_engine.lists
+        hits = self.keyword_engine.scan_lowered(features.subject)
+        if lists.get('spam'):
+            return not hits.get('spam')
+        # No spam keywords: only the delete keywords (after the delete senders) read the body
+        return not sender_tag and bool(lists.get('delete')) and not hits.get('delete')
+
+    def _classify(self, email, features: MessageFeatures, sender: Optional[SenderVerdict]) -> Verdict:
+        # Keyword matches for all lists, computed at most once (see _keyword_matches)
+        scan = {}
+        sender_tag = sender.tag if sender else None
+
+        # 1. Trusted senders (skip filtering, but mark as keep)
+        if sender_tag == 'trusted':
+            return TRUSTED
+        # 2-3. Spam emails (exact match) and spam domains
+        if sender_tag in ('spam_email', 'spam_domain'):
+            return self._sender_verdict(sender)
+        # 4. Spam keywords (subject OR body)
+        keywords = self._keyword_matches(email, features, 'spam', scan)
+        if keywords:
+            return Verdict('spam', 'spam_keywords', f"Keywords: {', '.join(keywords)}")
+        # 5-6. Delete emails (exact match) and delete domains
+        if sender_tag:
+            return self._sender_verdict(sender)
+        # 7. Delete keywords (subject OR body)
+        keywords = self._keyword_matches(email, features, 'delete', scan)
+        if keywords:
+            return Verdict('deleted', 'delete_keywords', f"Delete keywords: {', '.join(keywords)}")
+        # 8. No match - keep email
+        return KEEP
+
+    @staticmethod
+    def _sender_verdict(sender: SenderVerdict) -> Verdict:
+        action, prefix = _SENDER_ACTIONS[sender.tag]
+        return Verdict(action, sender.tag, f"{prefix}: {', '.join(sender.rules)}")
+
+    def _keyword_matches(self, email, features: MessageFeatures, tag: str, scan: Dict) -> List[str]:
+        """Keywords of one list ('spam' / 'delete') found in the subject or body.
+
+        A message whose body is not downloaded yet is matched on its subject
+        first, so the body is only fetched when the subject alone does not
+        decide; its reason then lists the subject's keywords only (see
+        README). Otherwise subject and body are scanned once for all lists;
+        scan keeps that result for the next list.
+        """
+        if not self.keyword_engine.lists.get(tag):
+            return []
+        if isinstance(email, LazyEmailMessage) and not email.body_loaded:
+            hits = self.keyword_engine.scan_lowered(features.subject).get(tag)
+            if hits:
+                return hits
+        if 'hits' not in scan:
+            scan['hits'] = self.keyword_engine.scan_lowered(features.subject, features.filter_text)
+        return scan['hits'].get(tag, [])
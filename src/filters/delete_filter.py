@@ -1,6 +1,8 @@
 """Delete immediately pattern filter."""
 from typing import List
 
+from .keyword_engine import KeywordEngine
+
 
 def load_patterns(filepath: str) -> List[str]:
     """Load delete keyword patterns from file."""
@@ -16,17 +18,12 @@ def load_patterns(filepath: str) -> List[str]:
 class DeleteFilter:
     def __init__(self, delete_keywords_file: str):
         self.delete_keywords = load_patterns(delete_keywords_file)
+        self.engine = KeywordEngine({'delete': self.delete_keywords})
 
     def should_delete(self, subject: str, body: str) -> bool:
         """Check if subject OR body contains delete keywords."""
-        content = f"{subject} {body}".lower()
-
-        for keyword in self.delete_keywords:
-            if keyword in content:
-                return True
-        return False
+        return bool(self.engine.scan(subject, body))
 
     def get_matching_keywords(self, subject: str, body: str) -> List[str]:
         """Return matching delete keywords."""
-        content = f"{subject} {body}".lower()
-        return [k for k in self.delete_keywords if k in content]
+        return self.engine.scan(subject, body).get('delete', [])
@@ -0,0 +1,45 @@
+"""Normalized per-message record shared by the filter engines and the summary prompt."""
+from typing import Optional
+
+# Body characters the summarizers put in the prompt
+PROMPT_BODY_CHARS = 1500
+
+
+class MessageFeatures:
+    """What the filters and the prompt builder read from a message, normalized once.
+
+    sender is the lower-cased address (pattern files are lower-cased the
+    same way), split into local part and domain; subject is lower-cased.
+    The body fields are computed on first access, so a header-only
+    message is not downloaded until a filter needs its body. The two body
+    fields are kept apart on purpose: filter_text is the whole visible
+    body, lower-cased, quoted replies and signature included, for the
+    keyword engine; prompt_text is the start of clean_text (original
+    case, without quoted replies or signature) for the summary prompt
+    only. Built once per message, by the Classifier or by the caller that
+    hands it on to the summary step.
+    """
+    __slots__ = ('sender', 'local', 'domain', 'has_at', 'subject', '_email', '_filter_text', '_prompt_text')
+
+    def __init__(self, email):
+        self._email = email
+        self.sender = (email.from_ or '').strip().lower()
+        local, at, domain = self.sender.rpartition('@')
+        self.has_at = bool(at)
+        self.local = local
+        self.domain = domain
+        self.subject = (email.subject or '').lower()
+        self._filter_text: Optional[str] = None
+        self._prompt_text: Optional[str] = None
+
+    @property
+    def filter_text(self) -> str:
+        if self._filter_text is None:
+            self._filter_text = self._email.filter_text.lower()
+        return self._filter_text
+
+    @property
+    def prompt_text(self) -> str:
+        if self._prompt_text is None:
+            self._prompt_text = self._email.clean_text[:PROMPT_BODY_CHARS]
+        return self._prompt_text
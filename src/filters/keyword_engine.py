@@ -0,0 +1,110 @@
+"""Single-pass keyword matching for all keyword lists (Aho-Corasick)."""
+from typing import Dict, List, Tuple
+
+# Below this many keywords, one `in` test per keyword (a C-speed substring search) is
+# faster than stepping the automaton through the text in Python
+AUTOMATON_MIN_KEYWORDS = 200
+
+
+class KeywordEngine:
+    """Keyword lists compiled into one Aho-Corasick automaton.
+
+    lists maps a tag ('spam', 'delete', ...) to its keywords (already
+    lower-case, as load_patterns returns them). scan() reads the text once,
+    whatever the number of keywords, and returns every keyword found,
+    grouped by tag in list order. Matching is case-insensitive substring
+    matching, like `keyword in content.lower()`. Short lists skip the
+    automaton (see AUTOMATON_MIN_KEYWORDS).
+    """
+
+    def __init__(self, lists: Dict[str, List[str]]):
+        self.lists = {tag: list(keywords) for tag, keywords in lists.items()}
+        # One entry per distinct keyword; a keyword can belong to several lists
+        self._keywords: List[str] = []
+        index = {}
+        for keywords in self.lists.values():
+            for keyword in keywords:
+                if keyword and keyword not in index:
+                    index[keyword] = len(self._keywords)
+                    self._keywords.append(keyword)
+        self._goto = self._fail = self._out = self._next = None
+        if len(self._keywords) >= AUTOMATON_MIN_KEYWORDS:
+            self._build(self._keywords)
+
+    def __bool__(self) -> bool:
+        return bool(self._keywords)
+
+    def _build(self, keywords: List[str]):
+        # Trie: goto[state][char] -> state, out[state] = keyword ids ending there
+        goto: List[Dict[str, int]] = [{}]
+        out: List[Tuple[int, ...]] = [()]
+        for i, keyword in enumerate(keywords):
+            state = 0
+            for char in keyword:
+                nxt = goto[state].get(char)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][char] = nxt
+                    goto.append({})
+                    out.append(())
+                state = nxt
+            out[state] += (i,)
+
+        # Breadth-first: failure links, and each state's outputs extended with its failure state's
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            out[state] += out[fail[state]]
+            for char, nxt in goto[state].items():
+                target = fail[state]
+                while target and char not in goto[target]:
+                    target = fail[target]
+                fail[nxt] = goto[target].get(char, 0)
+                queue.append(nxt)
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+        # Transitions resolved through the failure links, filled in as texts are scanned, so a
+        # scan costs one dict lookup per character and memory only grows with what texts use
+        self._next = [dict(edges) for edges in goto]
+
+    def scan(self, *texts: str) -> Dict[str, List[str]]:
+        """Keywords found in the texts joined by spaces, per tag (tags without a match are left out)."""
+        return self.scan_lowered(*(text.lower() for text in texts))
+
+    def scan_lowered(self, *texts: str) -> Dict[str, List[str]]:
+        """scan() for texts that are already lower-case (e.g. a message's feature record)."""
+        if self._goto is None:
+            content = ' '.join(texts)
+            matched = {k for k in self._keywords if k in content}
+        else:
+            matched = self._run(texts)
+        if not matched:
+            return {}
+        result = {}
+        for tag, keywords in self.lists.items():
+            hits = [k for k in keywords if k in matched]
+            if hits:
+                result[tag] = hits
+        return result
+
+    def _run(self, texts: Tuple[str, ...]) -> set:
+        """Step the automaton through the texts (and the spaces between them) once."""
+        transitions, out = self._next, self._out
+        found = set()
+        state = 0
+        for n, text in enumerate(texts):
+            for char in (' ' + text if n else text):
+                nxt = transitions[state].get(char)
+                if nxt is None:
+                    nxt = transitions[state][char] = self._resolve(state, char)
+                state = nxt
+                if out[state]:
+                    found.update(out[state])
+        return {self._keywords[i] for i in found}
+
+    def _resolve(self, state: int, char: str) -> int:
+        goto, fail = self._goto, self._fail
+        while state and char not in goto[state]:
+            state = fail[state]
+        return goto[state].get(char, 0)
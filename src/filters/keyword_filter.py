@@ -1,6 +1,8 @@
 """Keyword-based spam filter."""
 from typing import List
 
+from .keyword_engine import KeywordEngine
+
 
 def load_patterns(filepath: str) -> List[str]:
     """Load keyword patterns from file."""
@@ -16,17 +18,12 @@ def load_patterns(filepath: str) -> List[str]:
 class KeywordFilter:
     def __init__(self, spam_keywords_file: str):
         self.spam_keywords = load_patterns(spam_keywords_file)
+        self.engine = KeywordEngine({'spam': self.spam_keywords})
 
     def is_spam(self, subject: str, body: str) -> bool:
         """Check if subject OR body contains spam keywords."""
-        content = f"{subject} {body}".lower()
-
-        for keyword in self.spam_keywords:
-            if keyword in content:
-                return True
-        return False
+        return bool(self.engine.scan(subject, body))
 
     def get_matching_keywords(self, subject: str, body: str) -> List[str]:
         """Return matching spam keywords."""
-        content = f"{subject} {body}".lower()
-        return [k for k in self.spam_keywords if k in content]
+        return self.engine.scan(subject, body).get('spam', [])
@@ -0,0 +1,155 @@
+"""Pattern lists of config/patterns, recompiled in the background when the files change."""
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+
+from .classifier import Classifier
+from .keyword_filter import load_patterns
+
+# List name (as Classifier.compile() takes it) -> file in the patterns directory
+PATTERN_FILES = {
+    'trusted': 'trusted_senders.txt',
+    'spam_emails': 'spam_emails.txt',
+    'spam_domains': 'spam_domains.txt',
+    'spam_keywords': 'spam_keywords.txt',
+    'delete_emails': 'delete_emails.txt',
+    'delete_domains': 'delete_domains.txt',
+    'delete_keywords': 'delete_keywords.txt',
+}
+
+
+@dataclass(frozen=True)
+class PatternSnapshot:
+    """All pattern lists of one version and the Classifier compiled from them."""
+    version: int
+    lists: Mapping[str, Tuple[str, ...]]
+    classifier: Classifier
+
+    @property
+    def fingerprint(self) -> str:
+        """Digest of every list's entries; unlike version, it stays the same across restarts."""
+        return hashlib.sha1(repr(sorted(self.lists.items())).encode('utf-8')).hexdigest()
+
+
+class PatternRepository:
+    """The pattern files of one directory, compiled, kept current while the agent runs.
+
+    snapshot is only ever replaced as a whole (one attribute assignment),
+    so code that reads it once per message, or once per batch, works on
+    one consistent version of every list while a reload goes on.
+
+    start() runs a watcher thread that compares the files' modification
+    times every poll_seconds; notify() (called when the pattern editor
+    has saved) makes it look at once. A file whose mtime or size moved is
+    read again, and only the lists whose entries differ are recompiled
+    (Classifier.replaced), in the watcher thread, before the new snapshot
+    is swapped in.
+    """
+
+    def __init__(self, patterns_dir: str, poll_seconds: float = 2.0):
+        self.patterns_dir = patterns_dir
+        self.poll_seconds = poll_seconds
+        # (mtime_ns, size) of each file when it was last read, None if missing
+        self._stamps: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._reload_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        lists = {}
+        for name in PATTERN_FILES:
+            self._stamps[name] = self._stamp(name)
+            lists[name] = self._read(name)
+        self.snapshot = PatternSnapshot(0, MappingProxyType(lists), Classifier.compile(**lists))
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.patterns_dir, PATTERN_FILES[name])
+
+    def _stamp(self, name: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self._path(name))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self, name: str) -> Tuple[str, ...]:
+        path = self._path(name)
+        if name != 'trusted':
+            return tuple(load_patterns(path))
+        # Trusted senders keep every non-empty line (no comment lines)
+        if not os.path.exists(path):
+            return ()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return tuple(line.strip().lower() for line in f if line.strip())
+        except Exception as e:
+            print(f"Error loading trusted senders: {e}")
+            return ()
+
+    def reload(self) -> bool:
+        """Re-read the files that changed and swap in a new snapshot. Returns True if a list changed."""
+        with self._reload_lock:
+            stamps, changed = {}, {}
+            for name in PATTERN_FILES:
+                # Stamp before reading: a write that lands during the read is seen next time
+                stamp = self._stamp(name)
+                if stamp == self._stamps[name]:
+                    continue
+                stamps[name] = stamp
+                entries = self._read(name)
+                if entries != self.snapshot.lists[name]:
+                    changed[name] = entries
+            if not changed:
+                self._stamps.update(stamps)
+                return False
+
+            started = time.monotonic()
+            current = self.snapshot
+            lists = dict(current.lists)
+            lists.update(changed)
+            classifier = current.classifier.replaced(**changed)
+            self.snapshot = PatternSnapshot(current.version + 1, MappingProxyType(lists), classifier)
+            # Only now: if compiling failed, the files are read again on the next check
+            self._stamps.update(stamps)
+            print(f"Patterns reloaded: {', '.join(PATTERN_FILES[name] for name in changed)} "
+                  f"({time.monotonic() - started:.2f}s)")
+            return True
+
+    def notify(self):
+        """Look for changed files now, e.g. right after the pattern editor saved them."""
+        if self._thread is not None:
+            self._wake.set()
+        else:
+            threading.Thread(target=self._reload_logged, daemon=True).start()
+
+    def start(self):
+        """Watch the files in a background thread (does nothing if poll_seconds is 0)."""
+        if self._thread is not None or self.poll_seconds <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            if not self._stop.is_set():
+                self._reload_logged()
+
+    def _reload_logged(self):
+        try:
+            self.reload()
+        except Exception as e:
+            print(f"Pattern reload failed: {e} (keeping the previous patterns)")
@@ -0,0 +1,247 @@
+"""One lookup structure for all sender lists: exact addresses, domains and wildcards."""
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from .features import MessageFeatures
+
+# Top-level domains a bare trusted entry ('github.com') must end in to be read as a domain;
+# any two-letter label counts too (country codes). 'john.doe' stays a substring.
+GENERIC_TLDS = frozenset((
+    'com', 'net', 'org', 'edu', 'gov', 'mil', 'int', 'info', 'biz', 'name', 'pro',
+    'io', 'ai', 'app', 'dev', 'cloud', 'online', 'site', 'tech', 'email', 'xyz', 'me',
+))
+_HOST_LABEL = re.compile(r'[a-z0-9]([a-z0-9-]*[a-z0-9])?$')
+
+
+@dataclass
+class SenderVerdict:
+    """The highest-priority list a sender matched, and that list's matching rules (in file order)."""
+    tag: str
+    rules: List[str]
+
+
+class _DomainNode:
+    __slots__ = ('children', 'rules')
+
+    def __init__(self):
+        self.children: Dict[str, '_DomainNode'] = {}
+        self.rules: List[Tuple[int, str]] = []  # (priority, pattern)
+
+    def copy(self) -> '_DomainNode':
+        node = _DomainNode()
+        node.children = dict(self.children)
+        node.rules = list(self.rules)
+        return node
+
+
+class SenderIndex:
+    """Sender rules of several lists, checked with one lookup per message.
+
+    tags gives the lists in priority order. Exact addresses go into one
+    hash map; domain rules ('example.com' or '*.example.com', both
+    matching the domain and its subdomains, as domain_matches does) into
+    a trie keyed by the domain's labels from right to left. A lookup
+    lower-cases the sender once and costs one dict access per domain
+    label, however long the lists are.
+
+    An index is not changed once built: replaced() returns a new one that
+    shares everything but the entries that changed.
+    """
+
+    def __init__(self, tags: List[str]):
+        self.tags = list(tags)
+        self._priority = {tag: i for i, tag in enumerate(self.tags)}
+        # Per list: how its entries are read ('address', 'domain' or 'trusted'), the entries
+        # (normalized, in file order) and each pattern's first position, for ordering verdict rules
+        self._kinds: Dict[str, str] = {}
+        self._entries: Dict[str, List[str]] = {}
+        self._positions: Dict[str, Dict[str, int]] = {}
+        self._addresses: Dict[str, List[Tuple[int, str]]] = {}
+        self._domains = _DomainNode()
+        # Free-form substrings (trusted entries that are neither an address nor a domain)
+        self._substrings: List[Tuple[int, str]] = []
+
+    def add_addresses(self, tag: str, addresses: List[str]):
+        self._add(tag, 'address', addresses)
+
+    def add_domains(self, tag: str, patterns: List[str]):
+        self._add(tag, 'domain', patterns)
+
+    def add_trusted(self, tag: str, entries: List[str]):
+        """Trusted senders: 'user@host' is an address; '@host', '*.host' and a bare hostname
+        ending in a known top-level domain are domains; anything else is a substring."""
+        self._add(tag, 'trusted', entries)
+
+    def _add(self, tag: str, kind: str, entries: List[str]):
+        self._kinds[tag] = kind
+        for entry in self._set_entries(tag, entries):
+            self._insert(tag, entry)
+
+    def _set_entries(self, tag: str, entries: List[str]) -> List[str]:
+        normalized = [entry.strip().lower() for entry in entries]
+        # Entries that match nothing: empty lines, and a bare '*.' in a domain list
+        if self._kinds[tag] == 'domain':
+            normalized = [entry for entry in normalized if entry and entry != '*.']
+        else:
+            normalized = [entry for entry in normalized if entry]
+        self._entries[tag] = normalized
+        # Filled from the end, so a repeated pattern keeps its first position
+        self._positions[tag] = dict(zip(reversed(normalized), range(len(normalized) - 1, -1, -1)))
+        return normalized
+
+    def replaced(self, tag: str, entries: List[str]) -> 'SenderIndex':
+        """A new index with tag's list replaced by entries; this one is left as it is.
+
+        Only the entries added or removed since this version are indexed:
+        the address map and the trie nodes on their paths are copied, all
+        other nodes are shared. Editing a few lines of a very long list
+        costs milliseconds instead of a rebuild.
+        """
+        index = SenderIndex.__new__(SenderIndex)
+        index.tags, index._priority = self.tags, self._priority
+        index._kinds = self._kinds
+        index._entries = dict(self._entries)
+        index._positions = dict(self._positions)
+        index._addresses = dict(self._addresses)
+        index._domains = self._domains
+        index._substrings = self._substrings
+        old = self._entries.get(tag, [])
+        new = index._set_entries(tag, entries)
+        old_set, new_set = set(old), set(new)
+        if len(old_set) == len(old) and len(new_set) == len(new):
+            removed, added = old_set - new_set, new_set - old_set
+        else:
+            # Repeated lines: each copy is a rule of its own
+            removed, added = Counter(old) - Counter(new), Counter(new) - Counter(old)
+            removed, added = removed.elements(), added.elements()
+        # Nodes copied for the new index (the others still belong to this one)
+        copied: Set[_DomainNode] = set()
+        for entry in removed:
+            index._remove(tag, entry, copied)
+        for entry in added:
+            index._insert(tag, entry, copied)
+        return index
+
+    def _insert(self, tag: str, entry: str, copied: Optional[Set[_DomainNode]] = None):
+        rule = (self._priority[tag], entry)
+        site, key = _rule_site(self._kinds[tag], entry)
+        if site == 'address':
+            # Rule lists may be shared with an older index: replace them, never append in place
+            self._addresses[key] = self._addresses.get(key, []) + [rule]
+        elif site == 'domain':
+            self._domain_node(key, copied).rules.append(rule)
+        else:
+            self._substrings = self._substrings + [rule]
+
+    def _remove(self, tag: str, entry: str, copied: Set[_DomainNode]):
+        rule = (self._priority[tag], entry)
+        site, key = _rule_site(self._kinds[tag], entry)
+        if site == 'address':
+            rules = list(self._addresses[key])
+            rules.remove(rule)
+            if rules:
+                self._addresses[key] = rules
+            else:
+                del self._addresses[key]
+        elif site == 'domain':
+            self._domain_node(key, copied).rules.remove(rule)
+        else:
+            substrings = list(self._substrings)
+            substrings.remove(rule)
+            self._substrings = substrings
+
+    def _domain_node(self, labels: Tuple[str, ...], copied: Optional[Set[_DomainNode]]) -> _DomainNode:
+        """The trie node for labels (right to left), created if missing.
+
+        With copied (during replaced()), each node on the path is copied
+        once, so the previous index keeps its own.
+        """
+        if copied is not None and self._domains not in copied:
+            self._domains = self._domains.copy()
+            copied.add(self._domains)
+        node = self._domains
+        for label in labels:
+            child = node.children.get(label)
+            if child is None:
+                child = node.children[label] = _DomainNode()
+                if copied is not None:
+                    copied.add(child)
+            elif copied is not None and child not in copied:
+                child = node.children[label] = child.copy()
+                copied.add(child)
+            node = child
+        return node
+
+    def matches(self, sender: str) -> List[Tuple[int, str]]:
+        """Every rule the sender matches, as (priority, pattern)."""
+        sender = sender.strip().lower()
+        _, at, domain = sender.rpartition('@')
+        return self._matches(sender, domain, bool(at))
+
+    def _matches(self, sender: str, domain: str, has_at: bool) -> List[Tuple[int, str]]:
+        # sender is already stripped and lower-cased, domain is the part after its last '@'
+        if not sender:
+            return []
+        hits = [rule for rule in self._substrings if rule[1] in sender]
+        hits.extend(self._addresses.get(sender, ()))
+
+        labels = domain.split('.')
+        node = self._domains
+        for depth, label in enumerate(reversed(labels), 1):
+            node = node.children.get(label)
+            if node is None:
+                break
+            # Without an '@' only strict subdomains match (the rule needs '@domain' or '.domain')
+            if node.rules and (has_at or depth < len(labels)):
+                hits.extend(node.rules)
+        return hits
+
+    def lookup(self, sender: str) -> Optional[SenderVerdict]:
+        """The first list (in priority order) the sender matches, or None."""
+        return self._verdict(self.matches(sender))
+
+    def lookup_features(self, features: MessageFeatures) -> Optional[SenderVerdict]:
+        """lookup() for a message's feature record, whose sender is already normalized and split."""
+        return self._verdict(self._matches(features.sender, features.domain, features.has_at))
+
+    def _verdict(self, hits: List[Tuple[int, str]]) -> Optional[SenderVerdict]:
+        if not hits:
+            return None
+        priority = min(hit[0] for hit in hits)
+        tag = self.tags[priority]
+        rules = sorted((pattern for p, pattern in hits if p == priority), key=self._positions[tag].__getitem__)
+        return SenderVerdict(tag, rules)
+
+
+def _rule_site(kind: str, entry: str) -> Optional[Tuple[str, object]]:
+    """Where a normalized entry is indexed: ('address', address), ('domain', labels right to left)
+    or ('substring', None); None for an entry that matches nothing."""
+    if kind == 'address':
+        return ('address', entry) if entry else None
+    if kind == 'domain':
+        domain = entry[2:] if entry.startswith('*.') else entry
+        return ('domain', tuple(reversed(domain.split('.')))) if domain else None
+    local, at, host = entry.rpartition('@')
+    if local and at and '.' in host:
+        return 'address', entry
+    if at or entry.startswith('*.'):
+        domain = host[2:] if host.startswith('*.') else host
+        if _is_hostname(domain):
+            return 'domain', tuple(reversed(domain.split('.')))
+    elif _is_hostname(host) and _known_tld(host):
+        return 'domain', tuple(reversed(host.split('.')))
+    # Matched as before the index: anywhere in the sender
+    return ('substring', None) if entry else None
+
+
+def _is_hostname(host: str) -> bool:
+    """Two labels or more, each of letters, digits and inner hyphens (so not 'first_last.x' or 'a+b.com')."""
+    labels = host.split('.')
+    return len(labels) > 1 and all(_HOST_LABEL.match(label) for label in labels)
+
+
+def _known_tld(host: str) -> bool:
+    tld = host.rsplit('.', 1)[-1]
+    return tld in GENERIC_TLDS or (len(tld) == 2 and tld.isalpha())
@@ -5,22 +5,29 @@ Workflow:
 2. Fetch UNREAD emails only → Summarize and send to Telegram
 """
 
+import argparse
 import os
 import sys
+import threading
 import time
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from config_loader import load_config, AppConfig
-from email_handler.fetcher import EmailFetcher, EmailMessage
-from filters.domain_filter import DomainFilter
-from filters.keyword_filter import KeywordFilter
-from filters.delete_filter import DeleteFilter
-from filters.delete_domain_filter import DeleteDomainFilter
-from filters.delete_email_filter import DeleteEmailFilter
-from filters.spam_email_filter import SpamEmailFilter
+from email_handler.fetcher import FETCH_BATCH_SIZE, EmailFetcher, EmailMessage, PlannedMessage
+from email_handler.state_store import BackfillState, SyncStateStore
+from email_handler.actions import ActionBuffer
+from email_handler.governor import ConnectionGovernor
+from email_handler.session_pool import SessionPool
+from email_handler.idle_watcher import IdleWatcher
+from email_handler.search_rules import ServerSearchRules
+from filters.classifier import Classifier, Verdict
+from filters.features import MessageFeatures
+from filters.pattern_repository import PatternRepository
 from summarizer.openrouter_summarizer import OpenRouterSummarizer
 from summarizer.deepseek_summarizer import DeepSeekSummarizer
 from summarizer.gemini_summarizer import GeminiSummarizer
@@ -31,6 +38,17 @@ from summarizer.local_summarizer import LocalSummarizer
 from reports.telegram_sender import TelegramSender
 from scheduler import Scheduler
 
+# Log label of each filter rule (the keyword rules show the subject, the others the sender)
+_VERDICT_LABELS = {
+    'trusted': 'TRUSTED',
+    'spam_email': 'SPAM email',
+    'spam_domain': 'SPAM domain',
+    'spam_keywords': 'SPAM keywords',
+    'delete_email': 'DELETE email',
+    'delete_domain': 'DELETE domain',
+    'delete_keywords': 'DELETE keywords',
+}
+
 
 class MailAgent:
     def __init__(self, config: AppConfig):
@@ -42,27 +60,32 @@ class MailAgent:
             base_dir = os.path.join(os.path.dirname(__file__), '..')
         self.base_path = os.path.join(base_dir, 'config', 'patterns')
 
-        self.spam_email_filter = SpamEmailFilter(
-            os.path.join(self.base_path, 'spam_emails.txt')
-        )
-        self.domain_filter = DomainFilter(
-            os.path.join(self.base_path, 'spam_domains.txt')
-        )
-        self.keyword_filter = KeywordFilter(
-            os.path.join(self.base_path, 'spam_keywords.txt')
-        )
-        self.delete_email_filter = DeleteEmailFilter(
-            os.path.join(self.base_path, 'delete_emails.txt')
-        )
-        self.delete_domain_filter = DeleteDomainFilter(
-            os.path.join(self.base_path, 'delete_domains.txt')
-        )
-        self.delete_filter = DeleteFilter(
-            os.path.join(self.base_path, 'delete_keywords.txt')
+        # Persistent UID watermarks for incremental sync
+        self.state_db = config.sync.state_db
+        if not os.path.isabs(self.state_db):
+            self.state_db = os.path.join(base_dir, self.state_db)
+        self.state_store = None
+        if config.sync.incremental:
+            self.state_store = SyncStateStore(self.state_db)
+
+        # Caps concurrent IMAP sessions per provider host / per account across worker threads
+        self.governor = ConnectionGovernor(
+            max_per_host=config.sync.max_connections_per_host,
+            max_per_account=config.sync.max_connections_per_account
         )
 
-        # Cache trusted senders
-        self.trusted_senders = self._load_trusted_senders()
+        # Logged-in IMAP sessions kept open (with NOOP keepalives) between runs, in use + idle
+        # within the governor's per-host cap
+        self.session_pool = None
+        if config.sync.keep_sessions:
+            self.session_pool = SessionPool(max_per_host=config.sync.max_connections_per_host)
+
+        # One run per account at a time (the periodic sweep and IDLE push may overlap)
+        self._account_locks = {e.email: threading.Lock() for e in config.emails}
+
+        # Pattern lists, compiled; recompiled in the background when a file changes (e.g. in the tray editor)
+        self.patterns = PatternRepository(self.base_path, poll_seconds=config.sync.pattern_reload_seconds)
+        self.patterns.start()
 
         # Initialize dedicated fallback summarizers
         self.ollama_summarizer = LocalSummarizer(
@@ -173,11 +196,15 @@ class MailAgent:
             chat_id=config.telegram.chat_id
         )
 
-    def run_once(self, check_stop=None) -> Dict:
+    def run_once(self, check_stop=None, accounts: Optional[List[str]] = None) -> Dict:
         """Run email processing in a single efficient pass.
         
+        Accounts are processed one after another, or concurrently when
+        sync.account_workers > 1.
+
         Args:
             check_stop: Optional callback that returns True if processing should stop.
+            accounts: Optional email addresses to process (default: all enabled accounts).
         """
         report = {
             'all_processed': 0,
@@ -188,239 +215,510 @@ class MailAgent:
             'spam_details': [],
             'deleted_details': [],
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'imap_bytes': {'wire': 0, 'data': 0},  # COMPRESS=DEFLATE sessions only
             'by_account': {}  # New: Track stats per account
         }
 
+        selected = []
         for email_config in self.config.emails:
-            # Check for stop signal between accounts
-            if check_stop and check_stop():
-                print("🛑 Processing stopped by user.")
-                break
-
+            if accounts is not None and email_config.email not in accounts:
+                continue
             if not email_config.enabled:
                 print(f"Skipping disabled email: {email_config.email}")
                 continue
+            selected.append(email_config)
+
+        workers = min(max(1, self.config.sync.account_workers), len(selected))
+        if workers > 1:
+            print(f"Processing {len(selected)} accounts with {workers} workers")
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(self._process_account, email_config, check_stop)
+                           for email_config in selected]
+                # Merge in config order so the report matches a serial run
+                account_reports = [future.result() for future in futures]
+        else:
+            account_reports = []
+            for email_config in selected:
+                account_report = self._process_account(email_config, check_stop)
+                account_reports.append(account_report)
+                if account_report is None:
+                    break
 
-            # Initialize account stats
-            report['by_account'][email_config.email] = {
-                'processed': 0,
-                'spam': 0,
-                'deleted': 0,
-                'summarized': 0,
-                'summaries': []
-            }
-            account_stats = report['by_account'][email_config.email]
-
-            print(f"\n{'='*50}")
-            print(f"Processing: {email_config.email}")
-            print('='*50)
-
-            fetcher = EmailFetcher(
-                email=email_config.email,
-                password=email_config.password,
-                imap_host=email_config.imap_host,
-                imap_port=email_config.imap_port,
-                timeout=120
-            )
+        for email_config, account_report in zip(selected, account_reports):
+            if account_report is not None:
+                self._merge_account_report(report, email_config.email, account_report)
 
-            try:
-                processed_uids = set()
+        for host, stats in self.governor.stats().items():
+            if stats['waited']:
+                print(f"IMAP governor: {stats['waited']}/{stats['acquired']} session(s) on {host} queued "
+                      f"(avg {stats['avg_wait']}s, max {stats['max_wait']}s)")
+        if report['imap_bytes']['data']:
+            wire, data = report['imap_bytes']['wire'], report['imap_bytes']['data']
+            print(f"IMAP compression: {wire / 1024:.1f} KiB on the wire for {data / 1024:.1f} KiB of IMAP data "
+                  f"({100 * (1 - wire / data):.0f}% saved)")
 
-                # PASS 1: Fetch newest 50 emails (Maintenance: Spam/Delete check)
-                print("\n--- Pass 1: Maintenance Scan (Newest 50) ---")
-                
-                # Check stop signal before fetch
+        return report
+
+    def close(self):
+        """Stop the pattern reloader and log out of the sessions kept by sync.keep_sessions (at exit)."""
+        self.patterns.stop()
+        if self.session_pool:
+            self.session_pool.close()
+
+    def _process_account(self, email_config, check_stop=None) -> Optional[Dict]:
+        with self._account_locks.setdefault(email_config.email, threading.Lock()):
+            return self._process_account_locked(email_config, check_stop)
+
+    def _process_account_locked(self, email_config, check_stop=None) -> Optional[Dict]:
+        """Run both passes for one account.
+
+        Returns the account's partial report (run_once's report without
+        'timestamp' and 'by_account'), or None if a stop was requested
+        before it started.
+        Safe to call from several threads at once: each call has its own
+        fetcher and action buffer.
+        """
+        # Check for stop signal between accounts
+        if check_stop and check_stop():
+            print("🛑 Processing stopped by user.")
+            return None
+
+        report = {
+            'all_processed': 0,
+            'spam_count': 0,
+            'deleted_count': 0,
+            'summarized_count': 0,
+            'summarized': [],
+            'spam_details': [],
+            'deleted_details': []
+        }
+
+        print(f"\n{'='*50}")
+        print(f"Processing: {email_config.email}")
+        print('='*50)
+
+        fetcher = EmailFetcher(
+            email=email_config.email,
+            password=email_config.password,
+            imap_host=email_config.imap_host,
+            imap_port=email_config.imap_port,
+            timeout=120,
+            state_store=self.state_store,
+            body_cap=self.config.sync.filter_body_bytes or None,
+            governor=self.governor,
+            pool=self.session_pool,
+            compress=email_config.compress
+        )
+
+        # IMAP actions are queued while filtering/summarizing and sent at the end as UID sets
+        actions = ActionBuffer(fetcher)
+
+        try:
+            # Fast path: nothing arrived, moved or changed flags since the last completed run
+            if self.state_store and fetcher.mailbox_unchanged():
+                # ...unless the patterns changed since the last server search, which must run again
+                if not (self.config.sync.server_search and
+                        fetcher.search_patterns_changed(self.patterns.snapshot.fingerprint)):
+                    print("No changes since the last run (IMAP STATUS), skipping")
+                    return report
+                print("No changes since the last run (IMAP STATUS), but the patterns changed")
+
+            # Sender/subject rules over the whole INBOX, answered by the server
+            if self.config.sync.server_search:
+                self._run_server_search(fetcher, actions, report, check_stop)
+
+            # One plan covers both scans: the newest 50 emails (maintenance: spam/delete check)
+            # and up to 200 unread ones (summarization). Each email is downloaded and filtered once.
+            print("\n--- Scan: Newest 50 + Unread (Up to 200) ---")
+            
+            # Check stop signal before fetch
+            if check_stop and check_stop():
+                print("🛑 Processing stopped by user.")
+                return report
+
+            # Recent emails load their body lazily, only if a keyword filter needs it. Unread ones come
+            # with the first summary_body_bytes of their text part (the prompt is truncated anyway).
+            planned_emails = fetcher.iter_plan(recent_limit=50, unread_limit=200, new_only=True,
+                                               unread_body_cap=self.config.sync.summary_body_bytes or None)
+            
+            # Define cutoff for "old" emails (e.g., 30 days)
+            cutoff_days = 30
+            now_utc = datetime.now(timezone.utc)
+            unread_seen = 0
+            # Set when unread emails were left for the next run (the 200 cap)
+            capped = False
+            
+            # Classified FETCH_BATCH_SIZE at a time, so the recent emails whose keyword filters need
+            # their body get those bodies in one FETCH per batch (classify_batch)
+            for planned, features, verdict in self._classify_plan(planned_emails):
                 if check_stop and check_stop():
                     print("🛑 Processing stopped by user.")
                     break
-                    
-                recent_emails = fetcher.fetch_all(limit=50)
-                
-                for email in recent_emails:
-                    if check_stop and check_stop():
-                        break
 
-                    processed_uids.add(email.uid)
-                    report['all_processed'] += 1
-                    account_stats['processed'] += 1
-                    
-                    result = self._apply_filters(fetcher, email)
-                    if result['action'] == 'spam':
-                        print(f"  [{email.date}] [SPAM] {email.subject[:40]}")
-                        report['spam_count'] += 1
-                        account_stats['spam'] += 1
-                        report['spam_details'].append({'from': email.from_, 'subject': email.subject, 'reason': result['reason']})
-                    elif result['action'] == 'deleted':
-                        print(f"  [{email.date}] [DELETED] {email.subject[:40]}")
-                        report['deleted_count'] += 1
-                        account_stats['deleted'] += 1
-                        report['deleted_details'].append({'from': email.from_, 'subject': email.subject, 'reason': result['reason']})
-                    elif result['action'] == 'trusted':
-                        print(f"  [{email.date}] [TRUSTED] {email.from_[:40]}")
-                
-                if check_stop and check_stop():
-                    print("🛑 Processing stopped by user.")
+                email = planned.email
+                # Unread emails beyond the first 200 (not counting recent ones moved away) are left alone
+                if not planned.recent and unread_seen >= 200:
+                    capped = True
                     break
 
-                # PASS 2: Fetch UNREAD emails (Summarization)
-                print("\n--- Pass 2: Unread Scan (Up to 200) ---")
-                # Using fetch_unread ensures we find unread emails even if they are old (deep in inbox)
-                unread_emails = fetcher.fetch_unread(limit=200)
-                
-                # Define cutoff for "old" emails (e.g., 30 days)
-                cutoff_days = 30
-                now_utc = datetime.now(timezone.utc)
+                if planned.recent:
+                    report['all_processed'] += 1
+
+                result = self._apply_verdict(actions, email, verdict)
+                # Same window as fetching unread mail after the recent spam/delete moves
+                if planned.unread and not (planned.recent and result['action'] in ['spam', 'deleted']):
+                    unread_seen += 1
+
+                if self._record_filter_result(report, email, result):
+                    continue
+                elif result['action'] == 'trusted' and planned.recent:
+                    print(f"  [{email.date}] [TRUSTED] {email.from_[:40]}")
+
+                if not planned.unread:
+                    continue
+
+                # Read or deleted on another device since the plan: no summary needed
+                if fetcher.handled_elsewhere(email.uid):
+                    print(f"  [{email.date}] [HANDLED ELSEWHERE] Skipping summary: {email.subject[:40]}")
+                    continue
+
+                # Check age of email
+                is_old = False
+                if email.date_obj:
+                    # Ensure date_obj has timezone info to compare with now_utc
+                    # imap_tools usually returns offset-aware datetime
+                    try:
+                        email_age = now_utc - email.date_obj if email.date_obj.tzinfo else datetime.now() - email.date_obj
+                        if email_age.days > cutoff_days:
+                            is_old = True
+                    except Exception:
+                        # If comparison fails, assume it's new to be safe, or just ignore
+                        pass
                 
-                for i, email in enumerate(unread_emails):
-                    if check_stop and check_stop():
-                        print("🛑 Processing stopped by user.")
-                        break
-
-                    # Check age of email
-                    is_old = False
-                    if email.date_obj:
-                        # Ensure date_obj has timezone info to compare with now_utc
-                        # imap_tools usually returns offset-aware datetime
-                        try:
-                            email_age = now_utc - email.date_obj if email.date_obj.tzinfo else datetime.now() - email.date_obj
-                            if email_age.days > cutoff_days:
-                                is_old = True
-                        except Exception:
-                            # If comparison fails, assume it's new to be safe, or just ignore
-                            pass
-
-                    # Skip if already processed in Pass 1 (unless we want to double check, but filters already ran)
-                    if email.uid in processed_uids:
-                         pass
-
-                    # Apply filters again just in case (fast)
-                    result = self._apply_filters(fetcher, email)
-                    if result['action'] in ['spam', 'deleted']:
-                        # Already handled or needs handling
-                        if email.uid not in processed_uids:
-                             if result['action'] == 'spam':
-                                 print(f"  [{email.date}] [SPAM] {email.subject[:40]}")
-                                 report['spam_count'] += 1
-                                 account_stats['spam'] += 1
-                                 report['spam_details'].append({'from': email.from_, 'subject': email.subject, 'reason': result['reason']})
-                             else:
-                                 print(f"  [{email.date}] [DELETED] {email.subject[:40]}")
-                                 report['deleted_count'] += 1
-                                 account_stats['deleted'] += 1
-                                 report['deleted_details'].append({'from': email.from_, 'subject': email.subject, 'reason': result['reason']})
-                        continue
+                # Handle Old Emails (Skip summary, just mark read)
+                if is_old:
+                    print(f"  [{email.date}] [OLD > {cutoff_days}d] Skipping summary, marking read: {email.subject[:40]}")
+                    actions.mark_as_read(email.uid)
+                    continue
+
+                # Summarize New Unread Emails
+                print(f"\n[{unread_seen}] [{email.date}] Unread: {email.subject[:40]} {email.labels}")
+                summary = self._summarize_email(email, features)
+                if summary:
+                    print(f"  [SUMMARY] {summary[:60]}...")
+                    report['summarized_count'] += 1
                     
-                    # Handle Old Emails (Skip summary, just mark read)
-                    if is_old:
-                        print(f"  [{email.date}] [OLD > {cutoff_days}d] Skipping summary, marking read: {email.subject[:40]}")
-                        fetcher.mark_as_read(email.uid)
-                        continue
+                    summary_entry = {
+                        'account': email_config.email,
+                        'from': email.from_,
+                        'subject': email.subject,
+                        'summary': summary
+                    }
+                    
+                    report['summarized'].append(summary_entry)
+                    
+                    actions.mark_as_read(email.uid)
+
+            self._flush_actions(actions)
 
-                    # Summarize New Unread Emails
-                    print(f"\n[{i+1}/{len(unread_emails)}] [{email.date}] Unread: {email.subject[:40]} {email.labels}")
-                    summary = self._summarize_email(email)
-                    if summary:
-                        print(f"  [SUMMARY] {summary[:60]}...")
-                        report['summarized_count'] += 1
-                        account_stats['summarized'] += 1
-                        
-                        summary_entry = {
-                            'account': email_config.email,
-                            'from': email.from_,
-                            'subject': email.subject,
-                            'summary': summary
-                        }
-                        
-                        report['summarized'].append(summary_entry)
-                        account_stats['summaries'].append(summary_entry)
-                        
-                        fetcher.mark_as_read(email.uid)
-
-                fetcher.disconnect()
+            # Advance the UID watermark only when the account was fully processed. The plan runs
+            # newest first, so unread emails left by the cap sit below the UIDs that were handled.
+            if capped:
+                print("  More than 200 unread emails: the rest are left for the next run")
+                # ...which must not be skipped by the STATUS fast path
+                fetcher.discard_folder_status()
+            elif not (check_stop and check_stop()):
+                fetcher.commit_sync_state()
 
+        except Exception as e:
+            print(f"Error processing {email_config.email}: {e}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            # After an error, still mark the emails summarized so far as read (and apply the moves):
+            # they are in the report, and must not be summarized again next run
+            try:
+                self._flush_actions(actions)
             except Exception as e:
-                print(f"Error processing {email_config.email}: {e}")
-                import traceback
-                traceback.print_exc()
-                continue
+                print(f"  [ERROR] Could not apply the queued IMAP actions: {e}")
+            # Also frees the account's connection slot in the governor
+            fetcher.disconnect()
+            report['imap_bytes'] = dict(fetcher.transfer)
 
         return report
 
-    def _apply_filters(self, fetcher: EmailFetcher, email: EmailMessage) -> Dict:
-        """Apply all filters to email. Return action taken."""
-        result = {'action': 'unknown', 'reason': None}
-
-        # 1. Check trusted senders (skip filtering, but mark as keep)
-        if self._is_trusted(email.from_):
-            print(f"  [TRUSTED] {email.from_[:40]}")
-            result['action'] = 'trusted'
-            return result
-
-        # 2. Check spam emails (exact match)
-        if self.spam_email_filter.is_spam(email.from_):
-            emails = self.spam_email_filter.get_matching_emails(email.from_)
-            print(f"  [SPAM email] {email.from_[:40]}")
-            fetcher.move_to_spam(email.uid)
-            result['action'] = 'spam'
-            result['reason'] = f"Spam email: {', '.join(emails)}"
-            return result
-
-        # 3. Check spam domains
-        if self.domain_filter.is_spam(email.from_):
-            domains = self.domain_filter.get_matching_domains(email.from_)
-            print(f"  [SPAM domain] {email.from_[:40]}")
-            fetcher.move_to_spam(email.uid)
-            result['action'] = 'spam'
-            result['reason'] = f"Domain: {', '.join(domains)}"
-            return result
-
-        # 4. Check spam keywords (matches subject OR body)
-        if self.keyword_filter.is_spam(email.subject, email.text):
-            keywords = self.keyword_filter.get_matching_keywords(email.subject, email.text)
-            print(f"  [SPAM keywords] {email.subject[:40]}")
-            fetcher.move_to_spam(email.uid)
-            result['action'] = 'spam'
-            result['reason'] = f"Keywords: {', '.join(keywords)}"
-            return result
-
-        # 5. Check delete emails (exact match)
-        if self.delete_email_filter.should_delete(email.from_):
-            emails = self.delete_email_filter.get_matching_emails(email.from_)
-            print(f"  [DELETE email] {email.from_[:40]}")
-            fetcher.delete_email(email.uid)
-            result['action'] = 'deleted'
-            result['reason'] = f"Delete email: {', '.join(emails)}"
-            return result
-
-        # 6. Check delete domains
-        if self.delete_domain_filter.should_delete(email.from_):
-            domains = self.delete_domain_filter.get_matching_domains(email.from_)
-            print(f"  [DELETE domain] {email.from_[:40]}")
-            fetcher.delete_email(email.uid)
-            result['action'] = 'deleted'
-            result['reason'] = f"Delete domain: {', '.join(domains)}"
-            return result
-
-        # 7. Check delete keywords (matches subject OR body)
-        if self.delete_filter.should_delete(email.subject, email.text):
-            keywords = self.delete_filter.get_matching_keywords(email.subject, email.text)
-            print(f"  [DELETE keywords] {email.subject[:40]}")
-            fetcher.delete_email(email.uid)
-            result['action'] = 'deleted'
-            result['reason'] = f"Delete keywords: {', '.join(keywords)}"
-            return result
-
-        # 8. No match - keep email
-        result['action'] = 'keep'
-        return result
-
-    def _summarize_email(self, email: EmailMessage) -> str:
+    def start_idle_push(self, on_report, check_stop=None) -> IdleWatcher:
+        """Process an account as soon as IMAP IDLE reports new mail in its INBOX.
+
+        Only the new UIDs are fetched (incremental sync); on_report(report) is
+        called with the single-account report. Keep the periodic run_once
+        sweep running as a safety net for missed notifications.
+        """
+        def on_new_mail(email: str):
+            if check_stop and check_stop():
+                return
+            print(f"\n📬 New mail for {email} (IDLE push)")
+            on_report(self.run_once(check_stop=check_stop, accounts=[email]))
+
+        watcher = IdleWatcher([e for e in self.config.emails if e.enabled], on_new_mail)
+        watcher.start()
+        return watcher
+
+    def run_backfill(self, check_stop=None, accounts: Optional[List[str]] = None, restart: bool = False) -> Dict:
+        """Apply the spam/delete filters to every message of the backfill folder, newest first.
+
+        Each account's folder is walked in descending UID chunks of
+        backfill.chunk_size. After each chunk the moves are flushed and the
+        position is checkpointed in the state DB, so an interrupted sweep
+        continues where it stopped (restart=True starts over).
+        Chunks are paced to backfill.messages_per_minute, with at least
+        backfill.pause_seconds between them. The account lock and the IMAP
+        session are released during the pause, so scheduled runs and IDLE
+        pushes get their turn.
+        """
+        report = {
+            'all_processed': 0,
+            'spam_count': 0,
+            'deleted_count': 0,
+            'spam_details': [],
+            'deleted_details': []
+        }
+        store = self.state_store or SyncStateStore(self.state_db)
+        for email_config in self.config.emails:
+            if accounts is not None and email_config.email not in accounts:
+                continue
+            if not email_config.enabled:
+                continue
+            if check_stop and check_stop():
+                break
+            self._backfill_account(email_config, store, report, check_stop, restart)
+        return report
+
+    def _backfill_account(self, email_config, store: SyncStateStore, report: Dict, check_stop=None,
+                          restart: bool = False):
+        settings = self.config.backfill
+        folder = settings.folder
+        chunk_size = max(1, settings.chunk_size)
+        state = None if restart else store.get_backfill_state(email_config.email, folder)
+        if state and state.next_uid == 0:
+            print(f"Backfill of {email_config.email}/{folder} already complete "
+                  f"({state.processed} checked, {state.moved} moved)")
+            return
+
+        print(f"\n--- Backfill: {email_config.email}/{folder} ---")
+        uids = None
+        while True:
+            if check_stop and check_stop():
+                print("🛑 Backfill stopped; it will resume from the last checkpoint.")
+                return
+            started = time.monotonic()
+            with self._account_locks.setdefault(email_config.email, threading.Lock()):
+                fetcher = EmailFetcher(
+                    email=email_config.email,
+                    password=email_config.password,
+                    imap_host=email_config.imap_host,
+                    imap_port=email_config.imap_port,
+                    timeout=120,
+                    state_store=store,
+                    body_cap=self.config.sync.filter_body_bytes or None,
+                    governor=self.governor,
+                    pool=self.session_pool,
+                    compress=email_config.compress
+                )
+                actions = ActionBuffer(fetcher)
+                try:
+                    uidvalidity = fetcher.folder_uidvalidity(folder)
+                    if state and state.uidvalidity != uidvalidity:
+                        print(f"  UIDVALIDITY changed for {folder}, restarting the backfill")
+                        state, uids = None, None
+                    if uids is None:
+                        # The UID list is taken once; mail arriving later is the regular scan's job
+                        uids = fetcher.folder_uids(folder, below_uid=state.next_uid if state else None)
+                        if state is None:
+                            state = BackfillState(uidvalidity=uidvalidity, next_uid=int(uids[0]) + 1 if uids else 0)
+                        print(f"  {len(uids)} message(s) to check, {chunk_size} per chunk")
+
+                    chunk, uids = uids[:chunk_size], uids[chunk_size:]
+                    moved = 0
+                    checked = 0
+                    # Headers only; the bodies the verdicts need come in one FETCH per batch (classify_batch)
+                    for email, verdict in self._classify_batches(fetcher.iter_headers(chunk, folder), check_stop):
+                        result = self._apply_verdict(actions, email, verdict)
+                        if self._record_filter_result(report, email, result):
+                            moved += 1
+                        checked += 1
+                    self._flush_actions(actions)
+                    if check_stop and check_stop():
+                        # The partial chunk is checked again on resume
+                        continue
+
+                    report['all_processed'] += checked
+                    state.processed += checked
+                    state.moved += moved
+                    state.next_uid = int(chunk[-1]) if chunk and uids else 0
+                    store.set_backfill_state(email_config.email, folder, state)
+                except Exception as e:
+                    print(f"Backfill of {email_config.email} failed: {e} (will resume from the last checkpoint)")
+                    return
+                finally:
+                    fetcher.disconnect()
+
+            elapsed = time.monotonic() - started
+            rate = checked / elapsed * 60 if elapsed > 0 else 0
+            print(f"  Backfill chunk: {checked} checked, {moved} moved, {len(uids)} left ({rate:.0f} msg/min)")
+            if state.next_uid == 0:
+                print(f"Backfill of {email_config.email}/{folder} complete "
+                      f"({state.processed} checked, {state.moved} moved)")
+                return
+
+            budget = len(chunk) * 60 / settings.messages_per_minute if settings.messages_per_minute > 0 else 0
+            self._wait(max(settings.pause_seconds, budget - elapsed), check_stop)
+
+    def _wait(self, seconds: float, check_stop=None):
+        """Sleep for seconds, waking up early when check_stop() turns True."""
+        deadline = time.monotonic() + seconds
+        while not (check_stop and check_stop()):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(1.0, remaining))
+
+    def start_backfill(self, check_stop=None) -> threading.Thread:
+        """Run the backfill sweep in a background thread (see run_backfill)."""
+        def sweep():
+            try:
+                report = self.run_backfill(check_stop=check_stop)
+                print(f"Backfill finished: {report['all_processed']} checked, "
+                      f"{report['spam_count']} to Spam, {report['deleted_count']} to Trash")
+            except Exception as e:
+                print(f"Backfill failed: {e}")
+
+        thread = threading.Thread(target=sweep, daemon=True)
+        thread.start()
+        return thread
+
+    def _merge_account_report(self, report: Dict, account: str, account_report: Dict):
+        """Add one account's partial report to the run report and its by_account entry."""
+        for key in ('all_processed', 'spam_count', 'deleted_count', 'summarized_count'):
+            report[key] += account_report[key]
+        for key in ('summarized', 'spam_details', 'deleted_details'):
+            report[key].extend(account_report[key])
+        for key in ('wire', 'data'):
+            report['imap_bytes'][key] += account_report['imap_bytes'][key]
+        report['by_account'][account] = {
+            'processed': account_report['all_processed'],
+            'spam': account_report['spam_count'],
+            'deleted': account_report['deleted_count'],
+            'summarized': account_report['summarized_count'],
+            'summaries': account_report['summarized']
+        }
+
+
+    def _run_server_search(self, fetcher: EmailFetcher, actions: ActionBuffer, report: Dict, check_stop=None):
+        """Find messages matching sender/subject rules anywhere in the INBOX with IMAP SEARCH.
+
+        The server's matches are only candidates: each one is classified on
+        its headers, so trusted senders and rule order still apply (the
+        bodies an earlier keyword rule needs are downloaded per batch). The
+        moves are flushed before the regular scan plans its windows.
+        Candidates that stay in the INBOX are remembered in the state store
+        and not classified again until the patterns change.
+        """
+        rules = self._server_search_rules()
+        if not rules:
+            return
+        print("\n--- Server search: sender/subject rules ---")
+        patterns = self.patterns.snapshot.fingerprint
+        matches = fetcher.iter_search_matches(rules, limit=self.config.sync.server_search_limit, patterns=patterns)
+        kept = []
+        for email, verdict in self._classify_batches(matches, check_stop):
+            result = self._apply_verdict(actions, email, verdict)
+            if not self._record_filter_result(report, email, result):
+                kept.append(email.uid)
+        self._flush_actions(actions)
+        fetcher.remember_search_kept(kept, patterns)
+
+    def _record_filter_result(self, report: Dict, email: EmailMessage, result: Dict) -> bool:
+        """Add a spam/delete verdict to the report. Returns True if the email was moved."""
+        if result['action'] == 'spam':
+            print(f"  [{email.date}] [SPAM] {email.subject[:40]}")
+            report['spam_count'] += 1
+            report['spam_details'].append({'from': email.from_, 'subject': email.subject, 'reason': result['reason']})
+            return True
+        if result['action'] == 'deleted':
+            print(f"  [{email.date}] [DELETED] {email.subject[:40]}")
+            report['deleted_count'] += 1
+            report['deleted_details'].append({'from': email.from_, 'subject': email.subject, 'reason': result['reason']})
+            return True
+        return False
+
+    def _flush_actions(self, actions: ActionBuffer):
+        """Send queued IMAP actions and report the UIDs that failed."""
+        if not len(actions):
+            return
+        results = actions.flush()
+        failed = {uid: r for uid, r in results.items() if r.startswith('error') or r == 'not found'}
+        print(f"  Applied {len(results) - len(failed)}/{len(results)} queued IMAP action(s)")
+        for uid, r in failed.items():
+            print(f"  [WARN] Email {uid}: {r}")
+
+    @property
+    def classifier(self) -> Classifier:
+        """The current patterns' classifier; read once per message or batch, so a reload swaps between them."""
+        return self.patterns.snapshot.classifier
+
+    def _server_search_rules(self) -> ServerSearchRules:
+        """The sender/subject rules of the current patterns as IMAP SEARCH criteria (sync.server_search)."""
+        lists = self.patterns.snapshot.lists
+        return ServerSearchRules(
+            from_terms=(list(lists['spam_emails']) + list(lists['spam_domains']) +
+                        list(lists['delete_emails']) + list(lists['delete_domains'])),
+            subject_terms=list(lists['spam_keywords']) + list(lists['delete_keywords'])
+        )
+
+    def _classify_batches(self, messages: Iterable[EmailMessage],
+                          check_stop=None) -> Iterator[Tuple[EmailMessage, Verdict]]:
+        """Classify messages FETCH_BATCH_SIZE at a time; yield (message, verdict) pairs until check_stop() turns True."""
+        messages = iter(messages)
+        while not (check_stop and check_stop()):
+            batch = list(islice(messages, FETCH_BATCH_SIZE))
+            if not batch:
+                return
+            yield from zip(batch, self.classifier.classify_batch(batch))
+
+    def _classify_plan(self, planned: Iterable[PlannedMessage]) -> Iterator[Tuple[PlannedMessage, MessageFeatures, Verdict]]:
+        """Classify iter_plan's messages FETCH_BATCH_SIZE at a time; yield (planned, features, verdict) in plan order.
+
+        features is each message's normalized record, kept for its summary.
+        """
+        planned = iter(planned)
+        while True:
+            batch = list(islice(planned, FETCH_BATCH_SIZE))
+            if not batch:
+                return
+            features = [MessageFeatures(item.email) for item in batch]
+            yield from zip(batch, features, self.classifier.classify_batch([item.email for item in batch], features))
+
+    def _apply_verdict(self, actions: ActionBuffer, email: EmailMessage, verdict: Verdict) -> Dict:
+        """Queue the IMAP action for a verdict and return it as a filter result."""
+        if verdict.rule:
+            shown = email.subject if verdict.rule.endswith('_keywords') else email.from_
+            print(f"  [{_VERDICT_LABELS[verdict.rule]}] {shown[:40]}")
+        if verdict.action == 'spam':
+            actions.move_to_spam(email.uid)
+        elif verdict.action == 'deleted':
+            actions.delete_email(email.uid)
+        return {'action': verdict.action, 'reason': verdict.reason}
+
+    def _summarize_email(self, email: EmailMessage, features: Optional[MessageFeatures] = None) -> str:
         """Summarize email with priority: Local AI (Notebook/Ollama) -> Configured Cloud -> Fallbacks."""
         try:
+            if features is None:
+                features = MessageFeatures(email)
             email_data = {
                 'from': email.from_,
                 'subject': email.subject,
-                'body': email.text or email.html
+                'body': features.prompt_text
             }
             # Small delay
             time.sleep(1)
@@ -475,40 +773,37 @@ class MailAgent:
             print(f"  [Summarization error] {str(e)[:50]}")
             return f"[Could not summarize: {str(e)[:30]}...]"
 
-    def _is_trusted(self, sender: str) -> bool:
-        """Check if sender is trusted using cached list."""
-        if not self.trusted_senders:
-            return False
-            
-        sender_lower = sender.lower()
-        return any(t in sender_lower for t in self.trusted_senders)
-
-    def _load_trusted_senders(self) -> List[str]:
-        """Load trusted senders from file once."""
-        trusted_file = os.path.join(self.base_path, 'trusted_senders.txt')
-        if not os.path.exists(trusted_file):
-            return []
-
-        try:
-            with open(trusted_file, 'r', encoding='utf-8') as f:
-                return [line.strip().lower() for line in f if line.strip()]
-        except Exception as e:
-            print(f"Error loading trusted senders: {e}")
-            return []
-
 
 def main():
     """Main entry point."""
+    parser = argparse.ArgumentParser(description="Mail Agent - Email Automation System")
+    parser.add_argument('--backfill', action='store_true',
+                        help="apply the spam/delete filters to the whole mailbox (resumable) and exit")
+    parser.add_argument('--restart', action='store_true',
+                        help="with --backfill: start the sweep over instead of resuming")
+    args = parser.parse_args()
+
     print("="*50)
     print("Mail Agent - Email Automation System (v2.1 Source)")
     print("="*50)
 
+    agent = None
     try:
         config = load_config()
         print("Configuration loaded successfully")
 
         agent = MailAgent(config)
 
+        if args.backfill:
+            try:
+                report = agent.run_backfill(restart=args.restart)
+            except KeyboardInterrupt:
+                print("\nBackfill interrupted; run again to resume")
+                return
+            print(f"\nBackfill: {report['all_processed']} checked, "
+                  f"{report['spam_count']} moved to Spam, {report['deleted_count']} moved to Trash")
+            return
+
         def run_workflow():
             """Execute one run of the agent and send report."""
             report = agent.run_once()
@@ -528,7 +823,19 @@ def main():
                 else:
                     print("Failed to send report!")
 
+        def on_push_report(report):
+            """Send the report of an IDLE-triggered run, if anything was summarized."""
+            print(f"Push run: scanned {report['all_processed']}, summarized {report['summarized_count']}")
+            if config.report.daily_summary and report['summarized_count'] > 0:
+                if not agent.telegram_sender.send_summary(report):
+                    print("Failed to send report!")
+
         if config.schedule.enabled:
+            if config.schedule.idle_push:
+                # New mail is handled as it arrives; the periodic run remains as a safety net
+                agent.start_idle_push(on_push_report)
+            if config.backfill.background:
+                agent.start_backfill()
             scheduler = Scheduler(config.schedule.interval_hours)
             scheduler.run(run_workflow)
         else:
@@ -539,6 +846,9 @@ def main():
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        if agent:
+            agent.close()
 
 
 if __name__ == "__main__":
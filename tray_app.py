@@ -92,7 +92,9 @@ class LogRedirector:
 class EditPatternsWindow:
     """Window for editing pattern .txt files only."""
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, on_save=None):
+        # Called after the files are written (the agent then reloads the changed lists)
+        self.on_save = on_save
         if parent:
             self.window = tk.Toplevel(parent)
         else:
@@ -167,8 +169,12 @@ class EditPatternsWindow:
             for filename, text_widget in self.text_widgets.items():
                 filepath = os.path.join(self.patterns_dir, filename)
                 content = text_widget.get('1.0', 'end-1c').strip()
-                with open(filepath, 'w', encoding='utf-8') as f:
+                # Write a temporary file and swap it in, so the running agent never reads a half-written list
+                with open(filepath + '.tmp', 'w', encoding='utf-8') as f:
                     f.write(content)
+                os.replace(filepath + '.tmp', filepath)
+            if self.on_save:
+                self.on_save()
             messagebox.showinfo("Success", "Patterns saved successfully!")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save patterns: {e}")
@@ -350,6 +356,8 @@ class MailAgentTray:
         self.config = None
         self.agent = None
         self.scheduler_thread = None
+        self.idle_watcher = None
+        self.backfill_thread = None
         self.is_running = False
         self.is_paused = True  # Start paused to allow configuration first
         self.icon = None
@@ -477,7 +485,8 @@ class MailAgentTray:
 
     def show_edit_patterns(self):
         """Show the simplified pattern editor."""
-        self.root.after(0, lambda: EditPatternsWindow(self.root))
+        on_save = self.agent.patterns.notify if self.agent else None
+        self.root.after(0, lambda: EditPatternsWindow(self.root, on_save=on_save))
 
     def toggle_pause(self):
         """Toggle pause/resume."""
@@ -523,11 +532,25 @@ class MailAgentTray:
         self.add_log(f"Using {self.config.ai.provider.upper()} AI", "INFO")
         self.add_log(f"Scheduler started. Interval: {self.config.schedule.interval_hours} hours", "INFO")
 
+        # IDLE push: new mail is processed within seconds, the loop below remains the periodic sweep
+        if self.config.schedule.idle_push and self.idle_watcher is None:
+            self.idle_watcher = self.agent.start_idle_push(
+                self.on_push_report,
+                check_stop=lambda: self.is_paused or not self.is_running
+            )
+            self.add_log("📬 IDLE push enabled: new mail is processed as it arrives", "INFO")
+
         while self.is_running:
             if self.is_paused:
                 time.sleep(1)
                 continue
 
+            # Backfill sweep: (re)started after a pause, it resumes from its last checkpoint
+            if self.config.backfill.background and not (self.backfill_thread and self.backfill_thread.is_alive()):
+                self.backfill_thread = self.agent.start_backfill(
+                    check_stop=lambda: self.is_paused or not self.is_running
+                )
+
             # Run processing
             try:
                 # Redirect stdout/stderr to capture agent's print statements
@@ -644,6 +667,17 @@ class MailAgentTray:
                     break
                 time.sleep(1)
 
+    def on_push_report(self, report):
+        """Log and send the report of an IDLE-triggered run."""
+        self.add_log(f"📬 Push run: ✅ Scanned: {report['all_processed']} | 🚫 Spam: {report['spam_count']} | "
+                     f"🗑️ Deleted: {report['deleted_count']} | 📧 Summarized: {report['summarized_count']}", "INFO")
+        if self.config.report.daily_summary and report['summarized_count'] > 0:
+            try:
+                success = self.agent.telegram_sender.send_summary(report)
+                self.add_log(f"📤 Telegram report: {'✅ Sent' if success else '❌ Failed'}", "INFO")
+            except Exception as e:
+                self.add_log(f"📤 Telegram report: ❌ Error - {e}", "ERROR")
+
     def start(self):
         """Start the tray application."""
         self.is_running = True
@@ -670,6 +704,10 @@ class MailAgentTray:
         """Exit the application."""
         self.add_log("🛑 Application exiting...", "INFO")
         self.is_running = False
+        if self.idle_watcher:
+            self.idle_watcher.stop()
+        if self.agent:
+            self.agent.close()
         if self.icon:
             self.icon.stop()
         self.root.quit()